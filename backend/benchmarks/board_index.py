@@ -0,0 +1,75 @@
+"""
+Compare the indexed board against the previous linear scans.
+
+Run from the backend directory with `python -m benchmarks.board_index`.
+"""
+import timeit
+from typing import List, Optional
+
+from benchmarks.fixtures import create_game
+from codenames.game.game import CodenamesGame
+from codenames.model import Tile
+from codenames.util import get_tile_by_word
+
+ITERATIONS = 20_000
+
+
+def _scan_check_win(game: CodenamesGame) -> Optional[str]:
+    """check_win as it was before the board kept remaining counters"""
+    if not any(tile.team == "red" and not tile.revealed for tile in game.tiles):
+        return "red"
+    if not any(tile.team == "blue" and not tile.revealed for tile in game.tiles):
+        return "blue"
+    if any(tile.team == "assassin" and tile.revealed for tile in game.tiles):
+        return game.current_turn.value[0]
+    return None
+
+
+class _ScanningGame(CodenamesGame):
+    """A game whose win checks scan the board, swapped onto an existing game as its slots are unchanged"""
+    __slots__ = ()
+
+    def check_win(self):
+        return _scan_check_win(self)
+
+
+def _report(name: str, before: float, after: float, iterations: int = ITERATIONS) -> None:
+    per_before = before / iterations * 1e6
+    per_after = after / iterations * 1e6
+    print(f"{name:<28} before {per_before:8.2f}us  after {per_after:8.2f}us  ({per_before / per_after:5.1f}x)")
+
+
+def main() -> None:
+    game = create_game()
+    scanning_game = create_game()
+    scanning_game.__class__ = _ScanningGame
+    # The last tile is the worst case for a linear scan
+    last_word: str = game.tiles[-1].word.upper()
+    tiles: List[Tile] = game.tiles
+
+    _report(
+        "tile lookup",
+        timeit.timeit(lambda: get_tile_by_word(last_word, tiles), number=ITERATIONS),
+        timeit.timeit(lambda: game.get_tile(last_word), number=ITERATIONS),
+    )
+    _report(
+        "check_win",
+        timeit.timeit(lambda: _scan_check_win(game), number=ITERATIONS),
+        timeit.timeit(game.check_win, number=ITERATIONS),
+    )
+    # A broadcast builds one state update per user
+    _report(
+        "win checks per broadcast",
+        timeit.timeit(lambda: [_scan_check_win(game) for _ in game.users], number=ITERATIONS),
+        timeit.timeit(lambda: [game.check_win() for _ in game.users], number=ITERATIONS),
+    )
+    _report(
+        "state updates per broadcast",
+        timeit.timeit(lambda: [scanning_game.get_state_update(user, False) for user in scanning_game.users], number=ITERATIONS // 10),
+        timeit.timeit(lambda: [game.get_state_update(user, False) for user in game.users], number=ITERATIONS // 10),
+        ITERATIONS // 10,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Shared set up for the benchmarks: a game whose users discard everything sent to them.
+"""
+from typing import List
+
+from codenames.game.game import CodenamesGame
+from codenames.model import CodenamesConnection, User
+from codenames.wire_format import Payload
+
+
+class NullConnection(CodenamesConnection):
+    async def send(self, message: dict):
+        return
+
+    async def send_encoded(self, payload: Payload, message_type: str = ""):
+        return
+
+
+def create_game() -> CodenamesGame:
+    """A seeded game with a human in each of the four roles"""
+    users: List[User] = []
+    for team, is_spy_master in [("red", True), ("red", False), ("blue", True), ("blue", False)]:
+        user = User(NullConnection(), True)
+        user.team, user.is_spy_master = team, is_spy_master
+        users.append(user)
+    return CodenamesGame(users, seed=0)
@@ -0,0 +1,41 @@
+"""
+Memory and state view cost of many concurrent games in one process.
+
+Run from the backend directory with `python -m benchmarks.game_memory`, optionally passing the number of games.
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from benchmarks.fixtures import create_game
+
+DEFAULT_GAMES = 10_000
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_GAMES
+    # Deal one game first so the word pack and lazily built module state are not counted against the games
+    create_game()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = [create_game() for _ in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{count} games: {(after - before) / count / 1024:.2f} KiB per game, {(after - before) / 2 ** 20:.1f} MiB in total")
+
+    # One broadcast builds a view per role and checks for a winner
+    start = time.perf_counter()
+    for game in games:
+        game.mark_state_changed()
+        for user in game.users:
+            game.encode_state_update(user.is_spy_master, False)
+        game.check_win()
+    elapsed = time.perf_counter() - start
+    print(f"state views and win check: {elapsed / count * 1e6:.1f}us per game broadcast")
+
+
+if __name__ == "__main__":
+    main()
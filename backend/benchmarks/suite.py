@@ -0,0 +1,242 @@
+"""
+Micro-benchmarks of the game and message routing hot paths, compared against a recorded baseline.
+
+Run from the backend directory with `python -m benchmarks.suite`. Timings are scaled by a pure Python calibration
+loop so a baseline recorded on one machine stays roughly comparable on another, and anything slower than the
+baseline by more than --threshold is flagged and makes the run exit with status 1. Record a new baseline after an
+intended change with `--save`.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import pathlib
+import platform
+import sys
+import timeit
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from benchmarks.fixtures import NullConnection, create_game
+from codenames.game.events import read_event_log, replay
+from codenames.game.snapshot import decode_game, encode_game
+from codenames.message_router.message_router import MessageRouter, UserContext
+from codenames.model import Role, User
+from codenames.services.lobby_service import InMemoryLobbyRepository, LobbyService
+from codenames.util import get_tile_by_word
+from codenames.websocket_server import WebSocketConnection, create_server
+
+BASELINE_PATH = pathlib.Path(__file__).parent / "baseline.json"
+# Event logs written with gameEventsPath, copy production games here to benchmark against them
+RECORDED_GAMES_PATH = pathlib.Path(__file__).parent / "recorded_games"
+DEFAULT_THRESHOLD = 1.3
+REPEAT = 5
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Returns the operation to time, either a function or a coroutine function
+    setup: Callable[[], Callable[[], Any]]
+    number: int
+    is_async: bool = False
+
+
+class Comparison(NamedTuple):
+    name: str
+    seconds: float
+    baseline: Optional[float]
+    # Current over baseline time after correcting for the speed of the machine
+    ratio: Optional[float]
+    regressed: bool
+
+
+class _NullWebSocket:
+    async def send(self, payload: str) -> None:
+        return
+
+
+def _calibrate() -> None:
+    sum(i * i for i in range(200))
+
+
+def _state_update():
+    game = create_game()
+    return lambda: game.get_state_update(game.users[0], False)
+
+
+def _broadcast():
+    game = create_game()
+    return lambda: game.broadcast_state_update(False)
+
+
+def _broadcast_changed():
+    game = create_game()
+
+    async def broadcast() -> None:
+        game.mark_state_changed()
+        await game.broadcast_state_update(False)
+    return broadcast
+
+
+def _check_win():
+    return create_game().check_win
+
+
+def _get_tile_by_word():
+    tiles = create_game().tiles
+    # The last tile is the worst case for the scan
+    word = tiles[-1].word.upper()
+    return lambda: get_tile_by_word(word, tiles)
+
+
+def _get_tile():
+    game = create_game()
+    word = game.tiles[-1].word.upper()
+    return lambda: game.get_tile(word)
+
+
+def _encode_game():
+    game = create_game()
+    return lambda: encode_game(game)
+
+
+def _decode_game():
+    game = create_game()
+    snapshot = encode_game(game)
+    return lambda: decode_game(snapshot, game.users, game.clue_service)
+
+
+def _role_index():
+    return lambda: Role.BLUE_OPERATIVE.index
+
+
+def _role_from_team_and_role():
+    return lambda: Role.from_team_and_role("blue", False)
+
+
+def _route_message():
+    router = MessageRouter(LobbyService(InMemoryLobbyRepository()))
+    user_context = UserContext(User(NullConnection(), True), "benchmark")
+    message = {"clientMessageType": "idRequest"}
+    return lambda: router.route_message(user_context, "idRequest", message)
+
+
+def _handle_message():
+    server = asyncio.run(create_server())
+    connection = WebSocketConnection(_NullWebSocket())  # type: ignore[arg-type]
+    # The timing loop never yields to the writer task, so let the replies pile up rather than disconnect
+    connection.outbound.max_size = connection.outbound.high_water = sys.maxsize
+    connection_id = server.connection_manager.add_connection(connection)
+    user_context = UserContext(User(NullConnection(), True), connection_id)
+    raw_message = json.dumps({"clientMessageType": "idRequest"})
+    return lambda: server._handle_message(user_context, raw_message)
+
+
+def _replay():
+    recorded = [read_event_log(str(path)) for path in sorted(RECORDED_GAMES_PATH.glob("*.jsonl"))]
+
+    async def replay_all() -> None:
+        for header, events in recorded:
+            (await replay(header, events)).close()
+    return replay_all
+
+
+BENCHMARKS = [
+    Benchmark("game.get_state_update", _state_update, 5_000),
+    Benchmark("game.broadcast_state_update", _broadcast, 5_000, is_async=True),
+    Benchmark("game.broadcast_state_update.changed", _broadcast_changed, 2_000, is_async=True),
+    Benchmark("game.check_win", _check_win, 100_000),
+    Benchmark("util.get_tile_by_word", _get_tile_by_word, 50_000),
+    Benchmark("game.get_tile", _get_tile, 100_000),
+    Benchmark("snapshot.encode_game", _encode_game, 20_000),
+    Benchmark("snapshot.decode_game", _decode_game, 5_000),
+    Benchmark("Role.index", _role_index, 100_000),
+    Benchmark("Role.from_team_and_role", _role_from_team_and_role, 100_000),
+    Benchmark("MessageRouter.route_message", _route_message, 20_000, is_async=True),
+    Benchmark("WebSocketServer._handle_message", _handle_message, 10_000, is_async=True),
+    Benchmark("events.replay", _replay, 200, is_async=True),
+]
+
+
+async def _time_async(operation: Callable[[], Awaitable[Any]], number: int) -> List[float]:
+    timings = []
+    for _ in range(REPEAT):
+        start = timeit.default_timer()
+        for _ in range(number):
+            await operation()
+        timings.append(timeit.default_timer() - start)
+    return timings
+
+
+def measure(benchmark: Benchmark, scale: float = 1.0) -> float:
+    """Best of REPEAT runs, in seconds per operation"""
+    number = max(int(benchmark.number * scale), 1)
+    operation = benchmark.setup()
+    if benchmark.is_async:
+        timings = asyncio.run(_time_async(operation, number))
+    else:
+        timings = timeit.repeat(operation, number=number, repeat=REPEAT)
+    return min(timings) / number
+
+
+def run(benchmarks: List[Benchmark], scale: float = 1.0) -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "calibration": measure(Benchmark("calibration", lambda: _calibrate, 2_000), scale),
+        "results": {benchmark.name: measure(benchmark, scale) for benchmark in benchmarks},
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Optional[Dict[str, Any]], threshold: float = DEFAULT_THRESHOLD) -> List[Comparison]:
+    """Pair each result with its baseline, flagging those more than `threshold` times slower"""
+    machine_factor = current["calibration"] / baseline["calibration"] if baseline else 1.0
+    comparisons = []
+    for name, seconds in current["results"].items():
+        before = baseline["results"].get(name) if baseline else None
+        ratio = seconds / (before * machine_factor) if before else None
+        comparisons.append(Comparison(name, seconds, before, ratio, ratio is not None and ratio > threshold))
+    return comparisons
+
+
+def load_baseline(path: pathlib.Path = BASELINE_PATH) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return None
+
+
+def _print_report(comparisons: List[Comparison]) -> None:
+    print(f"{'benchmark':<38} {'us/op':>10} {'baseline':>10} {'ratio':>7}")
+    for comparison in comparisons:
+        baseline = f"{comparison.baseline * 1e6:10.3f}" if comparison.baseline else f"{'-':>10}"
+        ratio = f"{comparison.ratio:7.2f}" if comparison.ratio else f"{'-':>7}"
+        flag = "  REGRESSED" if comparison.regressed else ""
+        print(f"{comparison.name:<38} {comparison.seconds * 1e6:10.3f} {baseline} {ratio}{flag}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help=f"Record the results as the new baseline in {BASELINE_PATH.name}")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Slowdown against the baseline counted as a regression")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the iteration counts, e.g. 0.1 for a quick run")
+    args = parser.parse_args()
+    if args.save and args.filter:
+        parser.error("--save records every benchmark and cannot be combined with --filter")
+
+    # Handlers log every message, which would otherwise be most of what is measured
+    logging.disable(logging.INFO)
+    current = run([benchmark for benchmark in BENCHMARKS if args.filter in benchmark.name], args.scale)
+    comparisons = compare(current, load_baseline(), args.threshold)
+    _print_report(comparisons)
+    if args.save:
+        with open(BASELINE_PATH, "w") as baseline_file:
+            json.dump(current, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return 0
+    return 1 if any(comparison.regressed for comparison in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
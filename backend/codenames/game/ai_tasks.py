@@ -0,0 +1,124 @@
+"""
+Supervision of the background tasks AI players take their turns in.
+
+Each game owns a TaskSupervisor. It holds a reference to every task it starts so none is garbage collected mid
+flight, runs one task per key (an AI player's role) at a time and a few per game at once, and cancels them all when
+the game ends or its lobby is torn down. A later turn for a key that is still busy waits for the running task, a
+second request for the same turn is dropped. Tasks running for longer than `slow_after` seconds are logged and counted,
+as are tasks that are still running after their supervisor was closed.
+"""
+import asyncio
+import logging
+import time
+import weakref
+from typing import Any, Coroutine, Dict, Hashable, Optional, Set, Tuple
+
+from codenames.metrics import ai_tasks_cancelled, ai_tasks_deduplicated, ai_tasks_slow, registry
+
+logger = logging.getLogger(__name__)
+
+_supervisors: 'weakref.WeakSet[TaskSupervisor]' = weakref.WeakSet()
+
+
+class TaskSupervisor:
+    __slots__ = ("owner", "max_running", "slow_after", "closed", "_tasks", "_latest", "_started", "_slots", "__weakref__")
+
+    def __init__(self, owner: str = "", max_running: int = 2, slow_after: float = 120):
+        self.owner = owner
+        self.max_running = max_running
+        self.slow_after = slow_after
+        self.closed = False
+        self._tasks: Set[asyncio.Task] = set()
+        # The last task spawned for each key and the turn it was spawned for
+        self._latest: Dict[str, Tuple[asyncio.Task, Hashable]] = {}
+        # When each running task got its slot, tasks still waiting for one are absent
+        self._started: Dict[asyncio.Task, float] = {}
+        # Created on first use, most games never have an AI player
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def spawn(self, coro: Coroutine[Any, Any, Any], key: str, turn: Hashable = None) -> Optional[asyncio.Task]:
+        """Run `coro` in a supervised task once `key`'s previous task has finished.
+
+        Nothing is started if the supervisor is closed or `key`'s last task is still working on the same `turn`.
+        """
+        latest = self._latest.get(key)
+        if self.closed or (latest is not None and latest[1] == turn):
+            if not self.closed:
+                ai_tasks_deduplicated.inc()
+                logger.debug(f"{self.owner}: {key} already has a task running for this turn")
+            coro.close()
+            return None
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+            _supervisors.add(self)
+        previous = latest[0] if latest is not None else None
+        task = asyncio.create_task(self._run(coro, key, previous), name=f"ai {self.owner} {key}")
+        self._tasks.add(task)
+        self._latest[key] = (task, turn)
+        task.add_done_callback(lambda finished: self._on_done(key, finished, coro))
+        return task
+
+    def cancel_all(self) -> None:
+        """Cancel every task except the one calling, e.g. because the game was just won from inside it"""
+        current = asyncio.current_task() if self._tasks else None
+        for task in list(self._tasks):
+            if task is not current and not task.done():
+                task.cancel()
+                ai_tasks_cancelled.inc()
+
+    def close(self) -> None:
+        """Cancel everything and start no more tasks, called when the lobby is torn down"""
+        self.closed = True
+        self.cancel_all()
+
+    def stats(self) -> Dict[str, int]:
+        now = time.monotonic()
+        running = len(self._started)
+        return {
+            "running": running,
+            "waiting": len(self._tasks) - running,
+            "slow": sum(now - started > self.slow_after for started in self._started.values()),
+            "orphaned": len(self._tasks) if self.closed else 0,
+        }
+
+    async def _run(self, coro: Coroutine[Any, Any, Any], key: str, previous: Optional[asyncio.Task]) -> Any:
+        assert self._slots is not None, "Created by spawn"
+        if previous is not None:
+            # Whatever became of it, the role's previous turn has to be over before this one starts
+            await asyncio.wait([previous])
+        async with self._slots:
+            self._started[asyncio.current_task()] = time.monotonic()  # type: ignore[index]
+            slow_warning = asyncio.get_running_loop().call_later(self.slow_after, self._report_slow, key)
+            try:
+                return await coro
+            finally:
+                slow_warning.cancel()
+
+    def _report_slow(self, key: str) -> None:
+        ai_tasks_slow.inc()
+        logger.warning(f"{self.owner}: AI task {key} has been running for over {self.slow_after:.0f}s")
+
+    def _on_done(self, key: str, task: asyncio.Task, coro: Coroutine[Any, Any, Any]) -> None:
+        # Never awaited if the task was cancelled while waiting for a slot, or before it first ran
+        coro.close()
+        self._tasks.discard(task)
+        self._started.pop(task, None)
+        if (latest := self._latest.get(key)) is not None and latest[0] is task:
+            del self._latest[key]
+        if not task.cancelled() and (error := task.exception()) is not None:
+            logger.error(f"{self.owner}: AI task {key} failed: {error!r}")
+
+
+def ai_task_stats() -> Dict[str, int]:
+    """Totals over every live supervisor"""
+    totals = {"running": 0, "waiting": 0, "slow": 0, "orphaned": 0}
+    for supervisor in list(_supervisors):
+        for name, value in supervisor.stats().items():
+            totals[name] += value
+    return totals
+
+
+registry.register_stats("ai_tasks", ai_task_stats)
@@ -0,0 +1,242 @@
+"""
+An append-only log of the moves made in each game, and a replayer that plays a log back.
+
+Every clue, guess and pass a game accepts is appended to its GameEventLog as a typed event with a sequence number
+and a timestamp. When GAME_EVENTS_PATH is set, `game_event_writer` writes each game's new events to
+`<path>/<lobby id>.jsonl` in batches: a header line with the seed, word pack and players, then one JSON array per
+event. Games are dealt from their seed, so the header and the events are enough to rebuild a game with `replay`.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from codenames.model import DetachedConnection, Role, User
+from codenames.options import GAME_EVENTS_FLUSH_SECONDS, GAME_EVENTS_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class ClueGiven(NamedTuple):
+    seq: int
+    at: float
+    role: int
+    word: str
+    number: int
+    kind = "clue"
+
+
+class TileGuessed(NamedTuple):
+    seq: int
+    at: float
+    role: int
+    word: str
+    kind = "guess"
+
+
+class TurnPassed(NamedTuple):
+    seq: int
+    at: float
+    role: int
+    kind = "pass"
+
+
+GameEvent = Union[ClueGiven, TileGuessed, TurnPassed]
+
+_EVENT_TYPES = {event_type.kind: event_type for event_type in (ClueGiven, TileGuessed, TurnPassed)}
+
+
+def event_to_record(event: GameEvent) -> List[Any]:
+    """The event as a compact JSON array, its kind followed by its fields"""
+    return [event.kind, *event]
+
+
+def event_from_record(record: List[Any]) -> GameEvent:
+    event_type = _EVENT_TYPES.get(record[0]) if record else None
+    if event_type is None:
+        raise ValueError(f"Unknown game event {record[:1]}")
+    return event_type(*record[1:])  # type: ignore[call-arg]
+
+
+class GameEventLog:
+    """The events of one game in the order they happened, and how many of them have been written out"""
+    __slots__ = ("first_seq", "events", "flushed", "closed", "on_event")
+
+    def __init__(self, first_seq: int = 0):
+        # A restored game numbers its events on from where the saved game stopped
+        self.first_seq = first_seq
+        self.events: List[GameEvent] = []
+        self.flushed = 0
+        self.closed = False
+        # Told about every new event and about the close, e.g. so the writer can schedule a flush
+        self.on_event: Optional[Callable[[], None]] = None
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    @property
+    def next_seq(self) -> int:
+        return self.first_seq + len(self.events)
+
+    def clue(self, role: Role, word: str, number: int) -> None:
+        self._append(ClueGiven(self.next_seq, time.time(), role.index, word, number))
+
+    def guess(self, role: Role, word: str) -> None:
+        self._append(TileGuessed(self.next_seq, time.time(), role.index, word))
+
+    def passed(self, role: Role) -> None:
+        self._append(TurnPassed(self.next_seq, time.time(), role.index))
+
+    def close(self) -> None:
+        self.closed = True
+        if self.on_event is not None:
+            self.on_event()
+
+    def _append(self, event: GameEvent) -> None:
+        self.events.append(event)
+        if self.on_event is not None:
+            self.on_event()
+
+
+def game_header(game, lobby_id: str) -> Dict[str, Any]:
+    """What `replay` needs besides the events: how the board was dealt and who sat in each role"""
+    pack = game.word_pack
+    players: List[Optional[Dict[str, Any]]] = [None] * len(Role.all_roles())
+    for user in game.users:
+        if user.team is not None:
+            players[Role.from_team_and_role(user.team, user.is_spy_master).index] = {"name": user.name, "human": user.is_human}
+    return {
+        "lobby": lobby_id,
+        "seed": game.seed,
+        "wordPack": pack.name,
+        # Lobby supplied packs are not on disk, so they are kept with the log
+        "customWords": list(pack.words) if pack.name.startswith("custom-") else None,
+        "players": players,
+        "startedAt": time.time(),
+    }
+
+
+class GameEventWriter:
+    """Appends the new events of every tracked game to its JSONL file, in batches every `flush_interval` seconds.
+
+    Like the lobby repository, events are serialised on the event loop and written on a worker thread.
+    """
+
+    def __init__(self, directory: Optional[str], flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._games: Dict[str, Tuple[GameEventLog, Dict[str, Any]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def track(self, lobby_id: str, game) -> None:
+        """Start writing a game's events, a restored game carries on appending to the file it had"""
+        if not self.enabled or not lobby_id:
+            return
+        self._games[lobby_id] = (game.events, game_header(game, lobby_id))
+        game.events.on_event = self._schedule_flush
+        if game.events.events:
+            self._schedule_flush()
+
+    def path_for(self, lobby_id: str) -> str:
+        assert self.directory is not None, "Only enabled writers have files"
+        return os.path.join(self.directory, f"{lobby_id}.jsonl")
+
+    async def flush(self) -> None:
+        """Write the events added since the last flush, forgetting games that have closed"""
+        async with self._flush_lock:
+            batches = []
+            for lobby_id, (log, header) in list(self._games.items()):
+                new_events = log.events[log.flushed:]
+                if new_events:
+                    lines = "".join(json.dumps(event_to_record(event), separators=(",", ":")) + "\n" for event in new_events)
+                    batches.append((lobby_id, header, lines))
+                    log.flushed += len(new_events)
+                if log.closed:
+                    del self._games[lobby_id]
+            if batches:
+                try:
+                    await asyncio.to_thread(self._write, batches)
+                except OSError as e:
+                    logger.error(f"Error writing game events: {e}")
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            # No event loop, the next event or close() writes it
+            pass
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    def _write(self, batches: List[Tuple[str, Dict[str, Any], str]]) -> None:
+        assert self.directory is not None, "Only enabled writers flush"
+        os.makedirs(self.directory, exist_ok=True)
+        for lobby_id, header, lines in batches:
+            path = self.path_for(lobby_id)
+            with open(path, "a", encoding="utf-8") as log_file:
+                if log_file.tell() == 0:
+                    log_file.write(json.dumps(header, separators=(",", ":")) + "\n")
+                log_file.write(lines)
+
+
+game_event_writer = GameEventWriter(GAME_EVENTS_PATH, GAME_EVENTS_FLUSH_SECONDS)
+
+
+def read_event_log(path: str) -> Tuple[Dict[str, Any], List[GameEvent]]:
+    """The header and events of a log written by GameEventWriter"""
+    with open(path, encoding="utf-8") as log_file:
+        header = json.loads(next(log_file))
+        return header, [event_from_record(json.loads(line)) for line in log_file if line.strip()]
+
+
+async def replay(header: Dict[str, Any], events: List[GameEvent], clue_service=None):
+    """Rebuild a game by dealing its board from the seed and playing its events back as fast as they apply.
+
+    Every seat is taken by a detached human, so no AI player starts work of its own. Raises ValueError if an event
+    is not accepted, which means the log does not belong to this seed and word pack.
+    """
+    from codenames.game.game import CodenamesGame
+    from codenames.game.word_packs import word_pack_store
+
+    if header["seed"] is None:
+        raise ValueError("Only games with a seed can be replayed")
+    if header.get("customWords"):
+        word_pack = word_pack_store.register_custom(header["customWords"])
+    else:
+        word_pack = word_pack_store.get(header["wordPack"])
+    users = []
+    for role, player in zip(Role.all_roles(), header["players"]):
+        user = User(DetachedConnection(f"replay-{role.index}"), True)
+        user.team, user.is_spy_master = role.value
+        user.name = player["name"] if player else ""
+        user.is_ready = user.in_game = True
+        users.append(user)
+    game = CodenamesGame(users, word_pack, header["seed"], clue_service)
+    for event in events:
+        applied = len(game.events)
+        user = users[event.role]
+        if isinstance(event, ClueGiven):
+            await game.provide_clue(user, event.word, event.number)
+        elif isinstance(event, TileGuessed):
+            await game.guess_tile(user, game.get_tile(event.word))
+        else:
+            await game.pass_turn(user)
+        if len(game.events) == applied:
+            raise ValueError(f"Event {event.seq} ({event.kind} by role {event.role}) does not apply to the replayed game")
+    return game
@@ -1,21 +1,61 @@
-from typing import Dict, List
+import random
+from typing import Any, Dict, List, Optional
 
 from codenames.gpt.chat_gpt import GPTConnection
-from codenames.model import Role, User
+from codenames.gpt.agent import create_agent
+from codenames.gpt.response_cache import response_cache
+from codenames.model import Role, Tile, User
+from codenames.game.events import game_event_writer
 from codenames.game.game import CodenamesGame
+from codenames.game.word_packs import WordPack
+from codenames.services.clue_service import ClueService
 
 
 class GameFactory:
 
     @staticmethod
-    def create_game(users: List[User], role_assignments: Dict[int, str]) -> 'CodenamesGame':
+    def create_game(
+        users: List[User],
+        role_assignments: Dict[int, str],
+        word_pack: Optional[WordPack] = None,
+        seed: Optional[int] = None,
+        cache_ai_responses: bool = True,
+        lobby_id: str = "",
+    ) -> 'CodenamesGame':
         """Create a new Codenames game instance with the given users, creating AI players if needed."""
         gpt_players = GameFactory.create_gpt_players(role_assignments)
-        game = CodenamesGame(users + gpt_players)
+        clue_service = ClueService(create_agent(cache=response_cache if cache_ai_responses else None), lobby_id)
+        # Every game gets a seed, its board and event log are then all it takes to replay it
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        game = CodenamesGame(users + gpt_players, word_pack, seed, clue_service)
         for user in game.users:
             user.in_game = True
+        game_event_writer.track(lobby_id, game)
         return game
     
+    @staticmethod
+    def restore_game(
+        record: Dict[str, Any],
+        humans: List[User],
+        word_pack: Optional[WordPack] = None,
+        cache_ai_responses: bool = True,
+        lobby_id: str = "",
+    ) -> 'CodenamesGame':
+        """Rebuild a game from `CodenamesGame.to_record`, seating the lobby's restored humans and fresh AI players"""
+        humans_by_uuid = {str(user.connection.uuid): user for user in humans}
+        users = [
+            humans_by_uuid.get(user_record["uuid"]) or User.from_record(user_record, GPTConnection())
+            for user_record in record["users"]
+        ]
+        tiles = [Tile(word, team, revealed) for word, team, revealed in record["tiles"]]
+        clue_service = ClueService(create_agent(cache=response_cache if cache_ai_responses else None), lobby_id)
+        game = CodenamesGame(users, word_pack, record["seed"], clue_service, tiles, record.get("eventSeq", 0))
+        clue = (record["clue"][0], record["clue"][1]) if record["clue"] else None
+        game.restore_turn(Role.from_index(record["currentTurn"]), record["guessesRemaining"], clue)
+        game_event_writer.track(lobby_id, game)
+        return game
+
     @staticmethod
     def create_gpt_players(role_assignments: Dict[int, str]) -> List[User]:
         gpt_players = []
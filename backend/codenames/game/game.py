@@ -1,43 +1,231 @@
 
 import asyncio
-import pathlib
 import random
-from typing import List, Literal, Optional, Tuple
+import time
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
 
 from typing import TYPE_CHECKING
 from codenames.services.clue_service import ClueService
-from codenames.options import GUESS_DELAY
-from codenames.model import Role, Tile, User
-from codenames.gpt.gpt_agent import GPTAgent
+from codenames.options import AI_TASK_SLOW_SECONDS, AI_TASKS_PER_GAME, GUESS_DELAY
+from codenames.model import TEAMS, Role, Tile, User
+from codenames.util import normalise_word
+from codenames.gpt.agent import create_agent
+from codenames.gpt.response_cache import response_cache
+from codenames.game.ai_tasks import TaskSupervisor
+from codenames.game.events import GameEventLog
+from codenames.game.word_packs import DEFAULT_PACK, WordPack, sample_board, word_pack_store
+from codenames.metrics import broadcast_seconds, games_active
+from codenames.tracing import tracer
+from codenames.wire_format import JSON, Payload, WireFormat
 
-def generate_tiles() -> List[Tile]:
-    with open(pathlib.Path(__file__).parent.parent.parent / "wordlist.txt") as f:
-        words = f.readlines()
-    used_words = random.sample(words, 25)
-    teams = ["red"] * 9 + ["blue"] * 8 + ["assassin"] + ["neutral"] * 7
-    all_tiles = [Tile(word.strip(), team) for word, team in zip(used_words, teams)]
-    random.shuffle(all_tiles)
-    return all_tiles
+def generate_tiles(pack: Optional[WordPack] = None, rng: Optional[random.Random] = None) -> List[Tile]:
+    """Deal a board from a preloaded word pack, a seeded `rng` always deals the same board"""
+    pack = pack or word_pack_store.get(DEFAULT_PACK)
+    indices, teams = sample_board(pack, rng)
+    return [Tile(pack.words[index], team) for index, team in zip(indices, teams)]
 
 
 class CodenamesGame:
-    def __init__(self, users: List[User]):
+    # Thousands of games share a process, so no per-game attribute dict
+    __slots__ = (
+        "users", "word_pack", "seed", "tiles", "_tile_positions", "remaining",
+        "assassin_revealed", "current_turn",
+        "guesses_remaining", "clue", "state_version", "_encoded_states", "_players_json", "_broadcast_version",
+        "_broadcast_summary", "_pending_reveals", "clue_service", "ai_tasks", "events", "on_state_changed", "_counted_active",
+    )
+
+    def __init__(
+        self,
+        users: List[User],
+        word_pack: Optional[WordPack] = None,
+        seed: Optional[int] = None,
+        clue_service: Optional[ClueService] = None,
+        tiles: Optional[List[Tile]] = None,
+        first_event_seq: int = 0,
+    ):
         self.users = users
-        self.tiles = generate_tiles()
+        self.word_pack: WordPack = word_pack or word_pack_store.get(DEFAULT_PACK)
+        self.seed = seed
+        # A board is only passed in when restoring a game, new games deal their own
+        self.tiles = tiles if tiles is not None else generate_tiles(self.word_pack, random.Random(seed))
+        # Built once per board so guesses never scan the tiles
+        self._tile_positions: Dict[str, int] = {normalise_word(tile.word): i for i, tile in enumerate(self.tiles)}
+        # Unrevealed tiles of each team, counted once and kept up to date by _reveal, since the win check runs on
+        # every broadcast
+        self.remaining: Dict[str, int] = dict.fromkeys(TEAMS, 0)
+        self.assassin_revealed = False
+        for tile in self.tiles:
+            if not tile.revealed:
+                self.remaining[tile.team] += 1
+            elif tile.team == "assassin":
+                self.assassin_revealed = True
         self.current_turn: Role = Role.RED_SPYMASTER
         self.guesses_remaining = 0
         self.clue: Optional[Tuple[str, int]] = None
+        # Encoded stateUpdate payloads for the current state_version, keyed by (for_spymaster, is_on_turn_update, format)
+        self.state_version = 0
+        self._encoded_states: Dict[Tuple[bool, bool, str], Payload] = {}
+        self._players_json: Optional[List[dict]] = None
+        # What delta subscribers were last sent, the next stateDelta carries everything since
+        self._broadcast_version = 0
+        self._broadcast_summary = self._public_summary()
+        self._pending_reveals: List[int] = []
         # Allow dependency injection of clue service (for testing / alternate AI implementations)
-        self.clue_service: ClueService = ClueService(GPTAgent())
+        self.clue_service: ClueService = clue_service or ClueService(create_agent(cache=response_cache))
+        # Every AI turn runs in a task owned here, so closing the game stops them all
+        self.ai_tasks = TaskSupervisor(self.clue_service.fairness_key, AI_TASKS_PER_GAME, AI_TASK_SLOW_SECONDS)
+        # Every accepted move, in order, so the game can be replayed from its seed
+        self.events = GameEventLog(first_event_seq)
+        # Told about every mutation, e.g. so a durable lobby repository can schedule a write
+        self.on_state_changed: Optional[Callable[[], None]] = None
+        # Whether this game is in the games_active gauge, only lobbies' games are
+        self._counted_active = False
+
+    def mark_state_changed(self) -> None:
+        """Invalidate the cached state views, must be called after any mutation"""
+        self.state_version += 1
+        self._encoded_states.clear()
+        self._players_json = None
+        if self.on_state_changed is not None:
+            self.on_state_changed()
+
+    def count_as_active(self) -> None:
+        """Include this game in the games_active gauge until it is won or closed"""
+        if not self._counted_active and not self.check_win():
+            self._counted_active = True
+            games_active.inc()
+
+    def _stop_counting_as_active(self) -> None:
+        if self._counted_active:
+            self._counted_active = False
+            games_active.dec()
+
+    def players_changed(self) -> None:
+        """Invalidate the cached player list after a player's details or connection changed mid game.
+
+        Not a move, so the state version stays put and delta subscribers are not sent an empty delta.
+        """
+        self._encoded_states.clear()
+        self._players_json = None
+
+    def to_record(self) -> Dict[str, Any]:
+        """The game state needed to resume it after a restart, players referenced by uuid"""
+        return {
+            "seed": self.seed,
+            "tiles": [[tile.word, tile.team, tile.revealed] for tile in self.tiles],
+            "currentTurn": self.current_turn.index,
+            "guessesRemaining": self.guesses_remaining,
+            "clue": list(self.clue) if self.clue else None,
+            "users": [user.to_record() for user in self.users],
+            "eventSeq": self.events.next_seq,
+        }
+
+    def restore_turn(self, current_turn: Role, guesses_remaining: int, clue: Optional[Tuple[str, int]]) -> None:
+        """Put back the turn, clue and guesses of a saved game, the board comes in through the constructor"""
+        self.current_turn = current_turn
+        self.guesses_remaining = guesses_remaining
+        self.clue = clue
+        self._broadcast_summary = self._public_summary()
+
+    def resume_ai_turn(self) -> None:
+        """Restart the AI player on turn after a restore, its task died with the previous process"""
+        if self.check_win():
+            return
+        on_turn = self.get_on_turn_user()
+        if on_turn.is_human:
+            return
+        if on_turn.is_spy_master or (self.clue and self.guesses_remaining > 0):
+            self.start_ai_turn(on_turn)
+
+    def start_ai_turn(self, user: User) -> None:
+        """Let an AI player work out its clue or guesses in a supervised task"""
+        if user.is_spy_master:
+            coro = self.clue_service.create_clue(self, user)
+        else:
+            assert self.clue is not None, "Guessers need a clue"
+            coro = self.clue_service.make_guesses(self.clue[0], self.clue[1], self, user)
+        # Asking again before the state moves on is the same turn, e.g. a restore racing a rejoin
+        self.ai_tasks.spawn(coro, Role.from_team_and_role(user.team, user.is_spy_master).name, self.state_version)
 
     async def broadcast_state_update(self, is_on_turn_update: bool):
-        await asyncio.gather(*(user.send(self.get_state_update(user, is_on_turn_update)) for user in self.users))
+        """Send each user the state view for their role, serialising each view once.
+
+        Users that opted in to deltas get a stateDelta with the changes since the previous broadcast instead,
+        or nothing if the state has not changed.
+        """
+        with tracer.span("game.broadcast", users=len(self.users)):
+            start = time.perf_counter()
+            delta = self._state_delta(is_on_turn_update)
+            encoded_deltas: Dict[str, Payload] = {}
+            sends = []
+            for user in self.users:
+                wire_format = user.connection.wire_format
+                if user.accepts_deltas:
+                    if delta is not None:
+                        encoded = encoded_deltas.get(wire_format.name)
+                        if encoded is None:
+                            encoded = encoded_deltas[wire_format.name] = wire_format.encode(delta)
+                        sends.append(user.send_encoded(encoded, "stateDelta"))
+                else:
+                    encoded = self.encode_state_update(user.is_spy_master, is_on_turn_update, wire_format)
+                    sends.append(user.send_encoded(encoded, "stateUpdate"))
+            await asyncio.gather(*sends)
+            broadcast_seconds.observe(time.perf_counter() - start)
+
+    async def send_state_snapshot(self, user: User) -> None:
+        """Send one user the full state, used when a delta subscriber joins or detects a version gap"""
+        await user.send_encoded(self.encode_state_update(user.is_spy_master, False, user.connection.wire_format), "stateUpdate")
+
+    def _public_summary(self) -> Tuple[int, int, Optional[Tuple[str, int]], Optional[str]]:
+        return self.current_turn.index, self.guesses_remaining, self.clue, self.check_win()
+
+    def _state_delta(self, is_on_turn_update: bool) -> Optional[Dict[str, Any]]:
+        """The changes since the last broadcast as a stateDelta, or None if nothing changed"""
+        if self.state_version == self._broadcast_version:
+            return None
+        changes: List[Dict[str, Any]] = [
+            {"type": "tileRevealed", "index": index, "team": self.tiles[index].team}
+            for index in self._pending_reveals
+        ]
+        on_turn_role, guesses_remaining, clue, winner = summary = self._public_summary()
+        previous_role, previous_guesses, previous_clue, previous_winner = self._broadcast_summary
+        if (on_turn_role, guesses_remaining) != (previous_role, previous_guesses):
+            changes.append({"type": "turnChanged", "onTurnRole": on_turn_role, "guessesRemaining": guesses_remaining})
+        if clue != previous_clue:
+            changes.append({"type": "clueSet", "clue": {"word": clue[0].upper(), "number": clue[1]} if clue else None})
+        if winner != previous_winner:
+            changes.append({"type": "winnerDecided", "winner": winner})
+        delta = {
+            "serverMessageType": "stateDelta",
+            "baseVersion": self._broadcast_version,
+            "version": self.state_version,
+            "new_turn": is_on_turn_update,
+            "changes": changes,
+        }
+        self._broadcast_version = self.state_version
+        self._broadcast_summary = summary
+        self._pending_reveals.clear()
+        return delta
+
+    def encode_state_update(self, for_spymaster: bool, is_on_turn_update: bool, wire_format: WireFormat = JSON) -> Payload:
+        key = (for_spymaster, is_on_turn_update, wire_format.name)
+        encoded = self._encoded_states.get(key)
+        if encoded is None:
+            encoded = wire_format.encode(self._build_state_update(for_spymaster, is_on_turn_update))
+            self._encoded_states[key] = encoded
+        return encoded
 
     def get_state_update(self, user: User, is_on_turn_update: bool) -> dict:
+        return self._build_state_update(user.is_spy_master, is_on_turn_update)
+
+    def _build_state_update(self, for_spymaster: bool, is_on_turn_update: bool) -> dict:
+        if self._players_json is None:
+            self._players_json = [u.to_json() for u in self.users]
         return {
             "serverMessageType": "stateUpdate",
-            "tiles": [tile.to_json(user.is_spy_master) for tile in self.tiles],
-            "players": [u.to_json() for u in self.users],
+            "version": self.state_version,
+            "tiles": [tile.to_json(for_spymaster) for tile in self.tiles],
+            "players": self._players_json,
             "onTurnRole": self.current_turn.index,
             "guessesRemaining": self.guesses_remaining,
             "clue": {"word": self.clue[0].upper(), "number": self.clue[1]} if self.clue else None,
@@ -46,25 +234,59 @@ class CodenamesGame:
         }
 
     def check_win(self) -> Optional[Literal["red", "blue"]]:
-        if not any(tile.team == "red" and not tile.revealed for tile in self.tiles):
+        remaining = self.remaining
+        if not remaining["red"]:
             return "red"
-        if not any(tile.team == "blue" and not tile.revealed for tile in self.tiles):
+        if not remaining["blue"]:
             return "blue"
-        if any(tile.team == "assassin" and tile.revealed for tile in self.tiles):
+        if self.assassin_revealed:
             return self.current_turn.value[0]
         return None
 
+    def get_tile(self, word: str) -> Tile:
+        """Look up a tile by word, ignoring case and spaces"""
+        position = self._tile_positions.get(normalise_word(word))
+        if position is None:
+            raise ValueError(f"No tile found for word {word}")
+        return self.tiles[position]
+
+    def reveal_tile(self, tile: Tile) -> None:
+        if self._reveal(tile):
+            self.mark_state_changed()
+
+    def _reveal(self, tile: Tile) -> bool:
+        """Turn a tile over without marking the state changed, False if it already was"""
+        if not tile.reveal():
+            return False
+        position = self._tile_positions[normalise_word(tile.word)]
+        self.remaining[tile.team] -= 1
+        if tile.team == "assassin":
+            self.assassin_revealed = True
+        self._pending_reveals.append(position)
+        return True
+
     async def guess_tile(self, user: User, tile: Tile) -> None:
         if self.check_win():
             print("Ignoring guess as game is over")
             return
         if self.is_user_turn(user) and not user.is_spy_master:
-            tile.reveal()
-            may_continue: bool = self.update_guesses_remaining(tile, user)
-            await self.broadcast_state_update(self.guesses_remaining <= 0)
-            on_turn = self.get_on_turn_user()
-            if not may_continue and not on_turn.is_human:
-                asyncio.create_task(self.clue_service.create_clue(self, on_turn))
+            with tracer.span("game.guess_tile", word=tile.word):
+                self.events.guess(self.current_turn, tile.word)
+                self._reveal(tile)
+                may_continue: bool = self.update_guesses_remaining(tile, user)
+                # Once for the whole guess, the reveal and the turn change are one move
+                self.mark_state_changed()
+                await self.broadcast_state_update(self.guesses_remaining <= 0)
+                if self.check_win():
+                    self._stop_counting_as_active()
+                    self.clue_service.cancel_speculation()
+                    self.ai_tasks.cancel_all()
+                    return
+                on_turn = self.get_on_turn_user()
+                if not may_continue and not on_turn.is_human:
+                    self.start_ai_turn(on_turn)
+                elif may_continue:
+                    self._speculate_next_clue()
         else:
             print(f"Ignoring guess from {user.name} as it is not their turn")
 
@@ -78,6 +300,28 @@ class CodenamesGame:
                 return user
         raise ValueError("No user found for current turn")
 
+    def get_user_for_role(self, role: Role) -> Optional[User]:
+        for user in self.users:
+            if (user.team, user.is_spy_master) == role.value:
+                return user
+        return None
+
+    def _speculate_next_clue(self) -> None:
+        """Let the next AI spymaster start on their clue while the current team is still guessing"""
+        if self.current_turn.is_spymaster or self.check_win():
+            return
+        other_team = "red" if self.current_turn.team == "blue" else "blue"
+        spymaster = self.get_user_for_role(Role.from_team_and_role(other_team, True))
+        if spymaster is not None and not spymaster.is_human:
+            self.clue_service.speculate_clue(self, spymaster)
+
+    def close(self) -> None:
+        """Stop any background AI work, called when the lobby is torn down"""
+        self._stop_counting_as_active()
+        self.clue_service.cancel_speculation()
+        self.ai_tasks.close()
+        self.events.close()
+
     def update_guesses_remaining(self, tile: Tile, user: User) -> bool:
         """Returns true if the same user may guess again"""
         if tile.team == user.team:
@@ -97,25 +341,32 @@ class CodenamesGame:
             print("Ignoring guess as game is over")
             return
         if self.is_user_turn(user) and user.is_spy_master:
-            self.clue = (word, number)
-            self.guesses_remaining = number
-            assert user.team is not None, "User team should be set"
-            self.current_turn = Role.from_team_and_role(user.team, False)
-            await self.broadcast_state_update(True)
-            on_turn_user = self.get_on_turn_user()
-            if not on_turn_user.is_human:
-                asyncio.create_task(self.clue_service.make_guesses(word, number, self, on_turn_user))
+            with tracer.span("game.provide_clue", word=word, number=number):
+                self.events.clue(self.current_turn, word, number)
+                self.clue = (word, number)
+                self.guesses_remaining = number
+                assert user.team is not None, "User team should be set"
+                self.current_turn = Role.from_team_and_role(user.team, False)
+                self.mark_state_changed()
+                await self.broadcast_state_update(True)
+                on_turn_user = self.get_on_turn_user()
+                if not on_turn_user.is_human:
+                    self.start_ai_turn(on_turn_user)
+                self._speculate_next_clue()
         else:
             print(f"Ignoring clue from {user.name} as it is not their turn")
 
     async def pass_turn(self, user: User):
         if self.is_user_turn(user) and not user.is_spy_master:
-            self.guesses_remaining = 0
-            assert user.team is not None, "User team should be set"
-            other_team = "red" if user.team == "blue" else "blue"
-            self.current_turn = Role.from_team_and_role(other_team, True)
-            self.clue = None
-            await self.broadcast_state_update(True)
-            on_turn = self.get_on_turn_user()
-            if not on_turn.is_human:
-                asyncio.create_task(self.clue_service.create_clue(self, on_turn))
+            with tracer.span("game.pass_turn"):
+                self.events.passed(self.current_turn)
+                self.guesses_remaining = 0
+                assert user.team is not None, "User team should be set"
+                other_team = "red" if user.team == "blue" else "blue"
+                self.current_turn = Role.from_team_and_role(other_team, True)
+                self.clue = None
+                self.mark_state_changed()
+                await self.broadcast_state_update(True)
+                on_turn = self.get_on_turn_user()
+                if not on_turn.is_human:
+                    self.start_ai_turn(on_turn)
@@ -0,0 +1,195 @@
+"""
+Compact binary snapshots of a game and its roster.
+
+A game snapshot holds the word pack name, then a bit packed board: each tile's index into the pack, a 2 bit team
+code per tile, a 25 bit revealed mask, the team on turn and whether there is a clue. The guesses remaining and the
+clue follow as bytes. A game on the default pack takes under 60 bytes. Players are stored separately in a roster
+snapshot, since the same roster is shared by a lobby and its game.
+
+Boards refer to their word pack by name, so the pack must be registered when a snapshot is decoded.
+"""
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+from codenames.game.game import CodenamesGame
+from codenames.game.word_packs import BOARD_SIZE, word_pack_store
+from codenames.gpt.chat_gpt import GPTConnection
+from codenames.model import TEAMS, CodenamesConnection, DetachedConnection, Role, Tile, User
+from codenames.services.clue_service import ClueService
+
+SNAPSHOT_VERSION = 1
+
+_TEAM_CODES = {team: code for code, team in enumerate(TEAMS)}
+
+# Roster flag bits, the role index plus one sits above them with 0 meaning no role yet
+_HUMAN, _READY, _IN_GAME, _IN_LOBBY, _UUID = 1, 2, 4, 8, 16
+_ROLE_SHIFT = 5
+
+
+class _BitWriter:
+    def __init__(self):
+        self.value = 0
+        self.bits = 0
+
+    def write(self, value: int, width: int) -> None:
+        self.value |= value << self.bits
+        self.bits += width
+
+    def to_bytes(self) -> bytes:
+        return self.value.to_bytes((self.bits + 7) // 8, "little")
+
+
+class _BitReader:
+    def __init__(self, data: bytes):
+        self.value = int.from_bytes(data, "little")
+
+    def read(self, width: int) -> int:
+        result = self.value & ((1 << width) - 1)
+        self.value >>= width
+        return result
+
+
+def _index_width(pack_size: int) -> int:
+    return max(1, (pack_size - 1).bit_length())
+
+
+def _write_text(out: bytearray, text: str) -> None:
+    encoded = text.encode("utf-8")
+    if len(encoded) > 255:
+        raise ValueError(f"'{text[:20]}...' is too long for a snapshot")
+    out.append(len(encoded))
+    out += encoded
+
+
+def _byte(value: int) -> int:
+    """Clamp a count into one byte, guesses remaining drops below zero after a correct guess on a clue of 0"""
+    return max(0, min(value, 255))
+
+
+def _read_text(data: bytes, offset: int) -> Tuple[str, int]:
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise ValueError("Truncated snapshot")
+    return data[offset + 1:end].decode("utf-8"), end
+
+
+def _check_version(data: bytes) -> None:
+    if not data or data[0] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {data[0] if data else None}")
+
+
+def encode_game(game: CodenamesGame) -> bytes:
+    """The board, turn, clue and guesses remaining of a game, without its players"""
+    if len(game.tiles) != BOARD_SIZE:
+        raise ValueError(f"Snapshots hold boards of {BOARD_SIZE} tiles, got {len(game.tiles)}")
+    pack = game.word_pack
+    out = bytearray([SNAPSHOT_VERSION])
+    _write_text(out, pack.name)
+    out += len(pack).to_bytes(2, "little")
+    width = _index_width(len(pack))
+    board = _BitWriter()
+    for tile in game.tiles:
+        board.write(pack.index_of(tile.word), width)
+    for tile in game.tiles:
+        board.write(_TEAM_CODES[tile.team], 2)
+    for tile in game.tiles:
+        board.write(tile.revealed, 1)
+    board.write(game.current_turn.index, 2)
+    board.write(game.clue is not None, 1)
+    out += board.to_bytes()
+    out.append(_byte(game.guesses_remaining))
+    if game.clue is not None:
+        out.append(_byte(game.clue[1]))
+        _write_text(out, game.clue[0])
+    return bytes(out)
+
+
+def decode_game(data: bytes, users: List[User], clue_service: Optional[ClueService] = None) -> CodenamesGame:
+    """Rebuild a live game from `encode_game`, played by `users`"""
+    _check_version(data)
+    pack_name, offset = _read_text(data, 1)
+    pack = word_pack_store.get(pack_name)
+    pack_size = int.from_bytes(data[offset:offset + 2], "little")
+    if pack_size != len(pack):
+        raise ValueError(f"Word pack '{pack_name}' has {len(pack)} words, the snapshot was taken with {pack_size}")
+    offset += 2
+    width = _index_width(pack_size)
+    board_bits = BOARD_SIZE * (width + 3) + 3
+    board_end = offset + (board_bits + 7) // 8
+    if board_end >= len(data):
+        raise ValueError("Truncated snapshot")
+    board = _BitReader(data[offset:board_end])
+    words = [pack.words[board.read(width)] for _ in range(BOARD_SIZE)]
+    teams = [TEAMS[board.read(2)] for _ in range(BOARD_SIZE)]
+    revealed = [bool(board.read(1)) for _ in range(BOARD_SIZE)]
+    current_turn = Role.from_index(board.read(2))
+    has_clue = board.read(1)
+    guesses_remaining = data[board_end]
+    clue = None
+    if has_clue:
+        number = data[board_end + 1]
+        word, _ = _read_text(data, board_end + 2)
+        clue = (word, number)
+    tiles = [Tile(word, team, is_revealed) for word, team, is_revealed in zip(words, teams, revealed)]
+    game = CodenamesGame(users, pack, None, clue_service, tiles)
+    game.restore_turn(current_turn, guesses_remaining, clue)
+    return game
+
+
+def encode_roster(users: List[User]) -> bytes:
+    """Each player's uuid, name, role and flags"""
+    out = bytearray([SNAPSHOT_VERSION, len(users)])
+    for user in users:
+        player_id = str(user.connection.uuid)
+        try:
+            packed_id: Optional[bytes] = uuid.UUID(player_id).bytes
+        except ValueError:
+            packed_id = None
+        role = Role.from_team_and_role(user.team, user.is_spy_master).index + 1 if user.team else 0
+        flags = (
+            (_HUMAN if user.is_human else 0) | (_READY if user.is_ready else 0) | (_IN_GAME if user.in_game else 0)
+            | (_IN_LOBBY if user.in_lobby else 0) | (_UUID if packed_id is not None else 0) | role << _ROLE_SHIFT
+        )
+        out.append(flags)
+        if packed_id is not None:
+            out += packed_id
+        else:
+            _write_text(out, player_id)
+        _write_text(out, user.name)
+    return bytes(out)
+
+
+def _restored_connection(player_id: str, is_human: bool) -> CodenamesConnection:
+    """Humans wait for their player to reconnect, AI players can play straight away"""
+    return DetachedConnection(player_id) if is_human else GPTConnection()
+
+
+def decode_roster(data: bytes, connection_factory: Callable[[str, bool], CodenamesConnection] = _restored_connection) -> List[User]:
+    """Rebuild the players from `encode_roster`, each given a connection by `connection_factory(uuid, is_human)`"""
+    _check_version(data)
+    if len(data) < 2:
+        raise ValueError("Truncated snapshot")
+    users = []
+    offset = 2
+    for _ in range(data[1]):
+        flags = data[offset]
+        offset += 1
+        if flags & _UUID:
+            player_id = str(uuid.UUID(bytes=data[offset:offset + 16]))
+            offset += 16
+        else:
+            player_id, offset = _read_text(data, offset)
+        name, offset = _read_text(data, offset)
+        is_human = bool(flags & _HUMAN)
+        connection = connection_factory(player_id, is_human)
+        connection.uuid = player_id
+        user = User(connection, is_human)
+        user.name = name
+        user.is_ready = bool(flags & _READY)
+        user.in_game = bool(flags & _IN_GAME)
+        user.in_lobby = bool(flags & _IN_LOBBY)
+        if role := flags >> _ROLE_SHIFT:
+            user.team, user.is_spy_master = Role.from_index(role - 1).value
+        users.append(user)
+    return users
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import pathlib
+import random
+import sys
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PACK = "default"
+BOARD_SIZE = 25
+MAX_WORD_LENGTH = 32
+
+_DEFAULT_WORDLIST_PATH = pathlib.Path(__file__).parent.parent.parent / "wordlist.txt"
+
+
+class WordPack:
+    """An immutable, validated list of board words"""
+    def __init__(self, name: str, words: Sequence[str]):
+        self.name = name
+        # Tuples of interned strings: every game sampling from this pack shares the same word objects
+        self.words: Tuple[str, ...] = tuple(sys.intern(word) for word in words)
+        self._indices: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def index_of(self, word: str) -> int:
+        """Position of a word in the pack, the index is only built for packs whose boards get encoded"""
+        if self._indices is None:
+            self._indices = {word: index for index, word in enumerate(self.words)}
+        return self._indices[word]
+
+    def sample_indices(self, rng: random.Random, count: int = BOARD_SIZE) -> List[int]:
+        """Pick `count` distinct word indices without touching the words themselves"""
+        return rng.sample(range(len(self.words)), count)
+
+
+def validate_words(words: Iterable[str]) -> List[str]:
+    """Strip, de-duplicate (case insensitively) and check a list of words is usable as a pack"""
+    cleaned: List[str] = []
+    seen = set()
+    for raw_word in words:
+        if not isinstance(raw_word, str):
+            raise ValueError(f"Word pack entries must be strings, got {type(raw_word).__name__}")
+        word = raw_word.strip()
+        if not word:
+            continue
+        if len(word) > MAX_WORD_LENGTH:
+            raise ValueError(f"Word '{word[:MAX_WORD_LENGTH]}...' is longer than {MAX_WORD_LENGTH} characters")
+        if "," in word:
+            raise ValueError(f"Word '{word}' must not contain a comma")
+        key = word.replace(" ", "").lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        cleaned.append(word)
+    if len(cleaned) < BOARD_SIZE:
+        raise ValueError(f"A word pack needs at least {BOARD_SIZE} distinct words, got {len(cleaned)}")
+    return cleaned
+
+
+class WordPackStore:
+    """Process wide store of word packs, each loaded and validated once"""
+    def __init__(self):
+        self._packs: Dict[str, WordPack] = {}
+        self._paths: Dict[str, pathlib.Path] = {DEFAULT_PACK: _DEFAULT_WORDLIST_PATH}
+        # Lobby supplied packs only live as long as a lobby or game holds them, clients cannot grow the store
+        self._custom: 'weakref.WeakValueDictionary[str, WordPack]' = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def register_file(self, name: str, path: pathlib.Path) -> None:
+        """Register a pack to be read lazily from a newline separated file"""
+        self._paths[name] = pathlib.Path(path)
+
+    def register(self, name: str, words: Iterable[str]) -> WordPack:
+        """Validate and store a pack from an in-memory list of words"""
+        pack = WordPack(name, validate_words(words))
+        with self._lock:
+            self._packs[name] = pack
+        logger.info(f"Registered word pack '{name}' with {len(pack)} words")
+        return pack
+
+    def register_custom(self, words: Iterable[str]) -> WordPack:
+        """Validate a lobby supplied word list, sharing the pack between the lobbies using identical lists.
+
+        The caller has to keep a reference to the pack, it is dropped from the store once nothing uses it.
+        """
+        cleaned = validate_words(words)
+        name = "custom-" + hashlib.sha1("\n".join(cleaned).encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            pack = self._custom.get(name)
+            if pack is None:
+                pack = self._custom[name] = WordPack(name, cleaned)
+        return pack
+
+    def get(self, name: str = DEFAULT_PACK) -> WordPack:
+        pack = self._packs.get(name) or self._custom.get(name)
+        if pack is not None:
+            return pack
+        path = self._paths.get(name)
+        if path is None:
+            raise KeyError(f"Unknown word pack: {name}")
+        with open(path) as f:
+            return self.register(name, f.read().splitlines())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._packs or name in self._paths or name in self._custom
+
+    def names(self) -> List[str]:
+        """The named packs, custom packs are private to the lobbies that brought them"""
+        return sorted(set(self._packs) | set(self._paths))
+
+    def preload(self) -> None:
+        """Eagerly load every registered pack, so no game start has to do file I/O"""
+        for name in list(self._paths):
+            self.get(name)
+
+
+word_pack_store = WordPackStore()
+
+
+def sample_board(pack: WordPack, rng: Optional[random.Random] = None) -> Tuple[List[int], List[str]]:
+    """Choose the word indices and team layout for a new board"""
+    rng = rng or random.Random()
+    indices = pack.sample_indices(rng)
+    teams = ["red"] * 9 + ["blue"] * 8 + ["assassin"] + ["neutral"] * 7
+    rng.shuffle(teams)
+    return indices, teams
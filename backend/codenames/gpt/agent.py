@@ -0,0 +1,123 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from codenames.gpt.chat_gpt import ChatGPT
+from codenames.gpt.response_cache import ResponseCache
+from codenames.model import Tile, User
+from codenames.options import AI_PLAYER, FALLBACK_AI_PLAYER
+
+logger = logging.getLogger(__name__)
+
+
+class Agent(ABC):
+    """An AI player, able to act as both spymaster and guesser"""
+
+    @abstractmethod
+    async def provide_clue(self, user: User, tiles: List[Tile]) -> Tuple[str, int]:
+        pass
+
+    @abstractmethod
+    async def make_guesses(self, word: str, number: int, tiles: List[Tile]) -> List[str]:
+        pass
+
+    async def stream_guesses(self, word: str, number: int, tiles: List[Tile]) -> AsyncIterator[str]:
+        """Yield guesses as they become available, agents that can stream their answer override this"""
+        for guess in await self.make_guesses(word, number, tiles):
+            yield guess
+
+
+AgentFactory = Callable[[Optional[ResponseCache]], Agent]
+
+_agent_factories: Dict[str, AgentFactory] = {}
+
+
+def register_agent(name: str) -> Callable[[AgentFactory], AgentFactory]:
+    """Register a factory taking the response cache (None to disable caching) and returning an agent"""
+    def decorator(factory: AgentFactory) -> AgentFactory:
+        _agent_factories[name] = factory
+        return factory
+    return decorator
+
+
+def available_agents() -> List[str]:
+    return sorted(_agent_factories)
+
+
+def create_agent(name: Optional[str] = None, cache: Optional[ResponseCache] = None, fallback: Optional[str] = FALLBACK_AI_PLAYER) -> Agent:
+    """Create the agent configured by `aiPlayer`, or the one named, behind a circuit breaker when a fallback is set"""
+    name = name or AI_PLAYER
+    factory = _agent_factories.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown AI agent '{name}', expected one of {available_agents()}")
+    try:
+        agent = factory(cache)
+    except (ImportError, OSError, ValueError) as e:
+        # A missing optional dependency or data file should not stop games from starting
+        if not fallback or fallback == name:
+            raise
+        logger.error(f"Could not create AI agent '{name}', using '{fallback}' instead: {e}")
+        return create_agent(fallback, cache, fallback=None)
+    if not fallback or fallback == name:
+        return agent
+    from codenames.gpt.circuit_breaker import BreakerAgent, get_breaker
+    return BreakerAgent(agent, create_agent(fallback, cache, fallback=None), get_breaker(name))
+
+
+class GPTAgent(Agent):
+    def __init__(self, cache: Optional[ResponseCache] = None):
+        self.chat_gpt: ChatGPT = ChatGPT(cache)
+
+    async def provide_clue(self, user: User, tiles: List[Tile]) -> Tuple[str, int]:
+        clue_word, clue_number = await self.chat_gpt.get_clue(
+            [tile.word for tile in tiles if tile.team == user.team and not tile.revealed],
+            [tile.word for tile in tiles if tile.team != user.team and not tile.revealed]
+        )
+        return (clue_word, clue_number)
+
+    async def make_guesses(self, word: str, number: int, tiles: List[Tile]) -> List[str]:
+        guess_words = await self.chat_gpt.guess((word, number), [tile.word for tile in tiles if not tile.revealed])
+
+        return guess_words
+
+    async def stream_guesses(self, word: str, number: int, tiles: List[Tile]) -> AsyncIterator[str]:
+        if not self.chat_gpt.stream:
+            async for guess in super().stream_guesses(word, number, tiles):
+                yield guess
+            return
+        async for guess in self.chat_gpt.stream_guesses((word, number), [tile.word for tile in tiles if not tile.revealed]):
+            yield guess
+
+
+@register_agent("gpt")
+def _create_gpt_agent(cache: Optional[ResponseCache]) -> Agent:
+    return GPTAgent(cache)
+
+
+@register_agent("embedding")
+def _create_embedding_agent(cache: Optional[ResponseCache]) -> Agent:
+    # Imported lazily so numpy and the vector files are only needed when this agent is selected
+    from codenames.gpt.embedding_agent import EmbeddingAgent
+    return EmbeddingAgent.from_options()
+
+
+class HeuristicAgent(Agent):
+    """Deterministic local player with no dependencies, good enough to keep a game moving while the others are down"""
+    CLUES = ("THING", "OBJECT", "IDEA", "ITEM", "STUFF", "WORD")
+
+    async def provide_clue(self, user: User, tiles: List[Tile]) -> Tuple[str, int]:
+        board = {tile.word.upper() for tile in tiles}
+        clue = next((word for word in self.CLUES if word not in board), "HINT")
+        return (clue, 1)
+
+    async def make_guesses(self, word: str, number: int, tiles: List[Tile]) -> List[str]:
+        letters = set(word.lower())
+        candidates = sorted(
+            (tile.word for tile in tiles if not tile.revealed),
+            key=lambda candidate: (-len(letters & set(candidate.lower())), candidate),
+        )
+        return candidates[:max(number, 1)]
+
+
+@register_agent("heuristic")
+def _create_heuristic_agent(cache: Optional[ResponseCache]) -> Agent:
+    return HeuristicAgent()
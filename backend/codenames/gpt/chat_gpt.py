@@ -1,10 +1,21 @@
+import asyncio
+import contextlib
+import re
 import time
 import openai
 import logging
-from typing import List, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 
 from codenames.model import CodenamesConnection
-from codenames.options import OPEN_AI_KEY, GPT_MODEL
+from codenames.wire_format import Payload
+from codenames.gpt.client import get_openai_client
+from codenames.gpt.resilience import resilient_call, turn_time_left
+from codenames.gpt.response_cache import ResponseCache
+from codenames.gpt.scheduler import llm_scheduler
+from codenames.metrics import llm_request_seconds, llm_tokens
+from codenames.options import GPT_MODEL, LLM_TIMEOUT, STREAM_RESPONSES
+from codenames.tracing import tracer
+from codenames.util import normalise_word
 
 SYSTEM_PROMPT_CLUE = (
     "You are playing codenames and it's your turn to give a clue. "
@@ -16,6 +27,13 @@ SYSTEM_PROMPT_GUESS = (
     "Return the words you think are most closely linked to the clue provided separated by commas on a single line e.g: WORD1,WORD2,WORD3"
 )
 
+# Clues and guess lists are a handful of words
+ESTIMATED_COMPLETION_TOKENS = 20
+
+_GUESS_SEPARATOR = re.compile(r"[,\n]")
+# A complete streamed clue, the character after the number shows the number is finished
+_STREAMED_CLUE = re.compile(r"^\s*([^,\n]+),\s*(\d+)\D")
+
 
 class GPTConnection(CodenamesConnection):
     
@@ -23,17 +41,102 @@ class GPTConnection(CodenamesConnection):
         '''No op for AI'''
         return
 
+    async def send_encoded(self, payload: Payload, message_type: str = ""):
+        '''No op for AI'''
+        return
+
 class ChatGPT:
-    def __init__(self):
-        self.client = openai.AsyncOpenAI(api_key=OPEN_AI_KEY)
+    def __init__(self, cache: Optional[ResponseCache] = None, client: Optional[openai.AsyncOpenAI] = None, stream: bool = STREAM_RESPONSES):
+        self.client = client or get_openai_client()
+        # None when the lobby wants fresh, non-deterministic answers
+        self.cache = cache
+        self.stream = stream
 
     async def get_clue(self, words_to_guess: List[str], words_to_avoid: List[str]) -> Tuple[str, int]:
+        cache_key = ResponseCache.make_key(GPT_MODEL, "clue", words_to_guess, words_to_avoid)
+        if self.cache and (cached := await self.cache.get(cache_key)):
+            logging.debug(f"Using cached clue for {words_to_guess}")
+            return cached[0], cached[1]
+        clue, number = await self._request_clue(words_to_guess, words_to_avoid)
+        if self.cache and clue:
+            await self.cache.put(cache_key, (clue, number))
+        return clue, number
+
+    async def guess(self, clue: Tuple[str, int], words: List[str]) -> List[str]:
+        cache_key = ResponseCache.make_key(GPT_MODEL, "guess", words, clue=clue)
+        if self.cache and (cached := await self.cache.get(cache_key)):
+            logging.debug(f"Using cached guesses for clue {clue}")
+            return list(cached)
+        guesses = await self._request_guesses(clue, words)
+        if self.cache and guesses:
+            await self.cache.put(cache_key, guesses)
+        return guesses
+
+    async def stream_guesses(self, clue: Tuple[str, int], words: List[str]) -> AsyncIterator[str]:
+        """Yield each valid guess as soon as the model has finished writing it"""
+        cache_key = ResponseCache.make_key(GPT_MODEL, "guess", words, clue=clue)
+        if self.cache and (cached := await self.cache.get(cache_key)):
+            logging.debug(f"Using cached guesses for clue {clue}")
+            for guess in cached:
+                yield guess
+            return
+        allowed = {normalise_word(word) for word in words}
+        guesses: List[str] = []
+        seen = set()
+        async with contextlib.aclosing(self._stream_gpt_response(SYSTEM_PROMPT_GUESS, self._guess_prompt(clue, words))) as chunks, \
+                contextlib.aclosing(self._split_stream(chunks)) as items:
+            async for item in items:
+                guess = item.strip()
+                key = normalise_word(guess)
+                if key not in allowed or key in seen:
+                    continue
+                seen.add(key)
+                guesses.append(guess)
+                yield guess
+                if len(guesses) >= clue[1]:
+                    break
+        logging.debug(f"GPT streamed guesses: {guesses}")
+        if self.cache and guesses:
+            await self.cache.put(cache_key, guesses)
+
+    @staticmethod
+    async def _split_stream(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Re-split streamed text on the guess separators, the last item is flushed when the stream ends"""
+        buffer = ""
+        async for chunk in chunks:
+            buffer += chunk
+            *complete, buffer = _GUESS_SEPARATOR.split(buffer)
+            for item in complete:
+                yield item
+        yield buffer
+
+    @staticmethod
+    def _clue_prompt(words_to_guess: List[str], words_to_avoid: List[str]) -> str:
+        return f"Your team's words that you must link are [{','.join(words_to_guess)}] and the other team's words that you MUST NOT link to are [{','.join(words_to_avoid)}]"
+
+    @staticmethod
+    def _guess_prompt(clue: Tuple[str, int], words: List[str]) -> str:
+        return f"The possible words are [{','.join(words)}], you must choose the {clue[1]} words from the list I have given you that link most closely to '{clue[0]}'. Make sure your guesses are from the list [{','.join(words)}], and all link to the clue '{clue[0]}'"
+
+    async def _stream_clue(self, words_to_guess: List[str], words_to_avoid: List[str]) -> Tuple[str, int]:
+        """Stop reading the completion as soon as it contains a whole CLUE,N answer"""
+        content = ""
+        async with contextlib.aclosing(self._stream_gpt_response(SYSTEM_PROMPT_CLUE, self._clue_prompt(words_to_guess, words_to_avoid))) as chunks:
+            async for chunk in chunks:
+                content += chunk
+                if match := _STREAMED_CLUE.match(content):
+                    content = f"{match.group(1)},{match.group(2)}"
+                    break
+        return self._parse_clue_response(content)
+
+    async def _request_clue(self, words_to_guess: List[str], words_to_avoid: List[str]) -> Tuple[str, int]:
         logging.debug(f"Getting clue from GPT to link {words_to_guess}")
         start = time.time()
-        response = await self._get_gpt_response(
-            SYSTEM_PROMPT_CLUE,
-            f"Your team's words that you must link are [{','.join(words_to_guess)}] and the other team's words that you MUST NOT link to are [{','.join(words_to_avoid)}]"
-        )
+        if self.stream:
+            clue, number = await self._stream_clue(words_to_guess, words_to_avoid)
+            logging.debug(f"GPT streamed clue: {clue}, {number} in {time.time() - start}")
+            return clue, number
+        response = await self._get_gpt_response(SYSTEM_PROMPT_CLUE, self._clue_prompt(words_to_guess, words_to_avoid))
         logging.debug(f"GPT response time: {time.time() - start}")
 
         if response.choices[0].finish_reason != "stop":
@@ -49,12 +152,9 @@ class ChatGPT:
         logging.debug(f"GPT clue: {clue}, {number}")
         return clue, number
 
-    async def guess(self, clue: Tuple[str, int], words: List[str]) -> List[str]:
+    async def _request_guesses(self, clue: Tuple[str, int], words: List[str]) -> List[str]:
         logging.debug(f"GPT guessing for clue {clue}")
-        response = await self._get_gpt_response(  # Make this async
-            SYSTEM_PROMPT_GUESS,
-            f"The possible words are [{','.join(words)}], you must choose the {clue[1]} words from the list I have given you that link most closely to '{clue[0]}'. Make sure your guesses are from the list [{','.join(words)}], and all link to the clue '{clue[0]}'"
-        )
+        response = await self._get_gpt_response(SYSTEM_PROMPT_GUESS, self._guess_prompt(clue, words))
 
         if response.choices[0].finish_reason != "stop":
             logging.error(f"Failed to get response from chat GPT: {response.choices[0].finish_reason}")
@@ -70,17 +170,89 @@ class ChatGPT:
         return guesses
 
     async def _get_gpt_response(self, system_prompt: str, user_prompt: str):
+        estimated_tokens = self._estimate_tokens(system_prompt, user_prompt)
+        # The span covers the waits for scheduler slots as well as the requests themselves
+        with tracer.span("llm.completion", estimatedTokens=estimated_tokens):
+            try:
+                response = await resilient_call(lambda: self._request_completion(system_prompt, user_prompt, estimated_tokens), timeout=None)
+            except Exception as e:
+                logging.error(f"Error getting GPT response: {e}")
+                raise
+        if response.usage is not None:
+            llm_scheduler.record_usage(response.usage.total_tokens, estimated_tokens)
+            llm_tokens.inc(response.usage.prompt_tokens, kind="prompt")
+            llm_tokens.inc(response.usage.completion_tokens, kind="completion")
+        return response
+
+    async def _request_completion(self, system_prompt: str, user_prompt: str, estimated_tokens: int):
+        """One attempt or hedge, in a scheduler slot of its own so every request on the wire is rate limited"""
+        async with llm_scheduler.slot(estimated_tokens):
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(self.client.chat.completions.create(
+                    model=GPT_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt},
+                    ]
+                ), LLM_TIMEOUT)
+            except Exception:
+                llm_request_seconds.observe(time.perf_counter() - start, mode="completion", outcome="error")
+                raise
+            llm_request_seconds.observe(time.perf_counter() - start, mode="completion", outcome="ok")
+            return response
+
+    async def _open_stream(self, system_prompt: str, user_prompt: str, estimated_tokens: int):
+        """One attempt at opening a completion stream, in a scheduler slot of its own.
+
+        Returns the stream and an exit stack holding the slot, which closes the stream and frees the slot.
+        """
+        stack = contextlib.AsyncExitStack()
+        await stack.enter_async_context(llm_scheduler.slot(estimated_tokens))
+        start = time.perf_counter()
         try:
-            return await self.client.chat.completions.create(
+            stream = await asyncio.wait_for(self.client.chat.completions.create(
                 model=GPT_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt},
-                ]
-            )
+                ],
+                stream=True,
+            ), LLM_TIMEOUT)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                llm_request_seconds.observe(time.perf_counter() - start, mode="stream", outcome="error")
+            await stack.aclose()
+            raise
+        # Streams are timed until the response starts, their length depends on how much the caller reads
+        llm_request_seconds.observe(time.perf_counter() - start, mode="stream", outcome="ok")
+        stack.push_async_callback(stream.close)
+        return stack, stream
+
+    async def _stream_gpt_response(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Yield the completion's text as it arrives, holding a scheduler slot until the stream is closed"""
+        estimated_tokens = self._estimate_tokens(system_prompt, user_prompt)
+        try:
+            # Only opening the stream is retried, once text has been handed out a retry could contradict it
+            stack, stream = await resilient_call(lambda: self._open_stream(system_prompt, user_prompt, estimated_tokens), timeout=None, hedge=False)
         except Exception as e:
             logging.error(f"Error getting GPT response: {e}")
             raise
+        async with stack:
+            chunks = stream.__aiter__()
+            while True:
+                left = turn_time_left()
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), LLM_TIMEOUT if left is None else min(LLM_TIMEOUT, left))
+                except StopAsyncIteration:
+                    break
+                if chunk.choices and (content := chunk.choices[0].delta.content):
+                    yield content
+
+    @staticmethod
+    def _estimate_tokens(system_prompt: str, user_prompt: str) -> int:
+        """Rough prompt size (about four characters a token) plus a short completion"""
+        return (len(system_prompt) + len(user_prompt)) // 4 + ESTIMATED_COMPLETION_TOKENS
 
     def _parse_clue_response(self, content: str) -> Tuple[str, int]:
         try:
@@ -94,7 +266,7 @@ class ChatGPT:
 
     def _parse_guess_response(self, content: str, words: List[str], num_guesses: int) -> List[str]:
         assumed_guesses = [word.strip() for word in content.split(',')]
-        lowered = [word.replace(" ", "").lower() for word in words]
-        allowed_guesses = [word for word in assumed_guesses if word.replace(" ", "").lower() in lowered][:num_guesses]
+        lowered = {normalise_word(word) for word in words}
+        allowed_guesses = [word for word in assumed_guesses if normalise_word(word) in lowered][:num_guesses]
         logging.debug(f"Interpreted as guessing: {allowed_guesses}")
         return allowed_guesses
@@ -0,0 +1,201 @@
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from codenames.gpt.agent import Agent
+from codenames.metrics import registry
+from codenames.model import Tile, User
+from codenames.options import (
+    BREAKER_ERROR_RATE,
+    BREAKER_MIN_CALLS,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_SLOW_CALL_SECONDS,
+    BREAKER_WINDOW_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Tracks the rolling error rate and latency of an agent and trips when either gets too bad.
+
+    While open every request goes to the fallback. After `open_seconds` a single probe is let through
+    (half open), and its outcome either closes the breaker again or re-opens it.
+    """
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = BREAKER_WINDOW_SECONDS,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = BreakerState.CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        # (finished at, succeeded, latency)
+        self._outcomes: Deque[Tuple[float, bool, float]] = deque()
+        self.transitions: Dict[str, int] = {}
+        self.fallback_calls = 0
+
+    def allow_request(self) -> bool:
+        """Whether the next request may go to the primary agent"""
+        if self.state is BreakerState.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self._transition(BreakerState.HALF_OPEN)
+        if self.state is BreakerState.CLOSED:
+            return True
+        if self.state is BreakerState.HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.fallback_calls += 1
+        return False
+
+    def record(self, succeeded: bool, latency: float) -> None:
+        now = time.monotonic()
+        # Slow answers count against the agent as much as errors do
+        healthy = succeeded and latency < self.slow_call_seconds
+        if self.state is BreakerState.HALF_OPEN:
+            self.probe_in_flight = False
+            self._outcomes.clear()
+            self._transition(BreakerState.CLOSED if healthy else BreakerState.OPEN)
+            return
+        self._outcomes.append((now, healthy, latency))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+        if self.state is BreakerState.CLOSED and len(self._outcomes) >= self.min_calls and self.failure_rate() >= self.error_rate:
+            self._transition(BreakerState.OPEN)
+
+    def abandon(self) -> None:
+        """A request was cancelled or closed before it had an outcome, which says nothing about the agent.
+        A half open breaker lets the next request probe instead."""
+        self.probe_in_flight = False
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, healthy, _ in self._outcomes if not healthy) / len(self._outcomes)
+
+    def _transition(self, state: BreakerState) -> None:
+        if state is self.state:
+            return
+        key = f"{self.state.value}->{state.value}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        logger.warning(f"Circuit breaker '{self.name}' {key}")
+        self.state = state
+        if state is BreakerState.OPEN:
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        latencies = [latency for _, _, latency in self._outcomes]
+        return {
+            "state": self.state.value,
+            "failureRate": self.failure_rate(),
+            "windowCalls": len(self._outcomes),
+            "averageLatencySeconds": sum(latencies) / len(latencies) if latencies else 0.0,
+            "fallbackCalls": self.fallback_calls,
+            "transitions": dict(self.transitions),
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """One breaker per primary agent type, shared by every game since they share the upstream provider"""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+        registry.register_stats("circuit_breaker", _breakers[name].stats, agent=name)
+    return _breakers[name]
+
+
+def all_breakers() -> List[CircuitBreaker]:
+    return list(_breakers.values())
+
+
+class BreakerAgent(Agent):
+    """Routes to the primary agent while its breaker is closed and to the fallback otherwise"""
+    def __init__(self, primary: Agent, fallback: Agent, breaker: CircuitBreaker):
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker
+
+    async def provide_clue(self, user: User, tiles: List[Tile]) -> Tuple[str, int]:
+        if self.breaker.allow_request():
+            start = time.monotonic()
+            try:
+                clue, number = await self.primary.provide_clue(user, tiles)
+            except Exception as e:
+                self.breaker.record(False, time.monotonic() - start)
+                logger.error(f"Primary agent failed to give a clue, using fallback: {e}")
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            else:
+                # An unparseable answer is as useless as an error
+                self.breaker.record(bool(clue), time.monotonic() - start)
+                if clue:
+                    return clue, number
+        return await self.fallback.provide_clue(user, tiles)
+
+    async def make_guesses(self, word: str, number: int, tiles: List[Tile]) -> List[str]:
+        if self.breaker.allow_request():
+            start = time.monotonic()
+            try:
+                guesses = await self.primary.make_guesses(word, number, tiles)
+            except Exception as e:
+                self.breaker.record(False, time.monotonic() - start)
+                logger.error(f"Primary agent failed to guess, using fallback: {e}")
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            else:
+                self.breaker.record(True, time.monotonic() - start)
+                return guesses
+        return await self.fallback.make_guesses(word, number, tiles)
+
+    async def stream_guesses(self, word: str, number: int, tiles: List[Tile]) -> AsyncIterator[str]:
+        if not self.breaker.allow_request():
+            async for guess in self.fallback.stream_guesses(word, number, tiles):
+                yield guess
+            return
+        start = time.monotonic()
+        # Only the wait for the first guess is the provider's, later gaps include the consumer playing each guess
+        first_guess_latency: Optional[float] = None
+        try:
+            async for guess in self.primary.stream_guesses(word, number, tiles):
+                if first_guess_latency is None:
+                    first_guess_latency = time.monotonic() - start
+                yield guess
+        except Exception as e:
+            self.breaker.record(False, time.monotonic() - start if first_guess_latency is None else first_guess_latency)
+            if first_guess_latency is not None:
+                # Guesses already played cannot be taken back, end the turn here
+                logger.error(f"Primary agent failed part way through guessing: {e}")
+                return
+            logger.error(f"Primary agent failed to guess, using fallback: {e}")
+            async for guess in self.fallback.stream_guesses(word, number, tiles):
+                yield guess
+            return
+        except BaseException:
+            # Closed by the consumer, usually after a wrong guess, or cancelled with the turn
+            if first_guess_latency is None:
+                self.breaker.abandon()
+            else:
+                self.breaker.record(True, first_guess_latency)
+            raise
+        self.breaker.record(True, time.monotonic() - start if first_guess_latency is None else first_guess_latency)
@@ -0,0 +1,62 @@
+import logging
+from typing import Optional
+
+import httpx
+import openai
+
+from codenames.options import (
+    OPEN_AI_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_HTTP2,
+    OPENAI_KEEPALIVE_EXPIRY,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[openai.AsyncOpenAI] = None
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    http2 = OPENAI_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("openaiHttp2 is set but the h2 package is not installed, falling back to HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """The process wide OpenAI client, every agent shares its connection pool"""
+    global _client
+    if _client is None:
+        if not OPEN_AI_KEY:
+            # Raised while the gpt agent is created, so create_agent falls back to another player
+            raise ValueError("OPENAI_KEY must be set via environment variable or .properties.json")
+        # Retries are handled by codenames.gpt.resilience so they respect the turn's latency budget
+        _client = openai.AsyncOpenAI(
+            api_key=OPEN_AI_KEY,
+            base_url=OPENAI_BASE_URL,
+            http_client=_create_http_client(),
+            max_retries=0,
+        )
+    return _client
+
+
+async def close_openai_client() -> None:
+    """Close the shared client's connections, called once at shutdown"""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.close()
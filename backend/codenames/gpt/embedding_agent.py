@@ -0,0 +1,176 @@
+"""
+Offline AI player that ranks clues and guesses with pre-computed word vectors.
+
+The vectors live in a directory containing `vectors.npy`, a float32 matrix with one unit length row per word,
+and `vocab.txt` with the matching words one per line, most frequent first. The matrix is memory-mapped, so
+several server processes share one copy through the page cache. Build the files from a GloVe style text file with:
+
+    python -m codenames.gpt.embedding_agent glove.6B.300d.txt embeddings/ --limit 200000
+"""
+import argparse
+import functools
+import logging
+import pathlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from codenames.gpt.agent import Agent
+from codenames.model import Tile, User
+from codenames.options import EMBEDDING_CLUE_VOCAB, EMBEDDINGS_PATH
+from codenames.util import normalise_word
+
+logger = logging.getLogger(__name__)
+
+# A linked word must be this much closer to the clue than the closest word to avoid
+SAFETY_MARGIN = 0.05
+ASSASSIN_MARGIN = 0.1
+MIN_SIMILARITY = 0.2
+PREFIX_LENGTH = 4
+
+
+class WordVectors:
+    """Memory-mapped word vectors plus the candidate clue matrix derived from them"""
+    def __init__(self, directory: pathlib.Path, clue_vocab_size: int):
+        self.matrix = np.load(directory / "vectors.npy", mmap_mode="r")
+        with open(directory / "vocab.txt") as f:
+            self.vocab: List[str] = f.read().splitlines()
+        if len(self.vocab) != self.matrix.shape[0]:
+            raise ValueError(f"vocab.txt has {len(self.vocab)} words but vectors.npy has {self.matrix.shape[0]} rows")
+        self.index: Dict[str, int] = {word: i for i, word in enumerate(self.vocab)}
+
+        # Clue candidates are the most frequent plain words, copied into memory once as they are scored every turn
+        candidate_rows = [
+            i for i, word in enumerate(self.vocab[:clue_vocab_size])
+            if word.isalpha() and word.islower() and len(word) > 2
+        ]
+        self.candidate_rows = np.asarray(candidate_rows, dtype=np.int64)
+        self.candidate_matrix = np.ascontiguousarray(self.matrix[self.candidate_rows])
+        self.candidate_position: Dict[int, int] = {row: i for i, row in enumerate(candidate_rows)}
+        prefixes: Dict[str, List[int]] = {}
+        for position, row in enumerate(candidate_rows):
+            prefixes.setdefault(self.vocab[row][:PREFIX_LENGTH], []).append(position)
+        self._candidates_by_prefix = {prefix: np.asarray(positions) for prefix, positions in prefixes.items()}
+
+    def vector(self, word: str) -> Optional[np.ndarray]:
+        """Vector for a board word, multi word tiles use the mean of their parts"""
+        parts = [self.index[part] for part in word.lower().split() if part in self.index]
+        if not parts:
+            row = self.index.get(normalise_word(word))
+            if row is None:
+                return None
+            parts = [row]
+        vector = np.asarray(self.matrix[parts], dtype=np.float32).mean(axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def excluded_candidates(self, words: List[str]) -> np.ndarray:
+        """Candidate positions that are board words or share their stem, which the rules forbid as clues"""
+        excluded: List[np.ndarray] = []
+        for word in words:
+            for part in word.lower().split() + [normalise_word(word)]:
+                if part[:PREFIX_LENGTH] in self._candidates_by_prefix:
+                    excluded.append(self._candidates_by_prefix[part[:PREFIX_LENGTH]])
+        return np.concatenate(excluded) if excluded else np.empty(0, dtype=np.int64)
+
+
+@functools.lru_cache(maxsize=None)
+def load_word_vectors(path: str = EMBEDDINGS_PATH, clue_vocab_size: int = EMBEDDING_CLUE_VOCAB) -> WordVectors:
+    """Load each vector set once per process"""
+    logger.info(f"Loading word vectors from {path}")
+    return WordVectors(pathlib.Path(path), clue_vocab_size)
+
+
+class EmbeddingAgent(Agent):
+    """Local agent scoring every candidate clue against the board in a handful of matrix operations"""
+    def __init__(self, vectors: WordVectors):
+        self.vectors = vectors
+
+    @classmethod
+    def from_options(cls) -> 'EmbeddingAgent':
+        return cls(load_word_vectors())
+
+    def _stack(self, words: List[str]) -> np.ndarray:
+        vectors = [vector for word in words if (vector := self.vectors.vector(word)) is not None]
+        if not vectors:
+            return np.empty((0, self.vectors.matrix.shape[1]), dtype=np.float32)
+        return np.stack(vectors)
+
+    def choose_clue(self, team_words: List[str], other_words: List[str], assassin_words: List[str]) -> Tuple[str, int]:
+        team = self._stack(team_words)
+        if not len(team):
+            return "", 0
+        candidates = self.vectors.candidate_matrix
+        team_similarity = candidates @ team.T
+        threat = np.full(len(candidates), MIN_SIMILARITY, dtype=np.float32)
+        others = self._stack(other_words)
+        if len(others):
+            threat = np.maximum(threat, (candidates @ others.T).max(axis=1) + SAFETY_MARGIN)
+        assassins = self._stack(assassin_words)
+        if len(assassins):
+            threat = np.maximum(threat, (candidates @ assassins.T).max(axis=1) + ASSASSIN_MARGIN)
+
+        ranked = -np.sort(-team_similarity, axis=1)
+        # Number of team words, best first, that are closer to the candidate than anything to avoid
+        counts = np.cumprod(ranked > threat[:, None], axis=1).sum(axis=1)
+        # Prefer more links, then the largest margin on the weakest linked word
+        weakest = np.take_along_axis(ranked, np.maximum(counts - 1, 0)[:, None], axis=1)[:, 0]
+        scores = counts + np.clip(weakest - threat, 0, 1)
+        scores[self.vectors.excluded_candidates(team_words + other_words + assassin_words)] = -np.inf
+
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            # Every candidate is a board word, argmax would pick the first of them
+            return "", 0
+        clue = self.vectors.vocab[self.vectors.candidate_rows[best]]
+        return clue.upper(), max(int(counts[best]), 1)
+
+    def choose_guesses(self, clue: str, number: int, words: List[str]) -> List[str]:
+        clue_vector = self.vectors.vector(clue)
+        if clue_vector is None:
+            logger.info(f"Clue '{clue}' is not in the embedding vocabulary, passing")
+            return []
+        known = [word for word in words if self.vectors.vector(word) is not None]
+        if not known:
+            return []
+        similarity = self._stack(known) @ clue_vector
+        order = np.argsort(-similarity)[:number]
+        return [known[i] for i in order]
+
+    async def provide_clue(self, user: User, tiles: List[Tile]) -> Tuple[str, int]:
+        unrevealed = [tile for tile in tiles if not tile.revealed]
+        return self.choose_clue(
+            [tile.word for tile in unrevealed if tile.team == user.team],
+            [tile.word for tile in unrevealed if tile.team not in (user.team, "assassin")],
+            [tile.word for tile in unrevealed if tile.team == "assassin"],
+        )
+
+    async def make_guesses(self, word: str, number: int, tiles: List[Tile]) -> List[str]:
+        return self.choose_guesses(word, number, [tile.word for tile in tiles if not tile.revealed])
+
+
+def build_word_vectors(source: pathlib.Path, destination: pathlib.Path, limit: int) -> None:
+    """Convert a whitespace separated `word v1 v2 ...` text file into vectors.npy and vocab.txt"""
+    words: List[str] = []
+    rows: List[np.ndarray] = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            word, *values = line.rstrip().split(" ")
+            rows.append(np.asarray(values, dtype=np.float32))
+            words.append(word)
+            if len(words) >= limit:
+                break
+    matrix = np.stack(rows)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-8)
+    destination.mkdir(parents=True, exist_ok=True)
+    np.save(destination / "vectors.npy", matrix)
+    (destination / "vocab.txt").write_text("\n".join(words) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the embedding agent's word vector files")
+    parser.add_argument("source", type=pathlib.Path)
+    parser.add_argument("destination", type=pathlib.Path)
+    parser.add_argument("--limit", type=int, default=200000)
+    args = parser.parse_args()
+    build_word_vectors(args.source, args.destination, args.limit)
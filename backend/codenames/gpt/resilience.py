@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Iterator, Optional, Set, TypeVar
+
+import openai
+
+from codenames.metrics import registry
+from codenames.options import LLM_HEDGE, LLM_MAX_RETRIES, LLM_TIMEOUT, LLM_TURN_BUDGET
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Failures worth another attempt, anything else (bad request, authentication) fails straight away
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+# Hedging only starts once the tracker has enough samples for a meaningful p95
+MIN_LATENCY_SAMPLES = 20
+
+# Loop time by which the current AI turn must be done with the LLM, None outside a turn
+_turn_deadline: ContextVar[Optional[float]] = ContextVar("llm_turn_deadline", default=None)
+
+
+@contextlib.contextmanager
+def turn_budget(seconds: float = LLM_TURN_BUDGET) -> Iterator[None]:
+    """Bound every LLM attempt, retry and backoff made within this block (and tasks it spawns) to `seconds` in total"""
+    token = _turn_deadline.set(asyncio.get_running_loop().time() + seconds)
+    try:
+        yield
+    finally:
+        _turn_deadline.reset(token)
+
+
+def turn_time_left() -> Optional[float]:
+    """Seconds left of the current turn's budget, None outside a turn"""
+    deadline = _turn_deadline.get()
+    return None if deadline is None else deadline - asyncio.get_running_loop().time()
+
+
+class LatencyTracker:
+    """Recent successful call latencies, used to decide when to hedge"""
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if len(self._samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class ResilienceMetrics:
+    def __init__(self):
+        self.timeouts = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def stats(self) -> dict:
+        return {
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedgesWon": self.hedges_won,
+        }
+
+
+resilience_metrics = ResilienceMetrics()
+registry.register_stats("llm_resilience", resilience_metrics.stats)
+llm_latency = LatencyTracker()
+
+
+async def _timed(call: Awaitable[T], latency: LatencyTracker) -> T:
+    start = time.monotonic()
+    result = await call
+    latency.record(time.monotonic() - start)
+    return result
+
+
+async def _hedged(make_call: Callable[[], Awaitable[T]], latency: LatencyTracker, hedge: bool) -> T:
+    """Run the call, firing a duplicate if it outlives the p95 latency and taking whichever answers first"""
+    first = asyncio.ensure_future(_timed(make_call(), latency))
+    hedge_after = latency.percentile(0.95) if hedge else None
+    if hedge_after is None:
+        return await first
+    pending: Set['asyncio.Future[T]'] = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
+        resilience_metrics.hedges += 1
+        logger.info(f"LLM call slower than p95 ({hedge_after:.2f}s), sending a hedged request")
+        second = asyncio.ensure_future(_timed(make_call(), latency))
+        pending.add(second)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        resilience_metrics.hedges_won += 1
+                    return task.result()
+                error = task.exception()
+        assert error is not None
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def resilient_call(
+    make_call: Callable[[], Awaitable[T]],
+    timeout: Optional[float] = LLM_TIMEOUT,
+    max_retries: int = LLM_MAX_RETRIES,
+    hedge: bool = LLM_HEDGE,
+    latency: LatencyTracker = llm_latency,
+) -> T:
+    """Call `make_call` with a per-attempt deadline, jittered retries and optional hedging, within the turn's budget.
+
+    Each attempt and hedge is a separate `make_call`, so a caller going through the scheduler queues and is charged
+    for every request it puts on the wire. A `timeout` of None leaves the per-attempt deadline to `make_call`.
+    """
+    attempt = 0
+    while True:
+        limit, left = timeout, turn_time_left()
+        if left is not None:
+            limit = left if limit is None else min(limit, left)
+        try:
+            call = _hedged(make_call, latency, hedge)
+            return await (call if limit is None else asyncio.wait_for(call, limit))
+        except RETRYABLE_ERRORS as e:
+            if isinstance(e, asyncio.TimeoutError):
+                resilience_metrics.timeouts += 1
+            attempt += 1
+            backoff = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            left = turn_time_left()
+            if attempt > max_retries or (left is not None and backoff >= left):
+                resilience_metrics.failures += 1
+                logger.error(f"LLM call failed after {attempt} attempt(s): {e!r}")
+                raise
+            resilience_metrics.retries += 1
+            logger.warning(f"LLM call attempt {attempt} failed ({e!r}), retrying in {backoff:.2f}s")
+            await asyncio.sleep(backoff)
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+
+from codenames.metrics import registry
+from codenames.options import RESPONSE_CACHE_MAX_ROWS, RESPONSE_CACHE_PATH, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# The SQLite store is trimmed back to its row cap once every this many writes
+PRUNE_EVERY = 100
+
+
+class ResponseCache:
+    """LRU cache of parsed LLM answers with a TTL, optionally backed by a SQLite file that survives restarts.
+
+    The file is read and written on worker threads, so a slow disk never stalls the event loop, and holds at most
+    `max_rows` answers.
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, path: Optional[str] = None, max_rows: int = 100000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        # One connection shared by the worker threads, used by one of them at a time
+        self._db_lock = threading.Lock()
+        self._writes = 0
+
+    @staticmethod
+    def make_key(model: str, kind: str, words_to_guess: Iterable[str] = (), words_to_avoid: Iterable[str] = (), clue: Optional[Tuple[str, int]] = None) -> str:
+        """Canonical key for a request, word order and case do not matter"""
+        canonical = json.dumps([
+            model,
+            kind,
+            sorted(word.lower() for word in words_to_guess),
+            sorted(word.lower() for word in words_to_avoid),
+            [clue[0].lower(), clue[1]] if clue else None,
+        ], separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None and self.path is not None:
+            entry = await asyncio.to_thread(self._load, key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is not None and now - entry[0] > self.ttl_seconds:
+            self._entries.pop(key, None)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def put(self, key: str, value: Any) -> None:
+        entry = (time.time(), value)
+        self._remember(key, entry)
+        if self.path is not None:
+            await asyncio.to_thread(self._store, key, entry)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        with self._db_lock:
+            if db := self._connect():
+                with db:
+                    db.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: str, entry: Tuple[float, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """The store's connection, opened and pruned on first use. Callers hold `_db_lock`"""
+        if self.path is None:
+            return None
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            with self._db:
+                self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL, value TEXT)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+                self._prune(self._db)
+        return self._db
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        """Drop expired answers and the oldest ones beyond `max_rows`"""
+        db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+        db.execute(
+            "DELETE FROM responses WHERE created <= (SELECT created FROM responses ORDER BY created DESC LIMIT 1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def _load(self, key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            with self._db_lock:
+                if db := self._connect():
+                    row = db.execute("SELECT created, value FROM responses WHERE key = ?", (key,)).fetchone()
+                    if row:
+                        return row[0], json.loads(row[1])
+        except sqlite3.Error as e:
+            logger.error(f"Error reading response cache: {e}")
+        return None
+
+    def _store(self, key: str, entry: Tuple[float, Any]) -> None:
+        try:
+            with self._db_lock:
+                if db := self._connect():
+                    with db:
+                        db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, entry[0], json.dumps(entry[1])))
+                        self._writes += 1
+                        if self._writes % PRUNE_EVERY == 0:
+                            self._prune(db)
+        except sqlite3.Error as e:
+            logger.error(f"Error writing response cache: {e}")
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ROWS)
+registry.register_stats("response_cache", response_cache.stats)
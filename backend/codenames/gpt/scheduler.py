@@ -0,0 +1,229 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import AsyncIterator, ContextManager, Deque, Dict, Iterator, Optional
+
+from codenames.metrics import registry
+from codenames.options import LLM_MAX_IN_FLIGHT, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Lower values are served first"""
+    INTERACTIVE = 0  # A human is waiting on the answer
+    BACKGROUND = 1  # Speculative work or games with no human players
+
+
+class SchedulingContext:
+    """The priority and fairness key LLM requests are queued with.
+
+    Shared by every request made within a `scheduling` block, including those of tasks it spawns such as retries and
+    hedges, so raising its priority applies to all of them.
+    """
+    __slots__ = ("priority", "key")
+
+    def __init__(self, priority: Priority, key: str):
+        self.priority = priority
+        self.key = key
+
+
+_context: ContextVar[SchedulingContext] = ContextVar("llm_scheduling", default=SchedulingContext(Priority.INTERACTIVE, ""))
+
+
+@contextlib.contextmanager
+def use_scheduling(context: SchedulingContext) -> Iterator[SchedulingContext]:
+    """Queue the LLM requests made within this block (and tasks it spawns) according to `context`"""
+    token = _context.set(context)
+    try:
+        yield context
+    finally:
+        _context.reset(token)
+
+
+def scheduling(priority: Priority, key: str) -> ContextManager[SchedulingContext]:
+    """Tag the LLM requests made within this block (and tasks it spawns) with a priority and fairness key"""
+    return use_scheduling(SchedulingContext(priority, key))
+
+
+class TokenBucket:
+    """Allows `rate_per_minute` units per minute with bursts of up to a minute's worth, a rate of 0 disables it"""
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed"""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        # Requests bigger than the whole bucket are let through once it is full rather than starving
+        needed = min(amount, self.capacity) - self.tokens
+        return max(needed / self.rate, 0.0)
+
+    def consume(self, amount: float) -> None:
+        if self.rate:
+            self._refill()
+            self.tokens -= amount
+
+
+class _Waiter:
+    def __init__(self, future: 'asyncio.Future[None]', estimated_tokens: int, context: SchedulingContext):
+        self.future = future
+        self.estimated_tokens = estimated_tokens
+        self.context = context
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Process wide gate in front of every LLM request.
+
+    Caps concurrent requests, applies request and token rate budgets, serves interactive work before background
+    work and round-robins between lobbies within a priority so one busy lobby cannot starve the others.
+    """
+    def __init__(self, max_in_flight: int, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.max_in_flight = max_in_flight
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self._queues: Dict[Priority, "OrderedDict[str, Deque[_Waiter]]"] = {priority: OrderedDict() for priority in Priority}
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextlib.asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """Wait for permission to make one request, holding it for the duration of the block"""
+        context = _context.get()
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), estimated_tokens, context)
+        queue = self._queues[context.priority].setdefault(context.key, deque())
+        queue.append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we were cancelled, give the slot back
+                self._release()
+            else:
+                self._remove(waiter)
+            raise
+        wait = time.monotonic() - waiter.enqueued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self._release()
+
+    def raise_priority(self, context: SchedulingContext, priority: Priority) -> None:
+        """Serve the queued and later requests of `context` at `priority`, e.g. once a player waits on speculative work"""
+        if priority >= context.priority:
+            return
+        queues = self._queues[context.priority]
+        context.priority = priority
+        waiters = queues.get(context.key)
+        moved = [waiter for waiter in waiters if waiter.context is context] if waiters else []
+        if not moved:
+            return
+        for waiter in moved:
+            waiters.remove(waiter)
+        if not waiters:
+            del queues[context.key]
+        # They have waited longer than anything their lobby has queued at the new priority
+        self._queues[priority].setdefault(context.key, deque()).extendleft(reversed(moved))
+        self._dispatch()
+
+    def record_usage(self, actual_tokens: int, estimated_tokens: int) -> None:
+        """Charge the token budget for the difference between the estimate and what the provider reported"""
+        self.token_bucket.consume(actual_tokens - estimated_tokens)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(waiters) for queues in self._queues.values() for waiters in queues.values())
+
+    def stats(self) -> dict:
+        return {
+            "inFlight": self.in_flight,
+            "queueDepth": self.queue_depth,
+            "queueDepthByPriority": {
+                priority.name.lower(): sum(len(waiters) for waiters in queues.values())
+                for priority, queues in self._queues.items()
+            },
+            "completed": self.completed,
+            "averageWaitSeconds": self.total_wait / self.completed if self.completed else 0.0,
+            "maxWaitSeconds": self.max_wait,
+        }
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        for queues in self._queues.values():
+            for key, waiters in list(queues.items()):
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del queues[key]
+                    return
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for queues in self._queues.values():
+            if queues:
+                return next(iter(queues.values()))[0]
+        return None
+
+    def _pop_next_waiter(self) -> None:
+        for queues in self._queues.values():
+            if queues:
+                key, waiters = next(iter(queues.items()))
+                waiters.popleft()
+                # Move this lobby to the back of the line for its priority
+                del queues[key]
+                if waiters:
+                    queues[key] = waiters
+                return
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.max_in_flight and (waiter := self._next_waiter()) is not None:
+            if waiter.future.done():
+                self._pop_next_waiter()
+                continue
+            delay = max(self.request_bucket.delay_for(1), self.token_bucket.delay_for(waiter.estimated_tokens))
+            if delay > 0:
+                self._schedule_wakeup(delay)
+                return
+            self._pop_next_waiter()
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(waiter.estimated_tokens)
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        if self._wakeup is not None and not self._wakeup.cancelled() and self._wakeup.when() <= asyncio.get_running_loop().time() + delay:
+            return
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._on_wakeup)
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+
+llm_scheduler = LLMScheduler(LLM_MAX_IN_FLIGHT, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+registry.register_stats("llm_scheduler", llm_scheduler.stats)
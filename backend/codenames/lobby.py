@@ -1,14 +1,25 @@
-import asyncio
 from typing import List, Optional, Dict, Any
+import asyncio
+import logging
 import uuid
 from codenames.game.factory import GameFactory
 from codenames.game.game import CodenamesGame
-from codenames.model import User, Role
+from codenames.game.word_packs import DEFAULT_PACK, WordPack, word_pack_store
+from codenames.metrics import games_started
+from codenames.model import DetachedConnection, User, Role
+from codenames.tracing import tracer
+from codenames.wire_format import Payload
+
+logger = logging.getLogger(__name__)
 
 class Lobby:
-    def __init__(self, user: User, name: str) -> None:
+    def __init__(self, user: User, name: str, word_pack: Optional[WordPack] = None) -> None:
         self.lobby_owner = user
         self.name = name
+        self.word_pack: WordPack = word_pack or word_pack_store.get(DEFAULT_PACK)
+        self.seed: Optional[int] = None
+        # Lobbies can opt out of cached AI answers to keep play non-deterministic
+        self.cache_ai_responses: bool = True
         self.users: List[User] = []
         self.game: Optional[CodenamesGame] = None
         self.id: uuid.UUID = uuid.uuid4()
@@ -23,13 +34,58 @@ class Lobby:
             "name": self.name,
             "id": str(self.id),
             "players": len(self.users),
-            "game": self.game is not None
+            "game": self.game is not None,
+            "wordPack": self.word_pack.name
         }
 
     async def send_all(self, message: Dict[str, Any]) -> None:
-        print(f"Sending message to all: {message['serverMessageType']}")
-        for user in self.users:
-            await user.connection.send(message)
+        """Queue `message` for every user, encoded once per wire format as state updates are"""
+        message_type = message["serverMessageType"]
+        logger.debug(f"Sending message to all: {message_type}")
+        with tracer.span("lobby.send_all", messageType=message_type, users=len(self.users)):
+            encoded: Dict[str, Payload] = {}
+            sends = []
+            for user in self.users:
+                wire_format = user.connection.wire_format
+                payload = encoded.get(wire_format.name)
+                if payload is None:
+                    payload = encoded[wire_format.name] = wire_format.encode(message)
+                sends.append(user.send_encoded(payload, message_type))
+            await asyncio.gather(*sends)
+
+    def to_record(self) -> Dict[str, Any]:
+        """Everything needed to restore the lobby and its game after a restart"""
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "wordPack": self.word_pack.name,
+            # Lobby supplied packs are not on disk, so they are kept with the lobby
+            "customWords": list(self.word_pack.words) if self.word_pack.name.startswith("custom-") else None,
+            "seed": self.seed,
+            "cacheAiResponses": self.cache_ai_responses,
+            "owner": str(self.lobby_owner.connection.uuid),
+            "users": [user.to_record() for user in self.users],
+            "game": self.game.to_record() if self.game is not None else None,
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'Lobby':
+        """Restore a lobby saved with `to_record`, its human players detached until they reconnect"""
+        if record["customWords"]:
+            word_pack = word_pack_store.register_custom(record["customWords"])
+        else:
+            word_pack = word_pack_store.get(record["wordPack"])
+        users = [User.from_record(user_record, DetachedConnection(user_record["uuid"])) for user_record in record["users"]]
+        owner = next((user for user in users if str(user.connection.uuid) == record["owner"]), users[0])
+        lobby = cls(owner, record["name"], word_pack)
+        lobby.id = uuid.UUID(record["id"])
+        lobby.users = users
+        lobby.seed = record["seed"]
+        lobby.cache_ai_responses = record["cacheAiResponses"]
+        if record["game"] is not None:
+            lobby.game = GameFactory.restore_game(record["game"], users, word_pack, lobby.cache_ai_responses, str(lobby.id))
+            lobby.game.count_as_active()
+        return lobby
 
     def get_role_assignments(self) -> Dict[int, str]:
         role_assignments = {}
@@ -40,13 +96,29 @@ class Lobby:
         return role_assignments
 
     async def start_game(self) -> None:
-        self.game = GameFactory.create_game(self.users, self.get_role_assignments())
+        if self.game is not None:
+            # Stops the previous game's AI work and takes it off the active games gauge
+            self.game.close()
+        self.game = GameFactory.create_game(
+            self.users,
+            self.get_role_assignments(),
+            self.word_pack,
+            self.seed,
+            self.cache_ai_responses,
+            str(self.id),
+        )
         assert self.game is not None, "Game creation failed"
+        games_started.inc()
+        self.game.count_as_active()
         await self.send_player_update()
         await self.game.broadcast_state_update(True)
         on_turn = self.game.get_on_turn_user()
         if not on_turn.is_human:
-            asyncio.create_task(self.game.clue_service.create_clue(self.game, on_turn))
+            self.game.start_ai_turn(on_turn)
+
+    def close(self) -> None:
+        if self.game is not None:
+            self.game.close()
 
     async def send_player_update(self) -> None:
         await self.send_all({
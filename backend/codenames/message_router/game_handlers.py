@@ -1,6 +1,5 @@
 from typing import Dict, Any, Optional, Tuple
 
-from codenames.util import get_tile_by_word
 from codenames.game.game import CodenamesGame
 from codenames.lobby import Lobby
 from codenames.message_router.message_handler import UserContext
@@ -47,7 +46,13 @@ class InitialiseGameHandler(BaseGameHandler):
         if lobby and data.get("includeUserInfo"):
             await lobby.send_player_update()
 
+        user = user_context.user
+        if data.get("deltaUpdates"):
+            user.accepts_deltas = True
         await lobby.game.broadcast_state_update(False)
+        if user.accepts_deltas:
+            # Delta subscribers also send initialiseRequest to resync after spotting a version gap
+            await lobby.game.send_state_snapshot(user)
 
 
 class GuessTileHandler(BaseGameHandler):
@@ -65,7 +70,7 @@ class GuessTileHandler(BaseGameHandler):
                 "serverMessageType": "error",
                 "message": "Missing word in guess"
             }
-        await lobby.game.guess_tile(user_context.user, get_tile_by_word(word, lobby.game.tiles))
+        await lobby.game.guess_tile(user_context.user, lobby.game.get_tile(word))
 
 
 class ProvideClueHandler(BaseGameHandler):
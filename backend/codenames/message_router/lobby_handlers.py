@@ -35,11 +35,16 @@ class UpdatePreferencesHandler:
             if index not in assigned_roles:
                 role = Role.from_index(index)
                 user.team, user.is_spy_master = role.team, role.is_spymaster
+        if lobby.game is not None:
+            lobby.game.players_changed()
 
-        if all(user.is_ready for user in lobby.users if user.name):
+        # Ready toggles only start a game when none is being played, a finished one is replaced by a rematch
+        game_running = lobby.game is not None and not lobby.game.check_win()
+        if not game_running and all(user.is_ready for user in lobby.users if user.name):
             logger.info("Starting game...")
             await lobby.start_game()
         else:
             await lobby.send_player_update()
+        await self.lobby_service.save_lobby(lobby)
             
 
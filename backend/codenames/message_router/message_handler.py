@@ -12,6 +12,8 @@ class UserContext:
         self.user = user
         self.connection_id = connection_id
         self.lobby_id: Optional[str] = None
+        # Trace of the message being handled, None unless it was sampled
+        self.trace_id: Optional[str] = None
     
     def join_lobby(self, lobby_id: str) -> None:
         self.lobby_id = lobby_id
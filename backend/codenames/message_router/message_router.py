@@ -1,13 +1,52 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import logging
+import time
 
 from codenames.message_router.game_handlers import GuessTileHandler, InitialiseGameHandler, ProvideClueHandler
 from codenames.message_router.lobby_handlers import UpdatePreferencesHandler
 from codenames.message_router.pre_lobby_handlers import CreateLobbyHandler, JoinLobbyHandler, RequestIdHandler, RequestLobbiesHandler
 from codenames.message_router.message_handler import MessageHandler, UserContext
+from codenames.metrics import handler_errors, handler_seconds
+from codenames.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+# Fields each message type may carry and the types they must have, a trailing "!" marks a required field. Other
+# fields are ignored. Checked before the handler runs, so handlers can trust the types of the fields they read.
+MESSAGE_SCHEMAS: Dict[str, Dict[str, Tuple[type, ...]]] = {
+    "idRequest": {},
+    "createLobby": {"name": (str,), "wordPack": (str,), "customWords": (list,), "seed": (int,), "cacheAiResponses": (bool,)},
+    "joinLobby": {"lobbyId!": (str,), "playerId": (str,)},
+    "lobbiesRequest": {"prefix": (str,), "after": (str,), "limit": (int,), "subscribe": (bool,)},
+    "preferencesRequest": {"player": (dict,)},
+    "initialiseRequest": {"includeUserInfo": (bool,), "deltaUpdates": (bool,)},
+    "guessTile": {"word!": (str,)},
+    "provideClue": {"word!": (str,), "number!": (int,)},
+}
+
+# (field, allowed types, required) for each message type
+_Checks = Tuple[Tuple[str, Tuple[type, ...], bool], ...]
+
+
+def _compile_schemas(schemas: Dict[str, Dict[str, Tuple[type, ...]]]) -> Dict[str, _Checks]:
+    return {
+        message_type: tuple((field.rstrip("!"), types, field.endswith("!")) for field, types in fields.items())
+        for message_type, fields in schemas.items()
+    }
+
+
+def _validate(checks: _Checks, data: Dict[str, Any]) -> Optional[str]:
+    """Why `data` does not match its message type's checks, or None if it does"""
+    for field, types, required in checks:
+        value = data.get(field)
+        if value is None:
+            if required:
+                return f"Missing {field}"
+        elif not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            # bool is a subclass of int, but true is not a seed or a clue number
+            return f"{field} must be {' or '.join(t.__name__ for t in types)}"
+    return None
+
 
 class MessageRouter:
     """Routes messages to appropriate handlers"""
@@ -25,6 +64,8 @@ class MessageRouter:
             "guessTile": GuessTileHandler(lobby_service),
             "provideClue": ProvideClueHandler(lobby_service)
         }
+        self._handler_timers = {message_type: handler_seconds.labels(message_type=message_type) for message_type in self.handlers}
+        self._checks = _compile_schemas(MESSAGE_SCHEMAS)
     
     async def route_message(self, user_context: UserContext, message_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Route a message to the appropriate handler"""
@@ -32,9 +73,17 @@ class MessageRouter:
         if not handler:
             logger.warning(f"No handler for message type: {message_type}")
             return {"serverMessageType": "error", "message": f"Unknown message type: {message_type}"}
+        checks = self._checks.get(message_type)
+        if checks and (error := _validate(checks, data)):
+            return {"serverMessageType": "error", "message": f"Invalid {message_type}: {error}"}
         
+        start = time.perf_counter()
         try:
-            return await handler.handle(user_context, data)
+            with tracer.span("handler", messageType=message_type):
+                return await handler.handle(user_context, data)
         except Exception as e:
+            handler_errors.inc(message_type=message_type)
             logger.error(f"Error handling message {message_type}: {e}")
             return {"serverMessageType": "error", "message": "Internal server error"}
+        finally:
+            self._handler_timers[message_type].observe(time.perf_counter() - start)
@@ -1,5 +1,6 @@
 from typing import Dict, Any
 
+from codenames.game.word_packs import word_pack_store
 from codenames.services.lobby_service import LobbyService
 from codenames.message_router.message_handler import UserContext
 
@@ -19,7 +20,23 @@ class CreateLobbyHandler:
     
     async def handle(self, user_context: UserContext, data: Dict[str, Any]) -> Dict[str, Any]:
         lobby_name = data.get("name", "Unnamed Lobby")
+        try:
+            word_pack = self._resolve_word_pack(data)
+        except (KeyError, ValueError) as e:
+            return {
+                "serverMessageType": "error",
+                "message": f"Invalid word pack: {e}"
+            }
+        seed = data.get("seed")
         lobby = await self.lobby_service.create_lobby(user_context.user, lobby_name)
+        self.lobby_service.unsubscribe_lobbies(user_context.connection_id)
+        if word_pack is not None:
+            lobby.word_pack = word_pack
+            await self.lobby_service.save_lobby(lobby)
+        if isinstance(seed, int) and not isinstance(seed, bool):
+            lobby.seed = seed
+        if data.get("cacheAiResponses") is False:
+            lobby.cache_ai_responses = False
         user_context.join_lobby(str(lobby.id))
         
         return {
@@ -27,6 +44,17 @@ class CreateLobbyHandler:
             "lobbyId": str(lobby.id)
         }
 
+    @staticmethod
+    def _resolve_word_pack(data: Dict[str, Any]):
+        """A lobby may pick a named pack or bring its own list of words"""
+        if custom_words := data.get("customWords"):
+            if not isinstance(custom_words, list):
+                raise ValueError("customWords must be a list")
+            return word_pack_store.register_custom(custom_words)
+        if pack_name := data.get("wordPack"):
+            return word_pack_store.get(pack_name)
+        return None
+
 class JoinLobbyHandler:
     """Handle lobby join requests"""
     def __init__(self, lobby_service: LobbyService):
@@ -36,9 +64,21 @@ class JoinLobbyHandler:
         lobby_id = data.get("lobbyId")
         if not lobby_id:
             raise ValueError("Missing lobbyId in join request")
+
+        # A player reconnecting after a server restart sends the id they had, to take back their seat
+        if player_id := data.get("playerId"):
+            if seat := await self.lobby_service.rejoin_lobby(user_context.user, lobby_id, player_id):
+                self.lobby_service.unsubscribe_lobbies(user_context.connection_id)
+                user_context.user = seat
+                user_context.join_lobby(lobby_id)
+                return {
+                    "serverMessageType": "lobbyJoined", 
+                    "lobbyId": lobby_id
+                }
         
         lobby = await self.lobby_service.join_lobby(user_context.user, lobby_id)
         if lobby:
+            self.lobby_service.unsubscribe_lobbies(user_context.connection_id)
             user_context.join_lobby(lobby_id)
             return {
                 "serverMessageType": "lobbyJoined", 
@@ -51,13 +91,27 @@ class JoinLobbyHandler:
             }
 
 class RequestLobbiesHandler:
-    """Handle request for available lobbies"""
+    """Handle request for available lobbies.
+
+    Lobbies come a page at a time, optionally only those whose name starts with `prefix`. The reply carries `next`,
+    the `after` to send for the following page. Sending `subscribe` also pushes lobbiesUpdate diffs with `diff` set
+    as lobbies matching the prefix change, until the connection creates or joins a lobby or sends `subscribe: false`.
+    """
     def __init__(self, lobby_service: LobbyService):
         self.lobby_service = lobby_service
     
     async def handle(self, user_context: UserContext, data: Dict[str, Any]) -> Dict[str, Any]:
-        lobbies = await self.lobby_service.get_available_lobbies()
+        prefix = data.get("prefix") or ""
+        limit = data.get("limit")
+        lobbies, next_page = await self.lobby_service.get_available_lobby_summaries(
+            str(prefix), data.get("after"), limit if isinstance(limit, int) else 50
+        )
+        if data.get("subscribe"):
+            await self.lobby_service.subscribe_lobbies(user_context.connection_id, user_context.user.connection, str(prefix))
+        elif data.get("subscribe") is False:
+            self.lobby_service.unsubscribe_lobbies(user_context.connection_id)
         return {
             "serverMessageType": "lobbiesUpdate", 
-            "lobbies": [lobby.to_json() for lobby in lobbies]
+            "lobbies": lobbies,
+            "next": next_page
         }
@@ -0,0 +1,260 @@
+import asyncio
+import bisect
+import contextlib
+import logging
+import re
+import time
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "codenames_"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = PREFIX + name
+        self.help = help
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{_format_labels(key)} {_format_value(value)}" for name, key, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. requests handled"""
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(f"{name}_total", help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        for key, value in self._values.items():
+            yield self.name, key, value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. open connections"""
+    type = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        for key, value in self._values.items():
+            yield self.name, key, value
+
+
+class _HistogramValues:
+    """One labelled series of a histogram, hot paths can hold on to it to skip the label lookup"""
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Distribution of observations such as latencies, in cumulative buckets"""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelKey, _HistogramValues] = {}
+
+    def labels(self, **labels: str) -> _HistogramValues:
+        key = _label_key(labels)
+        values = self._values.get(key)
+        if values is None:
+            values = self._values[key] = _HistogramValues(self.buckets)
+        return values
+
+    def observe(self, value: float, **labels: str) -> None:
+        self.labels(**labels).observe(value)
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        values = self._values.get(_label_key(labels))
+        return values.count if values else 0
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        for key, values in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, values.counts):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), values.count
+            yield f"{self.name}_sum", key, values.sum
+            yield f"{self.name}_count", key, values.count
+
+
+def _snake_case(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+class _StatsCollector:
+    """Publishes the numbers in an existing stats() dict as gauges.
+
+    Nested dicts become a label named after their key and strings become a gauge of 1 labelled with the value,
+    so {"state": "open", "queueDepthByPriority": {"interactive": 2}} gives `..._state{state="open"} 1` and
+    `..._queue_depth_by_priority{queue_depth_by_priority="interactive"} 2`.
+    """
+    def __init__(self, prefix: str, stats: Callable[[], dict], labels: Dict[str, str]):
+        self.prefix = PREFIX + prefix
+        self.stats = stats
+        self.labels = _label_key(labels)
+
+    def collect(self, into: Dict[str, List[str]]) -> None:
+        """Add sample lines to `into`, keyed by metric name so collectors sharing a prefix share a TYPE line"""
+        for key, value in self.stats().items():
+            name = f"{self.prefix}_{_snake_case(key)}"
+            samples: List[Tuple[LabelKey, float]] = []
+            if isinstance(value, bool):
+                samples.append((self.labels, float(value)))
+            elif isinstance(value, (int, float)):
+                samples.append((self.labels, value))
+            elif isinstance(value, str):
+                samples.append((self.labels + ((_snake_case(key), value),), 1))
+            elif isinstance(value, dict):
+                samples.extend(
+                    (self.labels + ((_snake_case(key), str(label)),), number)
+                    for label, number in value.items() if isinstance(number, (int, float))
+                )
+            if samples:
+                into.setdefault(name, []).extend(f"{name}{_format_labels(labels)} {_format_value(number)}" for labels, number in samples)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[_StatsCollector] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._register(Gauge(name, help))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))  # type: ignore[return-value]
+
+    def register_stats(self, prefix: str, stats: Callable[[], dict], **labels: str) -> None:
+        """Publish an object's stats() on every scrape"""
+        self._collectors.append(_StatsCollector(prefix, stats, labels))
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        collected: Dict[str, List[str]] = {}
+        for collector in self._collectors:
+            try:
+                collector.collect(collected)
+            except Exception as e:
+                logger.error(f"Failed to collect {collector.prefix} stats: {e}")
+        for name, samples in collected.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+connections_active = registry.gauge("connections_active", "Open websocket connections")
+lobbies_active = registry.gauge("lobbies_active", "Lobbies in the lobby repository")
+games_active = registry.gauge("games_active", "Games started and neither won nor closed yet")
+games_started = registry.counter("games_started", "Games started")
+handler_seconds = registry.histogram("handler_seconds", "Time to handle a client message, by message type")
+handler_errors = registry.counter("handler_errors", "Client messages whose handler raised, by message type")
+broadcast_seconds = registry.histogram("broadcast_seconds", "Time to send a state update to every player in a game")
+ai_turn_seconds = registry.histogram("ai_turn_seconds", "Time an AI player takes over its clue or its guesses", (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0))
+llm_request_seconds = registry.histogram("llm_request_seconds", "LLM request time including retries, by mode and outcome", (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+llm_tokens = registry.counter("llm_tokens", "Tokens reported by the LLM provider, by kind")
+send_queue_coalesced = registry.counter("send_queue_coalesced", "Queued stateUpdate messages replaced by a newer one before being sent")
+slow_consumer_disconnects = registry.counter("slow_consumer_disconnects", "Connections closed for falling too far behind on their outbound messages")
+ai_tasks_cancelled = registry.counter("ai_tasks_cancelled", "AI tasks cancelled because their game ended or their lobby closed")
+ai_tasks_deduplicated = registry.counter("ai_tasks_deduplicated", "AI turns not started because that player was already working on the same turn")
+ai_tasks_slow = registry.counter("ai_tasks_slow", "AI tasks still running after AI_TASK_SLOW_SECONDS")
+event_loop_lag_seconds = registry.histogram("event_loop_lag_seconds", "How late the event loop runs a timer, a sign of blocking work")
+
+
+async def monitor_event_loop_lag(interval: float = 1.0) -> None:
+    """Record how much later than requested a sleep wakes up, until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag_seconds.observe(max(loop.time() - start - interval, 0.0))
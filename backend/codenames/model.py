@@ -3,6 +3,8 @@ import logging
 from typing import Optional
 import uuid
 
+from codenames.wire_format import JSON, Payload, WireFormat
+
 
 class Role(Enum):
     """Enum for the different roles in the game"""
@@ -22,37 +24,68 @@ class Role(Enum):
     @property
     def index(self) -> int:
         """Index as exposed to the frontend"""
-        return list(Role).index(self)
+        return _ROLE_INDICES[self]
     
     @classmethod
     def from_team_and_role(cls, team: str, is_spymaster: bool) -> 'Role':
-        for role in cls:
-            if role.team == team and role.is_spymaster == is_spymaster:
-                return role
-        raise ValueError(f"No role found for team={team}, is_spymaster={is_spymaster}")
+        role = _ROLES_BY_VALUE.get((team, is_spymaster))
+        if role is None:
+            raise ValueError(f"No role found for team={team}, is_spymaster={is_spymaster}")
+        return role
     
     @classmethod
     def from_index(cls, index: int) -> 'Role':
-        roles = list(cls)
-        if 0 <= index < len(roles):
-            return roles[index]
+        if 0 <= index < len(_ROLES):
+            return _ROLES[index]
         raise ValueError(f"Invalid role index: {index}")
     
     @classmethod
     def all_roles(cls) -> list['Role']:
-        return list(cls)
+        return list(_ROLES)
+
+
+# Lookup tables for the hot Role conversions, built once rather than listing the enum on every call
+_ROLES = tuple(Role)
+_ROLE_INDICES = {role: index for index, role in enumerate(_ROLES)}
+_ROLES_BY_VALUE = {role.value: role for role in _ROLES}
+
+# Teams a tile can belong to
+TEAMS = ("red", "blue", "neutral", "assassin")
 
 
 class CodenamesConnection:
+    # Encoding of the payloads given to send_encoded, shared payloads are encoded once per format
+    wire_format: WireFormat = JSON
+
     def __init__(self):
-        self.uuid = uuid.uuid4()
+        # A string like the ids of websocket connections and restored players, so every kind compares alike
+        self.uuid: str = str(uuid.uuid4())
 
     async def send(self, message: dict):
         raise NotImplementedError("Subclasses must implement this method")
 
+    async def send_encoded(self, payload: Payload, message_type: str = ""):
+        """Send a message already encoded in `wire_format`, subclasses that write raw frames should override this"""
+        await self.send(self.wire_format.decode(payload))
+
+
+class DetachedConnection(CodenamesConnection):
+    """Stands in for the connection of a player restored after a restart, until they reconnect and reclaim their seat"""
+    def __init__(self, player_id: str):
+        super().__init__()
+        self.uuid = player_id
+
+    async def send(self, message: dict):
+        return
+
+    async def send_encoded(self, payload: Payload, message_type: str = ""):
+        return
+
 
 class User:
     """Model of a user in the game"""
+    __slots__ = ("name", "connection", "is_spy_master", "is_ready", "in_game", "in_lobby", "team", "is_human", "accepts_deltas")
+
     def __init__(self, connection: CodenamesConnection, is_human: bool):
         self.name: str = ""
         self.connection: CodenamesConnection = connection
@@ -62,11 +95,17 @@ class User:
         self.in_lobby: bool = False
         self.team: Optional[str] = None
         self.is_human: bool = is_human
+        # Set once the client asks for stateDelta patches instead of full stateUpdate snapshots
+        self.accepts_deltas: bool = False
 
     async def send(self, message: dict):
         logging.info(f"Sending message to {self.name}: {message['serverMessageType']}")
         await self.connection.send(message)
 
+    async def send_encoded(self, payload: Payload, message_type: str):
+        logging.info(f"Sending message to {self.name}: {message_type}")
+        await self.connection.send_encoded(payload, message_type)
+
     def to_json(self) -> dict:
         return {
             "name": self.name,
@@ -77,15 +116,46 @@ class User:
             "role": Role.from_team_and_role(self.team, self.is_spy_master).index if self.team else None
         }
 
+    def to_record(self) -> dict:
+        """Everything needed to restore the user after a restart, except their connection"""
+        return {
+            "uuid": str(self.connection.uuid),
+            "name": self.name,
+            "isSpyMaster": self.is_spy_master,
+            "ready": self.is_ready,
+            "inGame": self.in_game,
+            "inLobby": self.in_lobby,
+            "team": self.team,
+            "isHuman": self.is_human,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict, connection: CodenamesConnection) -> 'User':
+        user = cls(connection, record["isHuman"])
+        connection.uuid = str(record["uuid"])
+        user.name = record["name"]
+        user.is_spy_master = record["isSpyMaster"]
+        user.is_ready = record["ready"]
+        user.in_game = record["inGame"]
+        user.in_lobby = record["inLobby"]
+        user.team = record["team"]
+        return user
+
 class Tile:
     """Model of a tile in the game"""
+    __slots__ = ("word", "revealed", "team")
+
     def __init__(self, word: str, team: str, is_revealed: bool = False):
         self.word = word
         self.revealed = is_revealed
         self.team = team
 
-    def reveal(self):
+    def reveal(self) -> bool:
+        """Reveal the tile, returning False if it was already revealed"""
+        if self.revealed:
+            return False
         self.revealed = True
+        return True
 
     def to_json(self, for_spymaster: bool) -> dict:
         return {
@@ -15,10 +15,83 @@ except FileNotFoundError:
 
 HOST = os.getenv("HOST", _properties.get("host", "0.0.0.0")) 
 WEBSOCKET_PORT = int(os.getenv("WEBSOCKET_PORT", _properties.get("websocketPort", 8000)))
+# Most often subscribed lobby browsers are sent the lobbies that changed, and other workers' lobbies are refreshed
+LOBBY_UPDATE_SECONDS = float(os.getenv("LOBBY_UPDATE_SECONDS", _properties.get("lobbyUpdateSeconds", 0.5)))
+# Messages queued per connection. A client holding more than SEND_QUEUE_HIGH_WATER unsent messages for
+# SEND_QUEUE_HIGH_WATER_SECONDS, or filling its queue, is disconnected as too slow
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", _properties.get("sendQueueSize", 256)))
+SEND_QUEUE_HIGH_WATER = int(os.getenv("SEND_QUEUE_HIGH_WATER", _properties.get("sendQueueHighWater", 32)))
+SEND_QUEUE_HIGH_WATER_SECONDS = float(os.getenv("SEND_QUEUE_HIGH_WATER_SECONDS", _properties.get("sendQueueHighWaterSeconds", 10)))
+# Worker processes sharing WEBSOCKET_PORT, each lobby is owned by one of them. Workers also listen on
+# 127.0.0.1:WORKER_PORT_BASE + index for connections proxied from the other workers
+WORKERS = int(os.getenv("WORKERS", _properties.get("workers", 1)))
+WORKER_PORT_BASE = int(os.getenv("WORKER_PORT_BASE", _properties.get("workerPortBase", WEBSOCKET_PORT + 1)))
+# SQLite file the workers share to list each other's lobbies, a temporary file when unset
+LOBBY_DIRECTORY_PATH = os.getenv("LOBBY_DIRECTORY_PATH", _properties.get("lobbyDirectoryPath"))
+# HTTP path on the websocket port serving Prometheus metrics, empty to disable
+METRICS_PATH = os.getenv("METRICS_PATH", _properties.get("metricsPath", "/metrics"))
 OPEN_AI_KEY = os.getenv("OPENAI_KEY", _properties.get("openaiKey"))
 GPT_MODEL: str = os.getenv("GPT_MODEL", _properties.get("gptModel", "gpt-4o"))
+# Point the OpenAI client at another compatible endpoint, e.g. the load test's fake server
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", _properties.get("openaiBaseUrl"))
+# Stream completions so AI guesses are played as soon as each word arrives
+STREAM_RESPONSES = str(os.getenv("STREAM_RESPONSES", _properties.get("streamResponses", False))).lower() in ("1", "true", "yes")
+# Connection pool of the shared OpenAI client
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", _properties.get("openaiMaxConnections", 32)))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", _properties.get("openaiMaxKeepaliveConnections", 16)))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", _properties.get("openaiKeepaliveExpiry", 60)))
+OPENAI_HTTP2 = str(os.getenv("OPENAI_HTTP2", _properties.get("openaiHttp2", False))).lower() in ("1", "true", "yes")
+# Process wide LLM request limits, a rate of 0 means unlimited
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", _properties.get("llmMaxInFlight", 16)))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", _properties.get("llmRequestsPerMinute", 0)))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", _properties.get("llmTokensPerMinute", 0)))
+# Seconds allowed per LLM attempt, retries after a failure, and the total time one AI turn may spend on them
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", _properties.get("llmTimeout", 20)))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", _properties.get("llmMaxRetries", 2)))
+LLM_TURN_BUDGET = float(os.getenv("LLM_TURN_BUDGET", _properties.get("llmTurnBudget", 45)))
+# Send a duplicate request when the first is slower than the recent p95 latency
+LLM_HEDGE = str(os.getenv("LLM_HEDGE", _properties.get("llmHedge", False))).lower() in ("1", "true", "yes")
+# Which registered AI agent fills open roles: "gpt" or the offline "embedding" agent
+AI_PLAYER: str = os.getenv("AI_PLAYER", _properties.get("aiPlayer", "gpt"))
+# Directory holding vectors.npy (unit length float32 rows) and vocab.txt for the embedding agent
+EMBEDDINGS_PATH = os.getenv("EMBEDDINGS_PATH", _properties.get("embeddingsPath", str(pathlib.Path(__file__).parent.parent / "embeddings")))
+EMBEDDING_CLUE_VOCAB = int(os.getenv("EMBEDDING_CLUE_VOCAB", _properties.get("embeddingClueVocab", 50000)))
+# Agent used while the main one's circuit breaker is open, empty to disable the breaker
+FALLBACK_AI_PLAYER: str = os.getenv("FALLBACK_AI_PLAYER", _properties.get("fallbackAiPlayer", "heuristic"))
+# The breaker opens when at least BREAKER_MIN_CALLS calls in the last BREAKER_WINDOW_SECONDS have a failure rate
+# of BREAKER_ERROR_RATE or more, calls slower than BREAKER_SLOW_CALL_SECONDS counting as failures
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", _properties.get("breakerWindowSeconds", 60)))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", _properties.get("breakerMinCalls", 5)))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", _properties.get("breakerErrorRate", 0.5)))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", _properties.get("breakerSlowCallSeconds", 15)))
+# Seconds the breaker stays open before letting a probe call through to the main agent
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", _properties.get("breakerOpenSeconds", 30)))
+# AI turns each game may run at once, and how long one may run before it is reported as slow
+AI_TASKS_PER_GAME = int(os.getenv("AI_TASKS_PER_GAME", _properties.get("aiTasksPerGame", 2)))
+AI_TASK_SLOW_SECONDS = float(os.getenv("AI_TASK_SLOW_SECONDS", _properties.get("aiTaskSlowSeconds", 120)))
 GUESS_DELAY = int(os.getenv("GUESS_DELAY", _properties.get("guessDelay", 0)))
-
-# Validate required properties
-if not OPEN_AI_KEY:
-    raise ValueError("OPENAI_KEY must be set via environment variable or .properties.json")
+# LLM response cache, RESPONSE_CACHE_PATH enables a SQLite store that survives restarts and holds at most
+# RESPONSE_CACHE_MAX_ROWS answers
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", _properties.get("responseCacheSize", 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", _properties.get("responseCacheTtl", 86400)))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", _properties.get("responseCachePath"))
+RESPONSE_CACHE_MAX_ROWS = int(os.getenv("RESPONSE_CACHE_MAX_ROWS", _properties.get("responseCacheMaxRows", 100000)))
+# Share of inbound messages traced from receipt to broadcast, 0 turns tracing off. Recent spans are kept in memory
+# and served on TRACES_PATH, TRACE_PATH also appends them to a JSONL file rotated at TRACE_FILE_MAX_BYTES
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", _properties.get("traceSampleRate", 0)))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", _properties.get("traceBufferSize", 2000)))
+TRACE_PATH = os.getenv("TRACE_PATH", _properties.get("tracePath"))
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", _properties.get("traceFileMaxBytes", 10_000_000)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", _properties.get("traceFileBackups", 3)))
+TRACES_PATH = os.getenv("TRACES_PATH", _properties.get("tracesPath", "/traces"))
+# SQLite file keeping lobbies and games in progress across restarts, in memory only when unset. Writes are batched
+# every LOBBY_STORE_FLUSH_SECONDS, and recovered lobbies nobody rejoins within LOBBY_RESUME_SECONDS are dropped
+LOBBY_STORE_PATH = os.getenv("LOBBY_STORE_PATH", _properties.get("lobbyStorePath"))
+LOBBY_STORE_FLUSH_SECONDS = float(os.getenv("LOBBY_STORE_FLUSH_SECONDS", _properties.get("lobbyStoreFlushSeconds", 0.5)))
+LOBBY_RESUME_SECONDS = float(os.getenv("LOBBY_RESUME_SECONDS", _properties.get("lobbyResumeSeconds", 300)))
+# Directory to append each game's moves to as <lobby id>.jsonl, for replaying games, not written when unset. Events
+# are written in batches every GAME_EVENTS_FLUSH_SECONDS
+GAME_EVENTS_PATH = os.getenv("GAME_EVENTS_PATH", _properties.get("gameEventsPath"))
+GAME_EVENTS_FLUSH_SECONDS = float(os.getenv("GAME_EVENTS_FLUSH_SECONDS", _properties.get("gameEventsFlushSeconds", 1)))
+# Extra word packs as {"name": "path/to/words.txt"}, the bundled wordlist.txt is always available as "default"
+WORD_PACKS: dict = json.loads(os.getenv("WORD_PACKS", "null") or "null") or _properties.get("wordPacks", {})
@@ -1,41 +1,217 @@
 
 import asyncio
-from codenames.util import get_tile_by_word
+import contextlib
+import logging
+import time
+from typing import FrozenSet, Optional, Tuple
 from codenames.options import GUESS_DELAY
 from codenames.model import Tile, User
-from codenames.gpt.gpt_agent import GPTAgent
+from codenames.gpt.agent import Agent, HeuristicAgent
+from codenames.gpt.resilience import turn_budget
+from codenames.gpt.scheduler import Priority, SchedulingContext, llm_scheduler, scheduling, use_scheduling
+from codenames.metrics import ai_turn_seconds, registry
+from codenames.tracing import tracer
+from codenames.util import normalise_word
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculationMetrics:
+    """Process wide counters for speculative clue generation"""
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.cancelled = 0
+        self.latency_saved = 0.0
+
+    def stats(self) -> dict:
+        used = self.hits + self.misses
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "cancelled": self.cancelled,
+            "hitRate": self.hits / used if used else 0.0,
+            "latencySavedSeconds": self.latency_saved,
+        }
+
+
+speculation_metrics = SpeculationMetrics()
+registry.register_stats("speculation", speculation_metrics.stats)
+
+
+class _Speculation:
+    """A clue being worked out ahead of the spymaster's turn"""
+    def __init__(self, user: User, key: FrozenSet[str], task: 'asyncio.Task[Tuple[str, int]]', requests: SchedulingContext):
+        self.user = user
+        self.key = key
+        self.task = task
+        # How its LLM requests are queued, raised to the game's priority once the spymaster's turn comes
+        self.requests = requests
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, _task: asyncio.Task) -> None:
+        self.finished_at = time.monotonic()
 
 
 class ClueService:
-    def __init__(self, gpt_agent: GPTAgent):
-        self.gpt_agent = gpt_agent
+    # Gives the clue when the agent fails, it needs nothing that could be down
+    last_resort: Agent = HeuristicAgent()
+
+    def __init__(self, agent: Agent, fairness_key: str = ""):
+        self.agent = agent
+        # LLM requests are shared out fairly between keys, normally one per lobby
+        self.fairness_key = fairness_key
+        self._speculation: Optional[_Speculation] = None
+
+    def _priority(self, game) -> Priority:
+        """Work a human is waiting on is served before games that are only AI"""
+        return Priority.INTERACTIVE if any(user.is_human for user in game.users) else Priority.BACKGROUND
+
+    async def _speculate(self, user: User, tiles, requests: SchedulingContext) -> Tuple[str, int]:
+        with use_scheduling(requests), turn_budget():
+            return await self.agent.provide_clue(user, tiles)
+
+    @staticmethod
+    def _speculation_key(user: User, tiles) -> FrozenSet[str]:
+        """The words a clue for `user` has to link, a speculative clue is stale once one of these is revealed.
+
+        Reveals of other words only shrink the list of words to avoid, so a clue worked out before them is still safe.
+        """
+        return frozenset(normalise_word(tile.word) for tile in tiles if tile.team == user.team and not tile.revealed)
+
+    def speculate_clue(self, game, user: User) -> None:
+        """Start generating `user`'s next clue while the other team is still guessing"""
+        key = self._speculation_key(user, game.tiles)
+        current = self._speculation
+        if current is not None and current.user is user and current.key == key:
+            return
+        if current is not None:
+            speculation_metrics.invalidated += 1
+            self._discard_speculation()
+        speculation_metrics.started += 1
+        requests = SchedulingContext(Priority.BACKGROUND, self.fairness_key)
+        task = asyncio.create_task(self._speculate(user, game.tiles, requests))
+        self._speculation = _Speculation(user, key, task, requests)
+
+    def cancel_speculation(self) -> None:
+        """Drop any in-flight speculation, e.g. because the game is over"""
+        if self._speculation is not None:
+            speculation_metrics.cancelled += 1
+            self._discard_speculation()
+
+    def _discard_speculation(self) -> None:
+        assert self._speculation is not None
+        task = self._speculation.task
+        if not task.done():
+            task.cancel()
+        # Retrieve any exception so asyncio does not log it as never retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._speculation = None
+
+    async def _take_speculation(self, game, user: User) -> Optional[Tuple[str, int]]:
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return None
+        if speculation.user is not user or speculation.key != self._speculation_key(user, game.tiles):
+            speculation_metrics.misses += 1
+            self._speculation = speculation
+            self._discard_speculation()
+            return None
+        needed_at = time.monotonic()
+        # Whatever the speculation still has queued is now work a player may be waiting on
+        llm_scheduler.raise_priority(speculation.requests, self._priority(game))
+        try:
+            clue = await speculation.task
+        except asyncio.CancelledError:
+            # Cancelling this task cancels the speculation it waits on too, which is not a miss
+            current = asyncio.current_task()
+            if not speculation.task.cancelled() or (current is not None and current.cancelling()):
+                raise
+            speculation_metrics.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Speculative clue for {user.name} failed, generating a new one: {e}")
+            speculation_metrics.misses += 1
+            return None
+        speculation_metrics.hits += 1
+        speculation_metrics.latency_saved += min(needed_at, speculation.finished_at or needed_at) - speculation.started_at
+        return clue
 
     async def create_clue(self, game, user: User):
         """Handle AI clue generation asynchronously to avoid blocking human input"""
-        try:
-            clue, number = await self.gpt_agent.provide_clue(user, game.tiles)
+        with tracer.span("ai.create_clue", player=user.name):
+            start = time.perf_counter()
+            try:
+                speculated = await self._take_speculation(game, user)
+                if speculated and speculated[0]:
+                    clue, number = speculated
+                else:
+                    with scheduling(self._priority(game), self.fairness_key), turn_budget():
+                        clue, number = await self.agent.provide_clue(user, game.tiles)
+            except Exception:
+                logger.exception(f"Error in AI clue generation for {user.name}, giving a fallback clue")
+                # A failed spymaster must not leave the game stuck on its turn
+                clue, number = await self.last_resort.provide_clue(user, game.tiles)
             # await asyncio.sleep(GUESS_DELAY)
+            ai_turn_seconds.observe(time.perf_counter() - start, action="clue")
             await game.provide_clue(user, clue, number)
-        except Exception as e:
-            print(f"Error in AI clue generation for {user.name}: {e}")
 
-    async def make_guesses(self, word: str, number: int, game, user: User):
-        """Handle AI guessing asynchronously to avoid blocking human input"""
+    async def _read_guesses(self, word: str, number: int, tiles, priority: Priority, guesses: 'asyncio.Queue[Optional[str]]') -> None:
+        """Drain the agent's guesses into `guesses` as they arrive, ending with None.
+
+        Only this read holds a scheduler slot and the provider's stream, playing the guesses happens elsewhere.
+        """
         try:
-            guesses = await self.gpt_agent.make_guesses(word, number, game.tiles)
-            if not guesses:
-                await game.pass_turn(user)
-                return
-
-            while game.guesses_remaining > 0 and guesses:
-                await asyncio.sleep(GUESS_DELAY)
-                guess_word = guesses.pop(0)
-                try:
-                    tile = get_tile_by_word(guess_word, game.tiles)
+            with scheduling(priority, self.fairness_key), turn_budget():
+                async with contextlib.aclosing(self.agent.stream_guesses(word, number, tiles)) as stream:
+                    async for guess in stream:
+                        guesses.put_nowait(guess)
+        finally:
+            guesses.put_nowait(None)
+
+    async def make_guesses(self, word: str, number: int, game, user: User):
+        """Handle AI guessing asynchronously to avoid blocking human input.
+
+        Guesses are played as the agent produces them, so a streaming agent's first guess is revealed before its
+        answer is complete. The answer is read in a task of its own so the guess delay and broadcasts never hold up
+        the provider's stream.
+        """
+        with tracer.span("ai.make_guesses", player=user.name, clue=word):
+            start = time.perf_counter()
+            guesses: 'asyncio.Queue[Optional[str]]' = asyncio.Queue()
+            reader = asyncio.create_task(self._read_guesses(word, number, game.tiles, self._priority(game), guesses))
+            try:
+                while (guess_word := await guesses.get()) is not None:
+                    if game.guesses_remaining <= 0 or not game.is_user_turn(user):
+                        break
+                    await asyncio.sleep(GUESS_DELAY)
+                    try:
+                        tile = game.get_tile(guess_word)
+                    except ValueError:
+                        print(f"AI {user.name} guessed invalid word: {guess_word}")
+                        # Skip this invalid guess and continue with the next one
+                        continue
                     await game.guess_tile(user, tile)
-                except ValueError:
-                    print(f"AI {user.name} guessed invalid word: {guess_word}")
-                    # Skip this invalid guess and continue with the next one
-                    continue
-        except Exception as e:
-            print(f"Error in AI guessing for {user.name}: {e}")
\ No newline at end of file
+                else:
+                    # Raises whatever ended the answer early
+                    await reader
+                ai_turn_seconds.observe(time.perf_counter() - start, action="guesses")
+                # Hand the turn over rather than leaving the game waiting on an AI with nothing left to guess
+                if game.is_user_turn(user) and not game.check_win():
+                    await game.pass_turn(user)
+            except Exception as e:
+                print(f"Error in AI guessing for {user.name}: {e}")
+                # A failed guesser must not leave the game stuck on its turn
+                if game.is_user_turn(user) and not game.check_win():
+                    await game.pass_turn(user)
+            finally:
+                if not reader.done():
+                    reader.cancel()
+                    # Wait for the stream to close, and retrieve the cancellation so it is not logged
+                    await asyncio.gather(reader, return_exceptions=True)
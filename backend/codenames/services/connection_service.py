@@ -1,8 +1,13 @@
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Deque, Dict, Any, Optional, Tuple
 from abc import ABC, abstractmethod
+from collections import deque
+import asyncio
 import logging
+import time
 import uuid
 
+from codenames.metrics import connections_active, send_queue_coalesced
+
 logger = logging.getLogger(__name__)
 
 class Connection(ABC):
@@ -19,6 +24,96 @@ class Connection(ABC):
     async def close(self) -> None:
         pass
 
+class OutboundQueue:
+    """Messages waiting to be written to one connection, drained by a writer task of its own.
+
+    Senders never wait on the network. A full stateUpdate carries everything the queued stateUpdate and stateDelta
+    messages would have told the client, so they are dropped when one arrives. A consumer holding more than `high_water` messages for `high_water_seconds`, or
+    filling the queue, is reported through `on_overflow` and the queue stops accepting messages.
+    """
+    # Message types dropped from the queue when a message of the key type is queued
+    SUPERSEDES = {"stateUpdate": frozenset({"stateUpdate", "stateDelta"})}
+
+    def __init__(
+        self,
+        write: Callable[[str], Awaitable[None]],
+        on_overflow: Callable[[], None],
+        max_size: int = 256,
+        high_water: int = 32,
+        high_water_seconds: float = 10,
+    ):
+        self._write = write
+        self._on_overflow = on_overflow
+        self.max_size = max_size
+        self.high_water = high_water
+        self.high_water_seconds = high_water_seconds
+        self._messages: Deque[Tuple[str, str]] = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._over_high_water_since: Optional[float] = None
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def put(self, payload: str, message_type: str = "") -> None:
+        if self.closed:
+            return
+        superseded = self.SUPERSEDES.get(message_type)
+        if superseded is not None and self._messages:
+            kept = deque(queued for queued in self._messages if queued[1] not in superseded)
+            if len(kept) != len(self._messages):
+                send_queue_coalesced.inc(len(self._messages) - len(kept))
+                self._messages = kept
+        self._messages.append((payload, message_type))
+        if self._is_overwhelmed():
+            self.close()
+            self._on_overflow()
+            return
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_queued())
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._messages.clear()
+        if self._writer is not None:
+            self._writer.cancel()
+
+    async def aclose(self) -> None:
+        """Close the queue and wait for its writer to stop, so no task outlives the connection"""
+        self.close()
+        writer = self._writer
+        if writer is not None and writer is not asyncio.current_task():
+            await asyncio.gather(writer, return_exceptions=True)
+
+    def _is_overwhelmed(self) -> bool:
+        if len(self._messages) >= self.max_size:
+            return True
+        if len(self._messages) <= self.high_water:
+            self._over_high_water_since = None
+            return False
+        now = time.monotonic()
+        if self._over_high_water_since is None:
+            self._over_high_water_since = now
+        return now - self._over_high_water_since > self.high_water_seconds
+
+    async def _write_queued(self) -> None:
+        while True:
+            while not self._messages:
+                self._ready.clear()
+                await self._ready.wait()
+            payload, _ = self._messages.popleft()
+            try:
+                await self._write(payload)
+            except Exception as e:
+                # The read loop sees the connection go and cleans up
+                logger.debug(f"Stopped writing to a connection: {e}")
+                self.closed = True
+                self._messages.clear()
+                return
+
+
 class ConnectionManager:
     """Manages active connections"""
     
@@ -28,6 +123,7 @@ class ConnectionManager:
     def add_connection(self, connection: Connection) -> str:
         """Add a new connection and return its ID"""
         self._connections[connection.id] = connection
+        connections_active.inc()
         logger.info(f"Added connection {connection.id}")
         return connection.id
     
@@ -35,6 +131,7 @@ class ConnectionManager:
         """Remove and return a connection"""
         connection = self._connections.pop(connection_id, None)
         if connection:
+            connections_active.dec()
             logger.info(f"Removed connection {connection_id}")
         return connection
     
@@ -0,0 +1,86 @@
+from typing import Any, Dict, List
+import json
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+class LobbyDirectory(ABC):
+    """Lobby summaries from every worker, so any worker can list lobbies it does not own"""
+
+    @abstractmethod
+    async def publish(self, worker: int, summary: Dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    async def remove(self, lobby_id: str) -> None:
+        pass
+
+    @abstractmethod
+    async def list_lobbies(self) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def clear_worker(self, worker: int) -> None:
+        """Forget a worker's lobbies, e.g. when it restarts"""
+        pass
+
+class InMemoryLobbyDirectory(LobbyDirectory):
+    """Directory for workers that share one process, such as tests"""
+
+    def __init__(self):
+        self._lobbies: Dict[str, tuple[int, Dict[str, Any]]] = {}
+
+    async def publish(self, worker: int, summary: Dict[str, Any]) -> None:
+        self._lobbies[summary["id"]] = (worker, summary)
+
+    async def remove(self, lobby_id: str) -> None:
+        self._lobbies.pop(lobby_id, None)
+
+    async def list_lobbies(self) -> List[Dict[str, Any]]:
+        return [summary for _, summary in self._lobbies.values()]
+
+    async def clear_worker(self, worker: int) -> None:
+        self._lobbies = {lobby_id: entry for lobby_id, entry in self._lobbies.items() if entry[0] != worker}
+
+class SqliteLobbyDirectory(LobbyDirectory):
+    """Directory in a SQLite file shared by the worker processes on one host.
+
+    Writes are a single small statement each, so they run inline rather than on a thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS lobbies (id TEXT PRIMARY KEY, worker INTEGER, summary TEXT)")
+
+    async def publish(self, worker: int, summary: Dict[str, Any]) -> None:
+        try:
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO lobbies VALUES (?, ?, ?)", (summary["id"], worker, json.dumps(summary)))
+        except sqlite3.Error as e:
+            logger.error(f"Error publishing lobby {summary['id']}: {e}")
+
+    async def remove(self, lobby_id: str) -> None:
+        try:
+            with self._db:
+                self._db.execute("DELETE FROM lobbies WHERE id = ?", (lobby_id,))
+        except sqlite3.Error as e:
+            logger.error(f"Error removing lobby {lobby_id}: {e}")
+
+    async def list_lobbies(self) -> List[Dict[str, Any]]:
+        try:
+            return [json.loads(row[0]) for row in self._db.execute("SELECT summary FROM lobbies")]
+        except sqlite3.Error as e:
+            logger.error(f"Error listing lobbies: {e}")
+            return []
+
+    async def clear_worker(self, worker: int) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM lobbies WHERE worker = ?", (worker,))
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,154 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import bisect
+import logging
+
+from codenames.model import CodenamesConnection
+from codenames.wire_format import Payload
+
+logger = logging.getLogger(__name__)
+
+# Most lobbies one lobbiesUpdate page holds
+MAX_PAGE_SIZE = 200
+
+def is_joinable(summary: Dict[str, Any]) -> bool:
+    return not summary["game"] and summary["players"] < 4
+
+def _sort_key(summary: Dict[str, Any]) -> Tuple[str, str]:
+    return summary["name"].casefold(), summary["id"]
+
+class LobbyIndex:
+    """Summaries of the joinable lobbies, kept sorted by name so a page or a name prefix costs a binary search.
+
+    Connections on the lobby browser can subscribe instead of polling. Changes are collected and sent to each
+    subscriber as one lobbiesUpdate diff at most every `interval` seconds, holding the lobbies that were added or
+    changed and the ids of those that went away or stopped being joinable.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._keys: List[Tuple[str, str]] = []
+        # Lobby id to its new summary, or to its last summary if it left the index
+        self._changed: Dict[str, Tuple[Dict[str, Any], bool]] = {}
+        self._subscribers: Dict[str, Tuple[CodenamesConnection, str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._summaries)
+
+    def update(self, summary: Dict[str, Any]) -> None:
+        """Add, replace or drop a lobby depending on whether it can still be joined"""
+        if not is_joinable(summary):
+            self.remove(summary["id"])
+            return
+        lobby_id = summary["id"]
+        previous = self._summaries.get(lobby_id)
+        if previous == summary:
+            return
+        if previous is None:
+            bisect.insort(self._keys, _sort_key(summary))
+        self._summaries[lobby_id] = summary
+        self._record_change(summary, True)
+
+    def remove(self, lobby_id: str) -> None:
+        summary = self._summaries.pop(lobby_id, None)
+        if summary is None:
+            return
+        key = _sort_key(summary)
+        del self._keys[bisect.bisect_left(self._keys, key)]
+        self._record_change(summary, False)
+
+    def sync(self, summaries: List[Dict[str, Any]]) -> None:
+        """Bring the index in line with a full listing, e.g. the lobbies every worker published"""
+        listed = {summary["id"] for summary in summaries}
+        for lobby_id in [lobby_id for lobby_id in self._summaries if lobby_id not in listed]:
+            self.remove(lobby_id)
+        for summary in summaries:
+            self.update(summary)
+
+    def query(self, prefix: str = "", after: Optional[str] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of lobbies whose names start with `prefix`, and the cursor for the next page if there is one.
+
+        `after` is a cursor returned by an earlier query.
+        """
+        prefix = prefix.casefold()
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        start = bisect.bisect_left(self._keys, (prefix, ""))
+        if after:
+            lobby_id, _, name = after.partition(":")
+            start = max(start, bisect.bisect_right(self._keys, (name.casefold(), lobby_id)))
+        page = []
+        for key in self._keys[start:start + limit + 1]:
+            if not key[0].startswith(prefix):
+                break
+            page.append(self._summaries[key[1]])
+        if len(page) <= limit:
+            return page, None
+        page.pop()
+        last = page[-1]
+        return page, f"{last['id']}:{last['name']}"
+
+    def subscribe(self, connection_id: str, connection: CodenamesConnection, prefix: str = "") -> None:
+        self._subscribers[connection_id] = (connection, prefix.casefold())
+
+    def unsubscribe(self, connection_id: str) -> None:
+        self._subscribers.pop(connection_id, None)
+
+    def close(self) -> None:
+        self._subscribers.clear()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+
+    def _record_change(self, summary: Dict[str, Any], listed: bool) -> None:
+        if not self._subscribers:
+            return
+        self._changed[summary["id"]] = (summary, listed)
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            # No event loop, the next change sends it
+            pass
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Send every subscriber the changes since the last flush, encoding each distinct diff once per wire format"""
+        changed, self._changed = self._changed, {}
+        if not changed:
+            return
+        diffs: Dict[str, Optional[Dict[str, Any]]] = {}
+        payloads: Dict[Tuple[str, str], Payload] = {}
+        sends = []
+        for connection, prefix in list(self._subscribers.values()):
+            if prefix not in diffs:
+                diffs[prefix] = self._build_diff(changed, prefix)
+            if (diff := diffs[prefix]) is None:
+                continue
+            wire_format = connection.wire_format
+            payload = payloads.get((prefix, wire_format.name))
+            if payload is None:
+                payload = payloads[prefix, wire_format.name] = wire_format.encode(diff)
+            sends.append(connection.send_encoded(payload, "lobbiesUpdate"))
+        for result in await asyncio.gather(*sends, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.debug(f"Failed to send a lobbiesUpdate: {result}")
+
+    @staticmethod
+    def _build_diff(changed: Dict[str, Tuple[Dict[str, Any], bool]], prefix: str) -> Optional[Dict[str, Any]]:
+        lobbies = []
+        removed = []
+        for lobby_id, (summary, listed) in changed.items():
+            if not summary["name"].casefold().startswith(prefix):
+                continue
+            if listed:
+                lobbies.append(summary)
+            else:
+                removed.append(lobby_id)
+        if not lobbies and not removed:
+            return None
+        return {"serverMessageType": "lobbiesUpdate", "diff": True, "lobbies": lobbies, "removed": removed}
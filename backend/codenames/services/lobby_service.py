@@ -1,9 +1,15 @@
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
 import logging
+import uuid
 from abc import ABC, abstractmethod
 
 from codenames.lobby import Lobby
-from codenames.model import User
+from codenames.metrics import lobbies_active
+from codenames.model import CodenamesConnection, DetachedConnection, User
+from codenames.services.lobby_directory import LobbyDirectory
+from codenames.services.lobby_index import LobbyIndex
+from codenames.sharding import Shard
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +36,14 @@ class LobbyRepository(ABC):
     async def delete_lobby(self, lobby_id: str) -> None:
         pass
 
+    async def recover(self) -> List[Lobby]:
+        """Load the lobbies a previous run left behind, for repositories that outlive the process"""
+        return []
+
+    async def close(self) -> None:
+        """Finish any outstanding writes"""
+        pass
+
 class InMemoryLobbyRepository(LobbyRepository):
     """In-memory implementation of lobby repository"""
     
@@ -38,6 +52,7 @@ class InMemoryLobbyRepository(LobbyRepository):
     
     async def create_lobby(self, lobby: Lobby) -> None:
         self._lobbies[str(lobby.id)] = lobby
+        lobbies_active.set(len(self._lobbies))
         logger.info(f"Created lobby {lobby.id} with name '{lobby.name}'")
     
     async def get_lobby(self, lobby_id: str) -> Optional[Lobby]:
@@ -54,18 +69,39 @@ class InMemoryLobbyRepository(LobbyRepository):
     async def delete_lobby(self, lobby_id: str) -> None:
         if lobby_id in self._lobbies:
             lobby = self._lobbies.pop(lobby_id)
+            lobbies_active.set(len(self._lobbies))
             logger.info(f"Deleted lobby {lobby_id} ('{lobby.name}')")
 
 class LobbyService:
-    """Domain service for lobby operations"""
-    
-    def __init__(self, repository: LobbyRepository):
+    """Domain service for lobby operations.
+
+    When running as one of several workers, lobbies created here are always owned by this worker and every change
+    is published to the shared directory. The lobby browser reads the joinable lobbies from an index kept up to date
+    with every change here, and with the directory every `index.interval` seconds when there are other workers.
+    """
+    
+    def __init__(
+        self,
+        repository: LobbyRepository,
+        directory: Optional[LobbyDirectory] = None,
+        shard: Optional[Shard] = None,
+        index: Optional[LobbyIndex] = None,
+    ):
         self.repository = repository
+        self.directory = directory
+        self.shard = shard
+        self.index = index if index is not None else LobbyIndex()
+        self._directory_sync: Optional[asyncio.Task] = None
+        # Timers dropping recovered lobbies nobody rejoins, held so they are not garbage collected while they wait
+        self._unclaimed_drops: Set[asyncio.Task] = set()
     
     async def create_lobby(self, owner: User, name: str) -> Lobby:
         """Create a new lobby with the given owner and name"""
         lobby = Lobby(owner, name)
+        while self.shard is not None and not self.shard.owns(str(lobby.id)):
+            lobby.id = uuid.uuid4()
         await self.repository.create_lobby(lobby)
+        await self._publish(lobby)
         return lobby
     
     async def join_lobby(self, user: User, lobby_id: str) -> Optional[Lobby]:
@@ -84,7 +120,7 @@ class LobbyService:
             return None
         
         lobby.add_user(user)
-        await self.repository.update_lobby(lobby)
+        await self.save_lobby(lobby)
         logger.info(f"User {user.name} joined lobby {lobby_id}")
         return lobby
     
@@ -96,21 +132,117 @@ class LobbyService:
         
         try:
             lobby.users.remove(user)
-            await self.repository.update_lobby(lobby)
+            await self.save_lobby(lobby)
             
             # Clean up empty lobbies with no human players
             if not any(u.is_human for u in lobby.users):
+                lobby.close()
                 await self.repository.delete_lobby(lobby_id)
+                await self._unpublish(lobby_id)
                 logger.info(f"Cleaned up empty lobby {lobby_id}")
         except ValueError:
             logger.debug(f"User {user.connection.uuid} was not in lobby {lobby_id}")
     
+    async def rejoin_lobby(self, user: User, lobby_id: str, player_id: str) -> Optional[User]:
+        """Hand a reconnecting player the seat they had in a recovered lobby, returning the user in that seat.
+
+        Only seats still waiting for their player can be claimed.
+        """
+        lobby = await self.repository.get_lobby(lobby_id)
+        if not lobby:
+            return None
+        seat = next((u for u in lobby.users if isinstance(u.connection, DetachedConnection) and str(u.connection.uuid) == player_id), None)
+        if seat is None:
+            return None
+        # Keep the uuid other players and the client already know this player by
+        user.connection.uuid = seat.connection.uuid
+        seat.connection = user.connection
+        if lobby.game is not None:
+            lobby.game.players_changed()
+        await self.save_lobby(lobby)
+        logger.info(f"Player {player_id} rejoined lobby {lobby_id}")
+        return seat
+
+    async def recover_lobbies(self, resume_seconds: float) -> List[Lobby]:
+        """Bring back the lobbies a previous run left behind, dropping any that nobody rejoins in `resume_seconds`"""
+        lobbies = await self.repository.recover()
+        for lobby in lobbies:
+            await self._publish(lobby)
+            if lobby.game is not None:
+                lobby.game.resume_ai_turn()
+            drop = asyncio.create_task(self._drop_if_unclaimed(str(lobby.id), resume_seconds))
+            self._unclaimed_drops.add(drop)
+            drop.add_done_callback(self._unclaimed_drops.discard)
+        if lobbies:
+            logger.info(f"Recovered {len(lobbies)} lobbies")
+        return lobbies
+
+    async def _drop_if_unclaimed(self, lobby_id: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        lobby = await self.repository.get_lobby(lobby_id)
+        if lobby and not any(u.is_human and not isinstance(u.connection, DetachedConnection) for u in lobby.users):
+            lobby.close()
+            await self.repository.delete_lobby(lobby_id)
+            await self._unpublish(lobby_id)
+            logger.info(f"Dropped recovered lobby {lobby_id} as nobody rejoined it")
+
     async def get_available_lobbies(self) -> List[Lobby]:
         """Get all lobbies that can be joined"""
         all_lobbies = await self.repository.list_lobbies()
         return [lobby for lobby in all_lobbies 
                 if lobby.game is None and len(lobby.users) < 4]
+
+    async def get_available_lobby_summaries(
+        self, prefix: str = "", after: Optional[str] = None, limit: int = 50
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of joinable lobbies, including those owned by other workers, and the cursor of the next page"""
+        await self._start_directory_sync()
+        return self.index.query(prefix, after, limit)
+
+    async def subscribe_lobbies(self, connection_id: str, connection: CodenamesConnection, prefix: str = "") -> None:
+        """Push lobbiesUpdate diffs for lobbies named `prefix...` to a connection until it unsubscribes"""
+        await self._start_directory_sync()
+        self.index.subscribe(connection_id, connection, prefix)
+
+    def unsubscribe_lobbies(self, connection_id: str) -> None:
+        self.index.unsubscribe(connection_id)
+
+    def close(self) -> None:
+        self.index.close()
+        if self._directory_sync is not None:
+            self._directory_sync.cancel()
+        for drop in self._unclaimed_drops:
+            drop.cancel()
     
     async def get_lobby(self, lobby_id: str) -> Optional[Lobby]:
         """Get a specific lobby by ID"""
         return await self.repository.get_lobby(lobby_id)
+
+    async def save_lobby(self, lobby: Lobby) -> None:
+        """Store a lobby after it changed, e.g. a player joined or its game started"""
+        await self.repository.update_lobby(lobby)
+        await self._publish(lobby)
+
+    async def _publish(self, lobby: Lobby) -> None:
+        summary = lobby.to_json()
+        self.index.update(summary)
+        if self.directory is not None:
+            await self.directory.publish(self.shard.index if self.shard else 0, summary)
+
+    async def _unpublish(self, lobby_id: str) -> None:
+        self.index.remove(lobby_id)
+        if self.directory is not None:
+            await self.directory.remove(lobby_id)
+
+    async def _start_directory_sync(self) -> None:
+        """Pick up other workers' lobbies once the lobby browser is first used, and keep them current after that"""
+        if self.directory is None or self._directory_sync is not None:
+            return
+        self.index.sync(await self.directory.list_lobbies())
+        self._directory_sync = asyncio.create_task(self._sync_directory())
+
+    async def _sync_directory(self) -> None:
+        assert self.directory is not None, "Only synced with a directory"
+        while True:
+            await asyncio.sleep(self.index.interval)
+            self.index.sync(await self.directory.list_lobbies())
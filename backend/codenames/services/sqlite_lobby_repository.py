@@ -0,0 +1,132 @@
+from typing import Callable, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+
+from codenames.lobby import Lobby
+from codenames.metrics import lobbies_active
+from codenames.services.lobby_service import InMemoryLobbyRepository
+
+logger = logging.getLogger(__name__)
+
+class SqliteLobbyRepository(InMemoryLobbyRepository):
+    """Lobby repository mirrored to a SQLite file in WAL mode, so games in progress survive a restart.
+
+    Lobbies are served from memory as before. Updates and game mutations only mark a lobby dirty, and a background
+    task writes every dirty lobby in one transaction at most every `flush_interval` seconds, on a worker thread.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, owns: Optional[Callable[[str], bool]] = None):
+        super().__init__()
+        self.path = path
+        self.flush_interval = flush_interval
+        # With several workers sharing the file, each only recovers the lobbies it owns
+        self._owns = owns
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS lobbies (id TEXT PRIMARY KEY, updated REAL, record TEXT)")
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def create_lobby(self, lobby: Lobby) -> None:
+        await super().create_lobby(lobby)
+        self._track(lobby)
+
+    async def update_lobby(self, lobby: Lobby) -> None:
+        await super().update_lobby(lobby)
+        if str(lobby.id) in self._lobbies:
+            self._track(lobby)
+
+    async def delete_lobby(self, lobby_id: str) -> None:
+        await super().delete_lobby(lobby_id)
+        self._dirty.discard(lobby_id)
+        self._deleted.add(lobby_id)
+        self._schedule_flush()
+
+    async def recover(self) -> List[Lobby]:
+        """Load the unfinished lobbies from the file, finished games are deleted instead"""
+        rows = await asyncio.to_thread(lambda: self._db.execute("SELECT id, record FROM lobbies").fetchall())
+        recovered = []
+        for lobby_id, record in rows:
+            if self._owns is not None and not self._owns(lobby_id):
+                continue
+            try:
+                lobby = Lobby.from_record(json.loads(record))
+            except (KeyError, ValueError, TypeError) as e:
+                logger.error(f"Unable to restore lobby {lobby_id}, dropping it: {e}")
+                self._deleted.add(lobby_id)
+                continue
+            if lobby.game is not None and lobby.game.check_win():
+                lobby.close()
+                self._deleted.add(lobby_id)
+                continue
+            self._lobbies[lobby_id] = lobby
+            self._track(lobby)
+            recovered.append(lobby)
+        lobbies_active.set(len(self._lobbies))
+        self._schedule_flush()
+        return recovered
+
+    async def flush(self) -> None:
+        """Write every dirty lobby and deletion in one transaction"""
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            deleted, self._deleted = self._deleted, set()
+            now = time.time()
+            # Serialised here on the event loop so each record is a consistent snapshot
+            rows = [(lobby_id, now, json.dumps(lobby.to_record(), separators=(",", ":")))
+                    for lobby_id in dirty if (lobby := self._lobbies.get(lobby_id)) is not None]
+            if not rows and not deleted:
+                return
+            try:
+                await asyncio.to_thread(self._write, rows, deleted)
+            except sqlite3.Error as e:
+                logger.error(f"Error writing lobbies, retrying on the next flush: {e}")
+                self._dirty |= dirty
+                self._deleted |= deleted
+
+    async def close(self) -> None:
+        # Flushing first waits for a write already in progress, so the connection is idle when it closes
+        await self.flush()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._db.close()
+
+    def _track(self, lobby: Lobby) -> None:
+        """Mark the lobby dirty now and whenever its game changes"""
+        lobby_id = str(lobby.id)
+        if lobby.game is not None and lobby.game.on_state_changed is None:
+            lobby.game.on_state_changed = lambda: self._mark_dirty(lobby_id)
+        self._mark_dirty(lobby_id)
+
+    def _mark_dirty(self, lobby_id: str) -> None:
+        self._dirty.add(lobby_id)
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            # No event loop, the next change or close() writes it
+            pass
+
+    async def _flush_later(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            # Changes made while writing were not picked up by that flush
+            if not self._dirty and not self._deleted:
+                return
+
+    def _write(self, rows: List[Tuple[str, float, str]], deleted: Set[str]) -> None:
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO lobbies VALUES (?, ?, ?)", rows)
+            self._db.executemany("DELETE FROM lobbies WHERE id = ?", [(lobby_id,) for lobby_id in deleted])
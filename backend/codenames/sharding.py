@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import zlib
+from typing import Optional
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+PROXY_PATH = "/proxy/"
+
+
+def owner_of(lobby_id: str, workers: int) -> int:
+    """The worker that owns a lobby, stable across processes unlike the built in str hash"""
+    return zlib.crc32(lobby_id.encode("utf-8")) % workers
+
+
+class Shard:
+    """This worker's place among the worker processes sharing the public port"""
+    def __init__(self, index: int, workers: int, port_base: int, internal_host: str = "127.0.0.1"):
+        self.index = index
+        self.workers = workers
+        self.port_base = port_base
+        self.internal_host = internal_host
+
+    def owns(self, lobby_id: str) -> bool:
+        return owner_of(lobby_id, self.workers) == self.index
+
+    def internal_url(self, worker: int, connection_id: str) -> str:
+        """Where to proxy a connection to another worker, keeping the connection id the client was given"""
+        return f"ws://{self.internal_host}:{self.port_base + worker}{PROXY_PATH}{connection_id}"
+
+    @property
+    def internal_port(self) -> int:
+        return self.port_base + self.index
+
+
+class LobbyProxy:
+    """Relays a client connection to the worker that owns the lobby it joined.
+
+    Once a client joins a lobby it only talks to that lobby, so every later message is forwarded as is and the
+    owner's replies are written straight back to the client.
+    """
+    def __init__(self, connection, upstream: websockets.WebSocketClientProtocol):
+        self.connection = connection
+        self.upstream = upstream
+        self._relay: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def open(cls, connection, url: str, subprotocol: Optional[str] = None) -> 'LobbyProxy':
+        """Connect to the owning worker, speaking the wire format the client negotiated so frames pass through as is"""
+        upstream = await websockets.connect(url, subprotocols=[subprotocol] if subprotocol else None)  # type: ignore[list-item]
+        proxy = cls(connection, upstream)
+        proxy._relay = asyncio.create_task(proxy._relay_replies())
+        return proxy
+
+    async def forward(self, raw_message) -> None:
+        await self.upstream.send(raw_message)
+
+    async def close(self) -> None:
+        if self._relay is not None:
+            self._relay.cancel()
+        await self.upstream.close()
+
+    async def _relay_replies(self) -> None:
+        try:
+            async for payload in self.upstream:
+                await self.connection.send_raw(payload)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"Error relaying to {self.connection.id}: {e}")
+        # The owning worker went away, closing lets the client reconnect rather than talk to a dead lobby
+        logger.info(f"Proxy for {self.connection.id} closed by the owning worker")
+        await self.connection.close()
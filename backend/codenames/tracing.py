@@ -0,0 +1,116 @@
+import json
+import logging
+import logging.handlers
+import os
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, List, Optional
+
+from codenames.options import TRACE_BUFFER_SIZE, TRACE_FILE_BACKUPS, TRACE_FILE_MAX_BYTES, TRACE_PATH, TRACE_SAMPLE_RATE
+
+_current_span: ContextVar[Optional['Span']] = ContextVar("trace_span", default=None)
+
+
+class _NoopSpan:
+    """Stands in for a span when the message is not sampled, so untraced code pays almost nothing"""
+    trace_id: Optional[str] = None
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        return None
+
+    def set(self, **attributes: Any) -> None:
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed operation within a trace, the current span is the parent of spans started inside it.
+
+    The current span lives in a context variable, so tasks created inside a span (such as the AI's turn) carry
+    on the same trace.
+    """
+    def __init__(self, tracer: 'Tracer', name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = 0.0
+        self._started = 0.0
+        self._token: Any = None
+
+    def __enter__(self) -> 'Span':
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        duration = time.perf_counter() - self._started
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.attributes["error"] = repr(exc)
+        self.tracer.export({
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "durationMs": duration * 1000,
+            "attributes": self.attributes,
+        })
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    """Samples a share of inbound messages and records their spans to a ring buffer and optionally a JSONL file"""
+    def __init__(self, sample_rate: float, buffer_size: int = 1000, path: Optional[str] = None, max_bytes: int = 0, backups: int = 0):
+        self.sample_rate = sample_rate
+        self._recent: Deque[dict] = deque(maxlen=buffer_size)
+        self._file_logger: Optional[logging.Logger] = None
+        if path:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger = logging.getLogger(f"{__name__}.export")
+            self._file_logger.propagate = False
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.addHandler(handler)
+
+    def start_trace(self, name: str, **attributes: Any) -> Any:
+        """Begin a new trace for a sampled fraction of calls, the rest get a no-op span"""
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return NOOP_SPAN
+        return Span(self, name, os.urandom(16).hex(), None, attributes)
+
+    def span(self, name: str, **attributes: Any) -> Any:
+        """A child of the current span, or a no-op span when the current work is not being traced"""
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def export(self, record: dict) -> None:
+        self._recent.append(record)
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(record, default=str, separators=(",", ":")))
+
+    def recent(self) -> List[dict]:
+        return list(self._recent)
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+tracer = Tracer(TRACE_SAMPLE_RATE, TRACE_BUFFER_SIZE, TRACE_PATH, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUPS)
@@ -4,8 +4,14 @@ from typing import List
 from codenames.model import Tile
 
 
+def normalise_word(word: str) -> str:
+    """Canonical form used to match guesses against tile words"""
+    return word.replace(" ", "").lower()
+
+
 def get_tile_by_word(word: str, tiles: List[Tile]) -> Tile:
+    target = normalise_word(word)
     for tile in tiles:
-        if tile.word.replace(" ", "").lower() == word.replace(" ", "").lower():
+        if normalise_word(tile.word) == target:
             return tile
     raise ValueError(f"No tile found for word {word}")
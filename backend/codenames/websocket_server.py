@@ -1,20 +1,43 @@
 import asyncio
+import contextlib
 import json
 import logging
+import multiprocessing
+import os
+import tempfile
 import traceback
+from http import HTTPStatus
 import websockets
 from websockets import WebSocketServerProtocol
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Set, Tuple
 
 from codenames.message_router.message_router import MessageRouter
 from codenames.model import User, CodenamesConnection
-from codenames.options import HOST, WEBSOCKET_PORT
-from codenames.services.lobby_service import LobbyService, InMemoryLobbyRepository
+from codenames.game.events import game_event_writer
+from codenames.game.word_packs import word_pack_store
+from codenames.gpt.agent import create_agent
+from codenames.gpt.client import close_openai_client
+from codenames.gpt.response_cache import response_cache
+from codenames.metrics import monitor_event_loop_lag, registry, slow_consumer_disconnects
+from codenames.options import (
+    HOST, LOBBY_DIRECTORY_PATH, LOBBY_RESUME_SECONDS, LOBBY_STORE_FLUSH_SECONDS, LOBBY_STORE_PATH, LOBBY_UPDATE_SECONDS, METRICS_PATH,
+    SEND_QUEUE_HIGH_WATER, SEND_QUEUE_HIGH_WATER_SECONDS, SEND_QUEUE_SIZE, TRACE_SAMPLE_RATE, TRACES_PATH, WEBSOCKET_PORT, WORD_PACKS, WORKER_PORT_BASE, WORKERS
+)
+from codenames.services.lobby_directory import LobbyDirectory, SqliteLobbyDirectory
+from codenames.services.lobby_index import LobbyIndex
+from codenames.services.lobby_service import LobbyRepository, LobbyService, InMemoryLobbyRepository
+from codenames.services.sqlite_lobby_repository import SqliteLobbyRepository
 from codenames.message_router.message_router import MessageRouter, UserContext
-from codenames.services.connection_service import Connection, ConnectionManager
+from codenames.services.connection_service import Connection, ConnectionManager, OutboundQueue
+from codenames.sharding import PROXY_PATH, LobbyProxy, Shard, owner_of
+from codenames.tracing import tracer
+from codenames.wire_format import JSON, SUBPROTOCOLS, Payload, WireFormat, wire_format_for
 
 logger = logging.getLogger(__name__)
 
+# Closes started from callbacks, held until they finish so they are not garbage collected part way
+_closing: Set[asyncio.Task] = set()
+
 class WebSocketConnectionAdapter(CodenamesConnection):
     """Adapter to make WebSocketConnection compatible with CodenamesConnection"""
     
@@ -27,22 +50,45 @@ class WebSocketConnectionAdapter(CodenamesConnection):
     async def send(self, message: Dict[str, Any]) -> None:
         await self.websocket_connection.send_message(message)
 
+    @property
+    def wire_format(self) -> WireFormat:  # type: ignore[override]
+        return self.websocket_connection.wire_format
+
+    async def send_encoded(self, payload: Payload, message_type: str = "") -> None:
+        await self.websocket_connection.send_raw(payload, message_type)
+
 class WebSocketConnection(Connection):
     """WebSocket implementation of Connection"""
     
-    def __init__(self, websocket: WebSocketServerProtocol):
+    def __init__(self, websocket: WebSocketServerProtocol, connection_id: Optional[str] = None):
         super().__init__()
         self.websocket = websocket
+        if connection_id is not None:
+            # A connection proxied from another worker keeps the id its client was given there
+            self.id = connection_id
+        self.wire_format = wire_format_for(getattr(websocket, "subprotocol", None))
+        self.outbound = OutboundQueue(
+            self.websocket.send, self._on_slow_consumer, SEND_QUEUE_SIZE, SEND_QUEUE_HIGH_WATER, SEND_QUEUE_HIGH_WATER_SECONDS
+        )
     
     async def send_message(self, message: Dict[str, Any]) -> None:
-        try:
-            await self.websocket.send(json.dumps(message))
-            logger.debug(f"Sent message to {self.id}: {message.get('serverMessageType', 'unknown')}")
-        except Exception as e:
-            logger.error(f"Failed to send message to {self.id}: {e}")
-            raise
+        message_type = message.get("serverMessageType", "")
+        self.outbound.put(self.wire_format.encode(message), message_type)
+        logger.debug(f"Queued message for {self.id}: {message_type or 'unknown'}")
+
+    async def send_raw(self, payload: Payload, message_type: str = "") -> None:
+        """Send a message already encoded in this connection's wire format, e.g. a state update shared by several users"""
+        self.outbound.put(payload, message_type)
+
+    def _on_slow_consumer(self) -> None:
+        slow_consumer_disconnects.inc()
+        logger.warning(f"Disconnecting {self.id}, it is not keeping up with its messages")
+        closing = asyncio.create_task(self.close())
+        _closing.add(closing)
+        closing.add_done_callback(_closing.discard)
     
     async def close(self) -> None:
+        await self.outbound.aclose()
         try:
             await self.websocket.close()
         except Exception as e:
@@ -51,14 +97,36 @@ class WebSocketConnection(Connection):
 class WebSocketServer:
     """Main websocket server"""
     
-    def __init__(self, lobby_service: LobbyService, connection_manager: ConnectionManager):
+    def __init__(self, lobby_service: LobbyService, connection_manager: ConnectionManager, shard: Optional[Shard] = None):
         self.lobby_service = lobby_service
         self.connection_manager = connection_manager
         self.message_router = MessageRouter(lobby_service)
+        self.shard = shard
+        # Connections relayed to the worker that owns their lobby, by connection id
+        self._proxies: Dict[str, LobbyProxy] = {}
+
+    async def process_request(self, path: str, request_headers: Any) -> Optional[Tuple[HTTPStatus, list, bytes]]:
+        """Answer plain HTTP requests for metrics and recent traces, anything else carries on as a websocket handshake"""
+        path = path.split("?")[0]
+        if METRICS_PATH and path == METRICS_PATH:
+            return HTTPStatus.OK, [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")], registry.render().encode()
+        if TRACES_PATH and TRACE_SAMPLE_RATE and path == TRACES_PATH:
+            body = "".join(json.dumps(span, default=str) + "\n" for span in tracer.recent())
+            return HTTPStatus.OK, [("Content-Type", "application/x-ndjson")], body.encode()
+        return None
 
     async def handle_connection(self, websocket: WebSocketServerProtocol, path: str) -> None:
         """Handle a new WebSocket connection"""
-        connection = WebSocketConnection(websocket)
+        await self._serve_connection(websocket, WebSocketConnection(websocket))
+
+    async def handle_proxied_connection(self, websocket: WebSocketServerProtocol, path: str) -> None:
+        """Handle a connection another worker relays to this one because this worker owns its lobby"""
+        if not path.startswith(PROXY_PATH):
+            await websocket.close(1008, "Expected a proxied connection")
+            return
+        await self._serve_connection(websocket, WebSocketConnection(websocket, path[len(PROXY_PATH):]))
+
+    async def _serve_connection(self, websocket: WebSocketServerProtocol, connection: WebSocketConnection) -> None:
         connection_id = self.connection_manager.add_connection(connection)
         
         adapter = WebSocketConnectionAdapter(connection)
@@ -81,29 +149,62 @@ class WebSocketServer:
             await self._cleanup_connection(user_context)
     
     async def _handle_message(self, user_context: UserContext, raw_message) -> None:
-        """Handle an incoming message"""
-        if isinstance(raw_message, str):
-            message_str = raw_message
-        elif isinstance(raw_message, bytes):
-            message_str = raw_message.decode('utf-8')
-        else:
-            message_str = str(raw_message)
+        """Handle an incoming message, as a new trace when it is sampled"""
+        if proxy := self._proxies.get(user_context.connection_id):
+            await proxy.forward(raw_message)
+            return
+        with tracer.start_trace("message", connection=user_context.connection_id) as trace:
+            user_context.trace_id = trace.trace_id
+            await self._process_message(user_context, raw_message, trace)
 
+    async def _process_message(self, user_context: UserContext, raw_message: Payload, trace) -> None:
+        connection = self.connection_manager.get_connection(user_context.connection_id)
+        wire_format = connection.wire_format if isinstance(connection, WebSocketConnection) else JSON
         try:
-            message_data = json.loads(message_str)
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON from {user_context.connection_id}: {e}")
-            await self._send_error(user_context, "Invalid JSON format")
+            with tracer.span("decode", bytes=len(raw_message), format=wire_format.name):
+                message_data = wire_format.decode(raw_message)
+        except ValueError as e:
+            logger.error(f"Invalid {wire_format.name} from {user_context.connection_id}: {e}")
+            await self._send_error(user_context, f"Invalid {wire_format.name.upper()} format")
+            return
+        if not isinstance(message_data, dict):
+            await self._send_error(user_context, "Messages must be objects")
             return
         
         if message_type := message_data.get("clientMessageType"):
+            trace.set(messageType=message_type)
             logger.info(f"Received message from {user_context.connection_id}: {message_data}")
+            lobby_id = message_data.get("lobbyId")
+            if message_type == "joinLobby" and self.shard and isinstance(lobby_id, str) and not self.shard.owns(lobby_id):
+                await self._proxy_to_owner(user_context, lobby_id, raw_message)
+                return
             if response := await self.message_router.route_message(user_context, message_type, message_data):
-                if connection := self.connection_manager.get_connection(user_context.connection_id):
-                    await connection.send_message(response)
+                if connection is not None:
+                    with tracer.span("reply", messageType=response.get("serverMessageType")):
+                        await connection.send_message(response)
         else:
             await self._send_error(user_context, "Missing clientMessageType")
     
+    async def _proxy_to_owner(self, user_context: UserContext, lobby_id: str, raw_message: Payload) -> None:
+        """Relay this connection to the worker owning the lobby, starting with the join itself"""
+        connection = self.connection_manager.get_connection(user_context.connection_id)
+        if connection is None:
+            return
+        assert self.shard is not None, "Only sharded workers proxy"
+        self.lobby_service.unsubscribe_lobbies(user_context.connection_id)
+        owner = owner_of(lobby_id, self.shard.workers)
+        with tracer.span("proxy.open", worker=owner):
+            try:
+                proxy = await LobbyProxy.open(
+                    connection, self.shard.internal_url(owner, user_context.connection_id), connection.wire_format.subprotocol
+                )
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                logger.error(f"Unable to reach worker {owner} for lobby {lobby_id}: {e}")
+                await self._send_error(user_context, "Unable to join lobby")
+                return
+        self._proxies[user_context.connection_id] = proxy
+        await proxy.forward(raw_message)
+
     async def _send_error(self, user_context: UserContext, error_message: str) -> None:
         """Send an error message to the user"""
         connection = self.connection_manager.get_connection(user_context.connection_id)
@@ -115,28 +216,104 @@ class WebSocketServer:
 
     async def _cleanup_connection(self, user_context: UserContext) -> None:
         """Clean up when a connection is closed"""
+        if proxy := self._proxies.pop(user_context.connection_id, None):
+            await proxy.close()
+        self.lobby_service.unsubscribe_lobbies(user_context.connection_id)
         if user_context and user_context.lobby_id:
             await self.lobby_service.leave_lobby(user_context.user, user_context.lobby_id)
 
-        self.connection_manager.remove_connection(user_context.connection_id)
+        if connection := self.connection_manager.remove_connection(user_context.connection_id):
+            # Stops the connection's writer task, which would otherwise wait for messages forever
+            await connection.close()
         logger.info(f"Cleaned up connection {user_context.connection_id}")
 
-async def create_server() -> WebSocketServer:
+async def create_server(
+    shard: Optional[Shard] = None, directory: Optional[LobbyDirectory] = None, lobby_repository: Optional[LobbyRepository] = None
+) -> WebSocketServer:
     """Factory function to create a properly configured server"""
-    lobby_repository = InMemoryLobbyRepository()
-    lobby_service = LobbyService(lobby_repository)
+    lobby_repository = lobby_repository or InMemoryLobbyRepository()
+    lobby_service = LobbyService(lobby_repository, directory, shard, LobbyIndex(LOBBY_UPDATE_SECONDS))
     connection_manager = ConnectionManager()
     
-    return WebSocketServer(lobby_service, connection_manager)
+    return WebSocketServer(lobby_service, connection_manager, shard)
 
-async def main() -> None:
-    """Main entry point"""
-    server = await create_server()
+async def serve(shard: Optional[Shard] = None, directory: Optional[LobbyDirectory] = None) -> None:
+    """Serve until cancelled, as one of several workers sharing the port when given a shard"""
+    for pack_name, pack_path in WORD_PACKS.items():
+        word_pack_store.register_file(pack_name, pack_path)
+    word_pack_store.preload()
+    # Loads the agent's data now, so a missing vector file is reported (or fallen back from) before the first game
+    create_agent()
+    if shard is not None and directory is not None:
+        # Lobbies listed by an earlier run of this worker died with it
+        await directory.clear_worker(shard.index)
+    lobby_repository: Optional[LobbyRepository] = None
+    if LOBBY_STORE_PATH:
+        lobby_repository = SqliteLobbyRepository(LOBBY_STORE_PATH, LOBBY_STORE_FLUSH_SECONDS, shard.owns if shard else None)
+    server = await create_server(shard, directory, lobby_repository)
+    await server.lobby_service.recover_lobbies(LOBBY_RESUME_SECONDS)
     
     logger.info(f"Starting server on {HOST}:{WEBSOCKET_PORT}")
-    async with websockets.serve(server.handle_connection, HOST, WEBSOCKET_PORT):
-        logger.info(f"Server started on {HOST}:{WEBSOCKET_PORT}")
-        await asyncio.Future()  # Run forever
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            await stack.enter_async_context(websockets.serve(
+                server.handle_connection, HOST, WEBSOCKET_PORT, process_request=server.process_request, reuse_port=shard is not None,
+                subprotocols=SUBPROTOCOLS,
+            ))
+            if shard is not None:
+                await stack.enter_async_context(websockets.serve(
+                    server.handle_proxied_connection, shard.internal_host, shard.internal_port, subprotocols=SUBPROTOCOLS
+                ))
+                logger.info(f"Worker {shard.index} accepting proxied connections on {shard.internal_host}:{shard.internal_port}")
+            logger.info(f"Server started on {HOST}:{WEBSOCKET_PORT}")
+            await asyncio.Future()  # Run forever
+    finally:
+        lag_monitor.cancel()
+        server.lobby_service.close()
+        await server.lobby_service.repository.close()
+        await game_event_writer.close()
+        await close_openai_client()
+        response_cache.close()
+
+def _run_worker(index: int, workers: int, directory_path: str) -> None:
+    logging.basicConfig(level=logging.INFO, format=f"worker-{index} %(levelname)s:%(name)s:%(message)s", force=True)
+    asyncio.run(serve(Shard(index, workers, WORKER_PORT_BASE), SqliteLobbyDirectory(directory_path)))
+
+async def run_workers(workers: int) -> None:
+    """Run worker processes sharing the port through SO_REUSEPORT, restarting any that exit"""
+    directory_path = LOBBY_DIRECTORY_PATH or os.path.join(tempfile.gettempdir(), f"codenames-lobbies-{WEBSOCKET_PORT}.sqlite")
+    # Create the file up front, workers switching a new file to WAL at the same moment would lock each other out
+    SqliteLobbyDirectory(directory_path).close()
+    context = multiprocessing.get_context("spawn")
+    processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+
+    def start(index: int) -> None:
+        processes[index] = context.Process(target=_run_worker, args=(index, workers, directory_path), name=f"codenames-worker-{index}", daemon=True)
+        processes[index].start()
+
+    for index in range(workers):
+        start(index)
+    logger.info(f"Started {workers} workers on {HOST}:{WEBSOCKET_PORT}, lobby directory {directory_path}")
+    try:
+        while True:
+            await asyncio.sleep(1)
+            for index, process in processes.items():
+                if not process.is_alive():
+                    logger.error(f"Worker {index} exited with code {process.exitcode}, restarting it")
+                    start(index)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(5)
+
+async def main() -> None:
+    """Main entry point"""
+    if WORKERS > 1:
+        await run_workers(WORKERS)
+    else:
+        await serve()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
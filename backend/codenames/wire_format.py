@@ -0,0 +1,71 @@
+"""
+Message encodings a client can pick with the websocket subprotocol it asks for.
+
+`codenames.msgpack` sends MessagePack in binary frames, offered when the msgpack package is installed. Clients asking
+for `codenames.json`, or for no subprotocol, get JSON text frames. The server encodes those with orjson when it is
+installed and with the standard library otherwise, both writing the same compact JSON.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Union
+
+Payload = Union[str, bytes]
+
+
+class WireFormat:
+    """How messages to and from one connection are encoded"""
+    __slots__ = ("name", "subprotocol", "encode", "decode")
+
+    def __init__(self, name: str, subprotocol: str, encode: Callable[[Any], Payload], decode: Callable[[Payload], Any]):
+        self.name = name
+        self.subprotocol = subprotocol
+        self.encode = encode
+        # Raises ValueError for a malformed frame
+        self.decode = decode
+
+    def __repr__(self) -> str:
+        return f"WireFormat({self.name!r})"
+
+
+def _stdlib_json() -> WireFormat:
+    encoder = json.JSONEncoder(separators=(",", ":"))
+    return WireFormat("json", "codenames.json", encoder.encode, json.loads)
+
+
+def _fast_json() -> Optional[WireFormat]:
+    try:
+        import orjson
+    except ImportError:
+        return None
+    dumps = orjson.dumps
+    return WireFormat("json", "codenames.json", lambda message: dumps(message).decode("utf-8"), orjson.loads)
+
+
+def _msgpack() -> Optional[WireFormat]:
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    packer = msgpack.Packer()
+
+    def decode(payload: Payload) -> Any:
+        if isinstance(payload, str):
+            raise ValueError("MessagePack messages must be sent in binary frames")
+        try:
+            return msgpack.unpackb(payload)
+        except msgpack.UnpackException as e:
+            raise ValueError(str(e)) from e
+    return WireFormat("msgpack", "codenames.msgpack", packer.pack, decode)
+
+
+STDLIB_JSON = _stdlib_json()
+JSON = _fast_json() or STDLIB_JSON
+MSGPACK = _msgpack()
+
+_BY_SUBPROTOCOL: Dict[str, WireFormat] = {fmt.subprotocol: fmt for fmt in (JSON, MSGPACK) if fmt is not None}
+# Offered to clients in order of preference
+SUBPROTOCOLS: List[str] = [fmt.subprotocol for fmt in (MSGPACK, JSON) if fmt is not None]
+
+
+def wire_format_for(subprotocol: Optional[str]) -> WireFormat:
+    """The format negotiated for a connection, JSON when the client asked for none"""
+    return _BY_SUBPROTOCOL.get(subprotocol, JSON) if subprotocol else JSON
@@ -0,0 +1,3 @@
+"""
+Load testing tools: a fake OpenAI endpoint and a swarm of simulated players, run with `python -m loadtest`.
+"""
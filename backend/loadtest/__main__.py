@@ -0,0 +1,144 @@
+"""
+Load test the server with a swarm of simulated players, the AI's OpenAI calls answered by a local fake endpoint.
+
+Run from the backend directory, e.g. `python -m loadtest --lobbies 50 --games 4`. By default a server is started
+as a subprocess on --port, pass --url to target one that is already running (its OPENAI_BASE_URL must then point at
+a fake endpoint, see `python -m loadtest.fake_openai`). Server options such as LLM_MAX_IN_FLIGHT are passed
+through from the environment.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import time
+from typing import Optional
+
+from loadtest import fake_openai
+from loadtest.swarm import SwarmMetrics, run_swarm
+
+BACKEND_DIRECTORY = pathlib.Path(__file__).parent.parent
+# run.py logs every message at INFO, which would dominate the measurements
+_SERVER_COMMAND = (
+    "import asyncio, logging; logging.basicConfig(level=logging.WARNING); "
+    "import codenames.websocket_server as server; asyncio.run(server.main())"
+)
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """Resident memory of a process, only available where /proc is"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler:
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.base = _rss_bytes(pid)
+        self.peak = self.base
+
+    async def run(self) -> None:
+        while True:
+            if (rss := _rss_bytes(self.pid)) is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            await asyncio.sleep(self.interval)
+
+
+async def _start_server(port: int, llm_url: str, stream: bool) -> subprocess.Popen:
+    environment = dict(os.environ)
+    environment.update({
+        "HOST": "127.0.0.1",
+        "WEBSOCKET_PORT": str(port),
+        "OPENAI_BASE_URL": llm_url,
+        "OPENAI_KEY": environment.get("OPENAI_KEY", "load-test"),
+        "AI_PLAYER": "gpt",
+        "GUESS_DELAY": "0",
+        "STREAM_RESPONSES": str(stream),
+    })
+    server = subprocess.Popen(
+        [sys.executable, "-c", _SERVER_COMMAND],
+        cwd=BACKEND_DIRECTORY,
+        env=environment,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return server
+        except OSError:
+            await asyncio.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f"Server did not start listening on port {port}")
+
+
+def _print_report(metrics: SwarmMetrics, elapsed: float, lobbies: int, llm: fake_openai.FakeOpenAI, memory: Optional[MemorySampler]) -> None:
+    stats = metrics.stats()
+    print(f"\n{stats['gamesCompleted']} games completed, {stats['gamesFailed']} failed in {elapsed:.1f}s "
+          f"with {lobbies} concurrent lobbies: {stats['gamesCompleted'] / elapsed:.2f} games/s")
+    print(f"\n{'latency (ms)':<20} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = list(stats["messageLatency"].items())
+    if stats["fanOut"]:
+        rows.append(("broadcast fan-out", stats["fanOut"]))
+    for name, summary in rows:
+        print(f"{name:<20} {summary['count']:>7} {summary['p50'] * 1000:>9.1f} {summary['p95'] * 1000:>9.1f} {summary['p99'] * 1000:>9.1f}")
+    print(f"\nfake OpenAI: {json.dumps(llm.stats())}")
+    if memory is not None and memory.base is not None and memory.peak is not None:
+        print(f"server memory: {memory.base / 2 ** 20:.1f} MiB idle, {memory.peak / 2 ** 20:.1f} MiB peak, "
+              f"{(memory.peak - memory.base) / lobbies / 1024:.1f} KiB per lobby")
+    for error in sorted(set(metrics.errors))[:5]:
+        print(f"error: {error}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    llm = fake_openai.from_arguments(args)
+    llm_url = await llm.start()
+    server: Optional[subprocess.Popen] = None
+    url = args.url
+    memory: Optional[MemorySampler] = None
+    sampler: Optional['asyncio.Task[None]'] = None
+    try:
+        if url is None:
+            server = await _start_server(args.port, llm_url, args.stream)
+            url = f"ws://127.0.0.1:{args.port}"
+            memory = MemorySampler(server.pid)
+            sampler = asyncio.create_task(memory.run())
+        metrics = SwarmMetrics()
+        start = time.perf_counter()
+        await run_swarm(url, args.lobbies, args.games, args.players, args.accuracy, args.think_time, args.game_timeout, args.seed, metrics)
+        _print_report(metrics, time.perf_counter() - start, args.lobbies, llm, memory)
+    finally:
+        if sampler is not None:
+            sampler.cancel()
+        if server is not None:
+            server.terminate()
+            server.wait()
+        await llm.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lobbies", type=int, default=10, help="Games played at the same time")
+    parser.add_argument("--games", type=int, default=1, help="Games each lobby slot plays one after another")
+    parser.add_argument("--players", type=int, choices=range(1, 5), default=2, help="Simulated players per lobby, the AI plays the rest")
+    parser.add_argument("--accuracy", type=float, default=0.8, help="Chance a simulated operative picks one of its own team's words")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds a simulated player waits before moving")
+    parser.add_argument("--game-timeout", type=float, default=120.0, help="Seconds without progress before a game counts as failed")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--port", type=int, default=8765, help="Port for the server started by the load test")
+    parser.add_argument("--url", default=None, help="Websocket URL of an already running server")
+    parser.add_argument("--stream", action="store_true", help="Have the server stream completions")
+    fake_openai.add_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
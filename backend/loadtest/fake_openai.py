@@ -0,0 +1,184 @@
+"""
+A stand-in for the OpenAI chat completions endpoint, so AI turns can be load tested without the real API.
+
+Answers are plausible enough for the game to carry on: clues are made up words and guesses are picked from the
+words listed in the prompt. Latency follows a log-normal distribution and a share of requests fail with a 500 or 429.
+
+Run standalone from the backend directory with `python -m loadtest.fake_openai --port 8100` and start the server
+with `OPENAI_BASE_URL=http://127.0.0.1:8100/v1`.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+_WORD_LIST = re.compile(r"\[([^\]]*)\]")
+_GUESS_COUNT = re.compile(r"choose the (\d+) words")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class FakeOpenAI:
+    """Minimal HTTP/1.1 server answering POST .../chat/completions, streamed or not"""
+    def __init__(
+        self,
+        latency_median: float = 0.5,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        chunk_delay: float = 0.02,
+        seed: Optional[int] = None,
+    ):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.chunk_delay = chunk_delay
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._ids = itertools.count()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.StreamWriter, 'asyncio.Task[None]'] = {}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start listening and return the base URL to give the OpenAI client"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        bound_port = self._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}/v1"
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Closing the sockets lets each handler see the end of its stream and return
+            for writer in self._connections:
+                writer.close()
+            if self._connections:
+                await asyncio.wait(list(self._connections.values()))
+            await self._server.wait_closed()
+            self._server = None
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "errors": self.errors}
+
+    def answer(self, messages: List[Dict[str, str]]) -> str:
+        """The completion text for a clue or guess prompt"""
+        prompt = messages[-1].get("content", "") if messages else ""
+        if (count := _GUESS_COUNT.search(prompt)) and (listed := _WORD_LIST.search(prompt)):
+            words = [word for word in listed.group(1).split(",") if word]
+            return ",".join(self.random.sample(words, min(int(count.group(1)), len(words))))
+        team_words = _WORD_LIST.search(prompt)
+        number = min(len(team_words.group(1).split(",")), self.random.randint(1, 3)) if team_words else 1
+        return f"LOADTEST{next(self._ids)},{number}"
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections[writer] = asyncio.current_task()  # type: ignore[assignment]
+        try:
+            while request := await self._read_request(reader):
+                await self._respond(writer, *request)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[writer]
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        path = request_line.split()[1].decode()
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+        return path, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, path: str, body: bytes) -> None:
+        if not path.rstrip("/").endswith("/chat/completions"):
+            self._write_json(writer, 404, {"error": {"message": f"Unknown path {path}", "type": "invalid_request_error"}})
+            await writer.drain()
+            return
+        self.requests += 1
+        request = json.loads(body or b"{}")
+        await asyncio.sleep(self.random.lognormvariate(0, self.latency_sigma) * self.latency_median)
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            status = self.random.choice((429, 500))
+            self._write_json(writer, status, {"error": {"message": "Injected failure", "type": "server_error"}})
+            await writer.drain()
+            return
+        content = self.answer(request.get("messages", []))
+        model = request.get("model", "fake")
+        completion_id = f"chatcmpl-fake{next(self._ids)}"
+        if request.get("stream"):
+            await self._stream(writer, completion_id, model, content)
+        else:
+            self._write_json(writer, 200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(content) // 4 + 1, "total_tokens": (len(body) + len(content)) // 4 + 1},
+            })
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter, completion_id: str, model: str, content: str) -> None:
+        """Send the content as server sent events, a few characters per chunk"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        pieces: List[Optional[str]] = [content[i:i + 4] for i in range(0, len(content), 4)]
+        for piece in pieces + [None]:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece} if piece else {}, "finish_reason": None if piece else "stop"}],
+            }
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+            if piece:
+                await asyncio.sleep(self.chunk_delay)
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    @staticmethod
+    def _write_json(writer: asyncio.StreamWriter, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+            + data
+        )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Median seconds per completion")
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.5, help="Spread of the log-normal latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of completions failing with a 500 or 429")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.02, help="Seconds between streamed chunks")
+
+
+def from_arguments(args: argparse.Namespace) -> FakeOpenAI:
+    return FakeOpenAI(args.llm_latency, args.llm_latency_sigma, args.llm_error_rate, args.llm_chunk_delay)
+
+
+async def _serve(fake: FakeOpenAI, host: str, port: int) -> None:
+    url = await fake.start(host, port)
+    print(f"Fake OpenAI listening, set OPENAI_BASE_URL={url}")
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    arguments = parser.parse_args()
+    asyncio.run(_serve(from_arguments(arguments), arguments.host, arguments.port))
@@ -0,0 +1,273 @@
+"""
+Simulated players driving whole games over websockets: idRequest, createLobby or joinLobby, preferencesRequest,
+then provideClue and guessTile whenever it is their turn. Roles without a simulated player are left to the server's AI.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import websockets
+
+from codenames.model import Role
+
+Reply = Dict[str, Any]
+
+# Simulated players take roles in this order, so the default of two gives the red team to the swarm
+ROLE_ORDER = [Role.RED_SPYMASTER, Role.RED_OPERATIVE, Role.BLUE_SPYMASTER, Role.BLUE_OPERATIVE]
+_clue_ids = itertools.count()
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class SwarmMetrics:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.fan_out: List[float] = []
+        self.games_completed = 0
+        self.games_failed = 0
+        self.errors: List[str] = []
+
+    def record(self, message_type: str, seconds: float) -> None:
+        self.latencies.setdefault(message_type, []).append(seconds)
+
+    @staticmethod
+    def _summarise(samples: List[float]) -> Dict[str, float]:
+        ordered = sorted(samples)
+        return {
+            "count": len(ordered),
+            "p50": percentile(ordered, 0.5),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "messageLatency": {name: self._summarise(samples) for name, samples in sorted(self.latencies.items()) if samples},
+            "fanOut": self._summarise(self.fan_out) if self.fan_out else None,
+            "gamesCompleted": self.games_completed,
+            "gamesFailed": self.games_failed,
+        }
+
+
+class _PendingAction:
+    """A move waiting for every simulated player in its lobby to see the resulting state"""
+    def __init__(self, sender: 'SimulatedPlayer', message_type: str, base_version: int, waiting: Set['SimulatedPlayer']):
+        self.sender = sender
+        self.message_type = message_type
+        self.base_version = base_version
+        self.waiting = waiting
+        self.sent_at = time.perf_counter()
+
+
+class SimulatedLobby:
+    """State shared by the simulated players of one lobby"""
+    def __init__(self, size: int, metrics: SwarmMetrics):
+        self.size = size
+        self.metrics = metrics
+        self.players: List['SimulatedPlayer'] = []
+        self.id: Optional[str] = None
+        self.created = asyncio.Event()
+        self.joined = 0
+        self.all_joined = asyncio.Event()
+        self.named = 0
+        self.all_named = asyncio.Event()
+        # Preferences are sent one player at a time so each playerUpdate can be attributed to its request
+        self.preferences_lock = asyncio.Lock()
+        # The latest spymaster view of each team, letting operatives guess better than at random
+        self.spymaster_tiles: Dict[str, List[dict]] = {}
+        self.pending: List[_PendingAction] = []
+
+    def arrive(self, counter: str, event: asyncio.Event) -> None:
+        setattr(self, counter, getattr(self, counter) + 1)
+        if getattr(self, counter) == self.size:
+            event.set()
+
+    def start_action(self, sender: 'SimulatedPlayer', message_type: str, base_version: int) -> None:
+        self.pending.append(_PendingAction(sender, message_type, base_version, set(self.players)))
+
+    def on_state_update(self, player: 'SimulatedPlayer', version: int) -> None:
+        now = time.perf_counter()
+        for action in list(self.pending):
+            if version <= action.base_version or player not in action.waiting:
+                continue
+            action.waiting.discard(player)
+            if player is action.sender:
+                self.metrics.record(action.message_type, now - action.sent_at)
+            if not action.waiting:
+                self.metrics.fan_out.append(now - action.sent_at)
+                self.pending.remove(action)
+
+
+class SimulatedPlayer:
+    def __init__(self, url: str, role: Role, lobby: SimulatedLobby, rng: random.Random, accuracy: float, think_time: float, timeout: float):
+        self.url = url
+        self.role = role
+        self.lobby = lobby
+        self.rng = rng
+        self.accuracy = accuracy
+        self.think_time = think_time
+        self.timeout = timeout
+        self.uuid = ""
+        self._messages: 'asyncio.Queue[Dict[str, Any]]' = asyncio.Queue()
+        self._backlog: List[Dict[str, Any]] = []
+        self._awaiting_version: Optional[int] = None
+        lobby.players.append(self)
+
+    @property
+    def is_owner(self) -> bool:
+        return self.lobby.players[0] is self
+
+    async def run(self) -> None:
+        async with websockets.connect(self.url, max_size=None) as websocket:
+            reader = asyncio.create_task(self._read(websocket))
+            try:
+                await self._join(websocket)
+                await self._play(websocket)
+            finally:
+                reader.cancel()
+
+    async def _read(self, websocket) -> None:
+        async for raw in websocket:
+            self._messages.put_nowait(json.loads(raw))
+
+    async def _next(self) -> Dict[str, Any]:
+        message = await asyncio.wait_for(self._messages.get(), self.timeout)
+        if message.get("serverMessageType") in ("error", "stateError"):
+            raise RuntimeError(f"Server rejected a request: {message.get('message')}")
+        return message
+
+    async def _request(self, websocket, message: Dict[str, Any], accept: Callable[[Reply], bool]) -> Reply:
+        """Send a message and wait for the reply `accept` recognises, keeping state updates for the game loop"""
+        start = time.perf_counter()
+        await websocket.send(json.dumps(message))
+        while True:
+            reply = await self._next()
+            if accept(reply):
+                self.lobby.metrics.record(message["clientMessageType"], time.perf_counter() - start)
+                return reply
+            if reply.get("serverMessageType") == "stateUpdate":
+                self._backlog.append(reply)
+
+    def _has_player(self, **fields: Any) -> Callable[[Reply], bool]:
+        """Accept the playerUpdate showing this player's preferences applied"""
+        def accept(reply: Reply) -> bool:
+            if reply.get("serverMessageType") != "playerUpdate":
+                return False
+            me = next((player for player in reply["players"] if player["uuid"] == self.uuid), {})
+            return all(me.get(name) == value for name, value in fields.items())
+        return accept
+
+    async def _join(self, websocket) -> None:
+        lobby = self.lobby
+        reply = await self._request(websocket, {"clientMessageType": "idRequest"}, lambda r: r.get("serverMessageType") == "idAssign")
+        self.uuid = reply["uuid"]
+        if self.is_owner:
+            reply = await self._request(
+                websocket,
+                {"clientMessageType": "createLobby", "name": f"load test {self.uuid[:8]}"},
+                lambda r: r.get("serverMessageType") == "lobbyJoined",
+            )
+            lobby.id = reply["lobbyId"]
+            lobby.created.set()
+        else:
+            await lobby.created.wait()
+            await self._request(
+                websocket,
+                {"clientMessageType": "joinLobby", "lobbyId": lobby.id},
+                lambda r: r.get("serverMessageType") == "lobbyJoined",
+            )
+        lobby.arrive("joined", lobby.all_joined)
+        await lobby.all_joined.wait()
+        name = f"{self.role.name.lower()}-{self.uuid[:8]}"
+        async with lobby.preferences_lock:
+            await self._request(
+                websocket,
+                {"clientMessageType": "preferencesRequest", "player": {"name": name, "role": self.role.index}},
+                self._has_player(name=name, role=self.role.index),
+            )
+        lobby.arrive("named", lobby.all_named)
+        await lobby.all_named.wait()
+        async with lobby.preferences_lock:
+            await self._request(
+                websocket,
+                {"clientMessageType": "preferencesRequest", "player": {"ready": True}},
+                self._has_player(ready=True),
+            )
+
+    async def _play(self, websocket) -> None:
+        while True:
+            message = self._backlog.pop(0) if self._backlog else await self._next()
+            if message.get("serverMessageType") != "stateUpdate":
+                continue
+            version = message["version"]
+            self.lobby.on_state_update(self, version)
+            if self.role.is_spymaster:
+                self.lobby.spymaster_tiles[self.role.team] = message["tiles"]
+            if message["winner"]:
+                return
+            if self._awaiting_version is not None and version <= self._awaiting_version:
+                continue
+            self._awaiting_version = None
+            if message["onTurnRole"] == self.role.index:
+                await self._act(websocket, message)
+
+    async def _act(self, websocket, state: Dict[str, Any]) -> None:
+        if self.think_time:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+        if self.role.is_spymaster:
+            remaining = sum(1 for tile in state["tiles"] if tile["team"] == self.role.team and not tile["revealed"])
+            message = {"clientMessageType": "provideClue", "word": f"SWARM{next(_clue_ids)}", "number": min(2, remaining)}
+        else:
+            message = {"clientMessageType": "guessTile", "word": self._choose_guess(state["tiles"])}
+        self.lobby.start_action(self, message["clientMessageType"], state["version"])
+        self._awaiting_version = state["version"]
+        await websocket.send(json.dumps(message))
+
+    def _choose_guess(self, tiles: List[dict]) -> str:
+        known = self.lobby.spymaster_tiles.get(self.role.team, tiles)
+        unrevealed = [tile for tile in known if not tile["revealed"]]
+        own = [tile for tile in unrevealed if tile["team"] == self.role.team]
+        if own and self.rng.random() < self.accuracy:
+            return self.rng.choice(own)["word"]
+        return self.rng.choice(unrevealed)["word"]
+
+
+async def run_swarm(
+    url: str,
+    lobbies: int,
+    games: int = 1,
+    players: int = 2,
+    accuracy: float = 0.8,
+    think_time: float = 0.0,
+    timeout: float = 120.0,
+    seed: Optional[int] = None,
+    metrics: Optional[SwarmMetrics] = None,
+) -> SwarmMetrics:
+    """Keep `lobbies` games running at once until each has played `games` games"""
+    metrics = metrics or SwarmMetrics()
+    rng = random.Random(seed)
+
+    async def play_games() -> None:
+        for _ in range(games):
+            lobby = SimulatedLobby(players, metrics)
+            simulated = [
+                SimulatedPlayer(url, role, lobby, random.Random(rng.random()), accuracy, think_time, timeout)
+                for role in ROLE_ORDER[:players]
+            ]
+            try:
+                async with asyncio.TaskGroup() as group:
+                    for player in simulated:
+                        group.create_task(player.run())
+            except Exception as e:
+                metrics.games_failed += 1
+                metrics.errors.append(repr(e))
+            else:
+                metrics.games_completed += 1
+
+    await asyncio.gather(*(play_games() for _ in range(lobbies)))
+    return metrics
@@ -0,0 +1,119 @@
+"""
+AI task supervision tests: one task per player, a cap per game and cancellation when the lobby goes
+"""
+import asyncio
+
+import pytest
+
+from codenames.game.ai_tasks import TaskSupervisor, ai_task_stats
+from codenames.metrics import ai_tasks_cancelled, ai_tasks_slow
+from codenames.model import User
+from codenames.services.lobby_service import InMemoryLobbyRepository, LobbyService
+from tests.test_clue_service import FakeAgent, create_game
+
+
+class TestTaskSupervisor:
+    """Every task is held, capped and cancellable"""
+
+    @pytest.mark.asyncio
+    async def test_one_task_per_key_and_a_cap_on_running(self):
+        supervisor = TaskSupervisor("lobby", max_running=1)
+        release = asyncio.Event()
+        started = []
+
+        async def turn(name: str):
+            started.append(name)
+            await release.wait()
+
+        first = supervisor.spawn(turn("clue"), "RED_SPYMASTER")
+        assert supervisor.spawn(turn("duplicate"), "RED_SPYMASTER") is None
+        second = supervisor.spawn(turn("guesses"), "BLUE_GUESSER")
+        await asyncio.sleep(0)
+        assert started == ["clue"] and supervisor.stats() == {"running": 1, "waiting": 1, "slow": 0, "orphaned": 0}
+
+        release.set()
+        await asyncio.wait_for(asyncio.gather(first, second), 1)
+        assert started == ["clue", "guesses"] and len(supervisor) == 0
+
+    @pytest.mark.asyncio
+    async def test_next_turn_for_a_busy_key_waits_for_the_running_one(self):
+        supervisor = TaskSupervisor("lobby", max_running=2)
+        release = asyncio.Event()
+        order = []
+
+        async def turn(name: str, wait: bool):
+            order.append(f"{name} started")
+            if wait:
+                await release.wait()
+            order.append(f"{name} done")
+
+        first = supervisor.spawn(turn("first", True), "RED_GUESSER", turn=1)
+        assert supervisor.spawn(turn("repeat", False), "RED_GUESSER", turn=1) is None
+        second = supervisor.spawn(turn("second", False), "RED_GUESSER", turn=5)
+        await asyncio.sleep(0.01)
+        assert second is not None and not second.done()
+        assert order == ["first started"] and supervisor.stats()["waiting"] == 1
+
+        release.set()
+        await asyncio.wait_for(asyncio.gather(first, second), 1)
+        assert order == ["first started", "first done", "second started", "second done"] and len(supervisor) == 0
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_everything_and_refuses_new_work(self):
+        supervisor = TaskSupervisor("lobby", slow_after=0.01)
+        cancelled = ai_tasks_cancelled.value()
+        slow = ai_tasks_slow.value()
+        running = supervisor.spawn(asyncio.sleep(10), "RED_SPYMASTER")
+        waiting = supervisor.spawn(asyncio.sleep(10), "BLUE_SPYMASTER")
+        await asyncio.sleep(0.03)
+        assert ai_tasks_slow.value() == slow + 2 and ai_task_stats()["slow"] >= 2
+
+        supervisor.close()
+        await asyncio.sleep(0.01)
+        assert running is not None and running.cancelled() and waiting is not None and waiting.cancelled()
+        assert ai_tasks_cancelled.value() == cancelled + 2 and len(supervisor) == 0
+        coro = asyncio.sleep(0)
+        assert supervisor.spawn(coro, "RED_SPYMASTER") is None
+        assert coro.cr_frame is None, "A refused coroutine is closed, not left to warn"
+
+    @pytest.mark.asyncio
+    async def test_task_cancelled_before_it_runs_closes_its_coroutine(self):
+        supervisor = TaskSupervisor("lobby")
+        coro = asyncio.sleep(10)
+        task = supervisor.spawn(coro, "RED_SPYMASTER")
+        supervisor.close()
+        await asyncio.sleep(0.01)
+        assert task is not None and task.cancelled() and len(supervisor) == 0
+        assert coro.cr_frame is None, "A coroutine that never started is closed, not left to warn"
+
+
+class _StalledAgent(FakeAgent):
+    async def provide_clue(self, user, tiles):
+        self.clue_calls += 1
+        await asyncio.sleep(10)
+        return "never", 1
+
+
+class TestGameAiTasks:
+    """A game's AI turns stop with its lobby"""
+
+    @pytest.mark.asyncio
+    async def test_deleting_the_lobby_cancels_the_ai_turn(self):
+        agent = _StalledAgent()
+        game = create_game(agent)
+        service = LobbyService(InMemoryLobbyRepository())
+        human = game.users[0]
+        lobby = await service.create_lobby(human, "short lived")
+        lobby.users, lobby.game = [human, game.users[2]], game
+
+        await game.provide_clue(human, "first", 1)
+        await game.pass_turn(game.users[1])
+        assert game.get_on_turn_user() is game.users[2]
+        game.start_ai_turn(game.users[2])
+        await asyncio.sleep(0.01)
+        assert len(game.ai_tasks) == 1 and agent.clue_calls == 1
+
+        await service.leave_lobby(human, str(lobby.id))
+        await asyncio.sleep(0.01)
+        assert await service.get_lobby(str(lobby.id)) is None
+        assert len(game.ai_tasks) == 0 and game.ai_tasks.closed
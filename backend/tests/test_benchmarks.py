@@ -0,0 +1,24 @@
+"""
+Benchmark suite tests
+"""
+from benchmarks.suite import BENCHMARKS, compare, load_baseline, run
+
+
+class TestBenchmarkSuite:
+    """The suite runs every hot path and flags slowdowns against the stored baseline"""
+
+    def test_every_benchmark_runs_and_has_a_baseline(self):
+        current = run(BENCHMARKS, scale=0.001)
+        baseline = load_baseline()
+        assert baseline is not None
+        assert set(current["results"]) == set(baseline["results"])
+        assert all(seconds > 0 for seconds in current["results"].values())
+
+    def test_regressions_are_flagged_relative_to_machine_speed(self):
+        baseline = {"calibration": 1.0, "results": {"fast": 1.0, "slow": 1.0}}
+        # Twice as slow a machine, on which "slow" got three times slower
+        current = {"calibration": 2.0, "results": {"fast": 2.0, "slow": 6.0, "new": 1.0}}
+        comparisons = {comparison.name: comparison for comparison in compare(current, baseline, threshold=1.3)}
+        assert not comparisons["fast"].regressed and comparisons["fast"].ratio == 1.0
+        assert comparisons["slow"].regressed and comparisons["slow"].ratio == 3.0
+        assert comparisons["new"].baseline is None and not comparisons["new"].regressed
@@ -0,0 +1,146 @@
+"""
+Circuit breaker and fallback agent tests
+"""
+import asyncio
+from typing import AsyncIterator, List, Tuple
+
+import pytest
+
+from codenames.gpt import client
+from codenames.gpt.agent import Agent, HeuristicAgent, create_agent
+from codenames.gpt.circuit_breaker import BreakerAgent, BreakerState, CircuitBreaker
+from codenames.model import Tile, User
+
+
+class FlakyAgent(Agent):
+    def __init__(self):
+        self.failing = True
+        self.calls = 0
+
+    async def provide_clue(self, user: User, tiles: List[Tile]) -> Tuple[str, int]:
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError("provider down")
+        return ("PRIMARY", 2)
+
+    async def make_guesses(self, word: str, number: int, tiles: List[Tile]) -> List[str]:
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError("provider down")
+        return [tiles[0].word]
+
+
+class SlowStreamAgent(Agent):
+    """Streams its guesses promptly, or stalls before the first one"""
+    def __init__(self, stall: bool = False):
+        self.stall = stall
+
+    async def provide_clue(self, user: User, tiles: List[Tile]) -> Tuple[str, int]:
+        await asyncio.sleep(10 if self.stall else 0)
+        return ("PRIMARY", 1)
+
+    async def make_guesses(self, word: str, number: int, tiles: List[Tile]) -> List[str]:
+        return [tile.word for tile in tiles]
+
+    async def stream_guesses(self, word: str, number: int, tiles: List[Tile]) -> AsyncIterator[str]:
+        await asyncio.sleep(10 if self.stall else 0)
+        for tile in tiles:
+            yield tile.word
+
+
+def make_user() -> User:
+    user = User(None, False)  # type: ignore[arg-type]
+    user.team = "red"
+    return user
+
+
+class TestCircuitBreaker:
+    """Failing agents are swapped for the fallback until a probe succeeds"""
+
+    @pytest.mark.asyncio
+    async def test_trips_falls_back_and_recovers(self):
+        primary = FlakyAgent()
+        breaker = CircuitBreaker("test", min_calls=3, error_rate=0.5, open_seconds=0)
+        agent = BreakerAgent(primary, HeuristicAgent(), breaker)
+        tiles = [Tile("apple", "red"), Tile("thing", "blue")]
+
+        for _ in range(3):
+            clue, number = await agent.provide_clue(make_user(), tiles)
+            assert clue != "PRIMARY" and number == 1
+            assert clue.lower() not in {"apple", "thing"}
+        assert breaker.state is BreakerState.OPEN
+
+        # The probe fails so the breaker re-opens
+        await agent.provide_clue(make_user(), tiles)
+        assert breaker.state is BreakerState.OPEN
+
+        primary.failing = False
+        assert await agent.provide_clue(make_user(), tiles) == ("PRIMARY", 2)
+        assert breaker.state is BreakerState.CLOSED
+        stats = breaker.stats()
+        assert stats["transitions"] == {"closed->open": 1, "open->half_open": 2, "half_open->open": 1, "half_open->closed": 1}
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_skips_primary(self):
+        primary = FlakyAgent()
+        breaker = CircuitBreaker("test", min_calls=1, open_seconds=60)
+        agent = BreakerAgent(primary, HeuristicAgent(), breaker)
+        tiles = [Tile("apple", "red"), Tile("bear", "blue")]
+        assert await agent.make_guesses("ape", 1, tiles) == ["apple"]
+        assert breaker.state is BreakerState.OPEN
+        guesses = [guess async for guess in agent.stream_guesses("ape", 1, tiles)]
+        assert guesses == ["apple"]
+        assert primary.calls == 1
+        assert breaker.stats()["fallbackCalls"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_frees_the_half_open_breaker(self):
+        breaker = CircuitBreaker("test", min_calls=1, open_seconds=0)
+        breaker.record(False, 0.1)
+        primary = SlowStreamAgent(stall=True)
+        agent = BreakerAgent(primary, HeuristicAgent(), breaker)
+        tiles = [Tile("apple", "red"), Tile("bear", "blue")]
+
+        probe = asyncio.create_task(agent.provide_clue(make_user(), tiles))
+        await asyncio.sleep(0)
+        assert breaker.state is BreakerState.HALF_OPEN and breaker.probe_in_flight
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert not breaker.probe_in_flight
+
+        primary.stall = False
+        assert await agent.provide_clue(make_user(), tiles) == ("PRIMARY", 1)
+        assert breaker.state is BreakerState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_stream_closed_early_is_healthy_and_ignores_consumer_time(self):
+        breaker = CircuitBreaker("test", min_calls=1, slow_call_seconds=0.05)
+        agent = BreakerAgent(SlowStreamAgent(), HeuristicAgent(), breaker)
+        stream = agent.stream_guesses("ape", 1, [Tile("apple", "red"), Tile("bear", "blue")])
+        assert await stream.__anext__() == "apple"
+        # The consumer plays the guess, slower than a healthy provider call, then stops after a wrong guess
+        await asyncio.sleep(0.1)
+        await stream.aclose()
+        assert breaker.stats()["windowCalls"] == 1
+        assert breaker.state is BreakerState.CLOSED and breaker.failure_rate() == 0
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker("test", min_calls=2, error_rate=0.5, slow_call_seconds=1)
+        breaker.record(True, 5.0)
+        breaker.record(True, 0.1)
+        assert breaker.state is BreakerState.OPEN
+
+    def test_created_agents_are_wrapped(self, monkeypatch):
+        monkeypatch.setattr(client, "OPEN_AI_KEY", "key")
+        agent = create_agent("gpt", fallback="heuristic")
+        assert isinstance(agent, BreakerAgent)
+        assert isinstance(agent.fallback, HeuristicAgent)
+        assert isinstance(create_agent("heuristic", fallback="heuristic"), HeuristicAgent)
+
+    def test_missing_openai_key_falls_back(self, monkeypatch):
+        monkeypatch.setattr(client, "OPEN_AI_KEY", None)
+        monkeypatch.setattr(client, "_client", None)
+        assert isinstance(create_agent("gpt", fallback="heuristic"), HeuristicAgent)
+        with pytest.raises(ValueError):
+            create_agent("gpt", fallback=None)
@@ -0,0 +1,138 @@
+"""
+AI clue service tests
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from codenames.game.game import CodenamesGame
+from codenames.gpt.scheduler import Priority
+from codenames.model import CodenamesConnection, Role, User
+from codenames.services import clue_service
+from codenames.services.clue_service import ClueService, speculation_metrics
+from codenames.wire_format import JSON
+
+
+class FakeAgent:
+    """Agent that answers after a short delay and counts its calls"""
+    def __init__(self):
+        self.clue_calls = 0
+
+    async def provide_clue(self, user, tiles):
+        self.clue_calls += 1
+        await asyncio.sleep(0.01)
+        return "SPECULATED", 1
+
+    async def make_guesses(self, word, number, tiles):
+        return []
+
+
+class FailingAgent(FakeAgent):
+    """Agent whose clues always fail"""
+    async def provide_clue(self, user, tiles):
+        self.clue_calls += 1
+        raise RuntimeError("model unavailable")
+
+
+class StreamingAgent(FakeAgent):
+    """Streams fixed guesses and records when its stream is closed"""
+    def __init__(self, words):
+        super().__init__()
+        self.words = words
+        self.closed = False
+
+    async def stream_guesses(self, word, number, tiles):
+        try:
+            for guess in self.words:
+                yield guess
+        finally:
+            self.closed = True
+
+
+def create_game(agent: FakeAgent) -> CodenamesGame:
+    users = []
+    for team, is_spy_master, is_human in [("red", True, True), ("red", False, True), ("blue", True, False), ("blue", False, True)]:
+        connection = MagicMock(spec=CodenamesConnection)
+        connection.uuid = f"{team}-{is_spy_master}"
+        connection.send_encoded = AsyncMock()
+        connection.wire_format = JSON
+        user = User(connection, is_human)
+        user.team, user.is_spy_master = team, is_spy_master
+        users.append(user)
+    return CodenamesGame(users, seed=3, clue_service=ClueService(agent))  # type: ignore[arg-type]
+
+
+class TestClueSpeculation:
+    """The next AI spymaster works on its clue while the other team guesses"""
+
+    @pytest.mark.asyncio
+    async def test_speculated_clue_used_when_turn_flips(self):
+        agent = FakeAgent()
+        game = create_game(agent)
+        hits = speculation_metrics.hits
+        await game.provide_clue(game.users[0], "first", 2)
+        speculation = game.clue_service._speculation
+        assert speculation is not None and speculation.requests.priority is Priority.BACKGROUND
+        await asyncio.sleep(0.02)
+        await game.pass_turn(game.users[1])
+        await asyncio.sleep(0.01)
+        assert agent.clue_calls == 1
+        assert speculation_metrics.hits == hits + 1
+        # Taken up with a human in the game, so anything it still had queued went interactive
+        assert speculation.requests.priority is Priority.INTERACTIVE
+        assert game.clue == ("SPECULATED", 1)
+
+    @pytest.mark.asyncio
+    async def test_reveal_of_spymasters_word_restarts_speculation(self):
+        agent = FakeAgent()
+        game = create_game(agent)
+        await game.provide_clue(game.users[0], "first", 2)
+        red_tile = next(tile for tile in game.tiles if tile.team == "red")
+        await game.guess_tile(game.users[1], red_tile)
+        assert agent.clue_calls == 1
+        blue_tile = next(tile for tile in game.tiles if tile.team == "blue")
+        invalidated = speculation_metrics.invalidated
+        game.reveal_tile(blue_tile)
+        game._speculate_next_clue()
+        await asyncio.sleep(0)
+        assert speculation_metrics.invalidated == invalidated + 1
+        assert agent.clue_calls == 2
+        cancelled = speculation_metrics.cancelled
+        game.close()
+        assert speculation_metrics.cancelled == cancelled + 1
+
+    @pytest.mark.asyncio
+    async def test_failed_clue_hands_the_turn_over(self):
+        agent = FailingAgent()
+        game = create_game(agent)
+        game.current_turn = Role.BLUE_SPYMASTER
+        await game.clue_service.create_clue(game, game.users[2])
+        assert agent.clue_calls == 1
+        assert game.current_turn is Role.BLUE_OPERATIVE
+        assert game.clue is not None and game.clue[0] not in {tile.word.upper() for tile in game.tiles}
+        game.close()
+
+
+class TestAIGuessing:
+    """AI guesses are played with a delay that does not hold up the agent"""
+
+    @pytest.mark.asyncio
+    async def test_stream_closed_before_delayed_guesses_are_played(self, monkeypatch):
+        monkeypatch.setattr(clue_service, "GUESS_DELAY", 0.01)
+        agent = StreamingAgent([])
+        game = create_game(agent)
+        agent.words = [tile.word for tile in game.tiles if tile.team == "red"][:2]
+        await game.provide_clue(game.users[0], "first", 2)
+        played = []
+        guess_tile = CodenamesGame.guess_tile
+
+        async def record_guess(self, user, tile):
+            played.append((tile.word, agent.closed))
+            await guess_tile(self, user, tile)
+
+        monkeypatch.setattr(CodenamesGame, "guess_tile", record_guess)
+        await game.clue_service.make_guesses("first", 2, game, game.users[1])
+        assert played == [(word, True) for word in agent.words]
+        # Let the blue spymaster's clue, started by the turn passing, finish
+        await asyncio.sleep(0.02)
+        game.close()
@@ -55,6 +55,7 @@ class TestCoreFunctionalityAndBufferingFixes:
     async def test_message_routing_and_lobby_handlers(self):
         """Test essential message routing functionality"""
         mock_lobby_service = AsyncMock()
+        mock_lobby_service.unsubscribe_lobbies = MagicMock()
         router = MessageRouter(mock_lobby_service)
         
         # Test ID request
@@ -180,6 +181,34 @@ class TestCoreFunctionalityAndBufferingFixes:
             assert duration < 1.0, f"AI chain took too long ({duration:.2f}s), may still be blocking"
             print("✅ AI chain reaction fix verified - non-blocking execution")
 
+    @pytest.mark.asyncio
+    async def test_ready_toggle_does_not_restart_a_running_game(self):
+        """Preference updates during a game leave it running, a finished game is closed before the rematch"""
+        service = LobbyService(InMemoryLobbyRepository())
+        router = MessageRouter(service)
+        users = []
+        for team, is_spy in [("red", True), ("red", False), ("blue", True), ("blue", False)]:
+            user = User(create_mock_connection(), True)
+            user.name, user.team, user.is_spy_master = f"{team} {is_spy}", team, is_spy
+            users.append(user)
+        lobby = await service.create_lobby(users[0], "Rematch Test")
+        for user in users[1:]:
+            await service.join_lobby(user, str(lobby.id))
+        contexts = [UserContext(user, f"connection-{i}") for i, user in enumerate(users)]
+        for context in contexts:
+            context.join_lobby(str(lobby.id))
+            await router.route_message(context, "preferencesRequest", {"player": {"ready": True}})
+        game = lobby.game
+        assert game is not None and game._counted_active
+
+        await router.route_message(contexts[0], "preferencesRequest", {"player": {"name": "renamed", "ready": True}})
+        assert lobby.game is game and game._counted_active
+
+        game.remaining["red"] = 0
+        await router.route_message(contexts[0], "preferencesRequest", {"player": {"ready": True}})
+        assert lobby.game is not game and not game._counted_active
+        lobby.close()
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
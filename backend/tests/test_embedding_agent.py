@@ -0,0 +1,61 @@
+"""
+Offline embedding agent tests
+"""
+import numpy as np
+import pytest
+
+from codenames.gpt import embedding_agent
+from codenames.gpt.agent import HeuristicAgent, available_agents, create_agent
+from codenames.gpt.embedding_agent import EmbeddingAgent, WordVectors
+from codenames.model import Tile, User
+
+
+@pytest.fixture
+def vectors(tmp_path) -> WordVectors:
+    """Tiny hand made space: an ocean cluster, a space cluster and a bomb"""
+    words = {
+        "sea": [1.0, 0.0, 0.0], "whale": [0.9, 0.1, 0.0], "wave": [0.95, 0.0, 0.05], "beach": [0.85, 0.0, 0.1],
+        "star": [0.0, 1.0, 0.0], "moon": [0.1, 0.9, 0.0], "planet": [0.0, 0.95, 0.1],
+        "bomb": [0.0, 0.0, 1.0], "ocean": [0.97, 0.02, 0.0], "galaxy": [0.02, 0.97, 0.0],
+    }
+    matrix = np.asarray(list(words.values()), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.save(tmp_path / "vectors.npy", matrix)
+    (tmp_path / "vocab.txt").write_text("\n".join(words) + "\n")
+    return WordVectors(tmp_path, 100)
+
+
+class TestEmbeddingAgent:
+    """Clues and guesses come from local vectors without any network access"""
+
+    def test_registered(self):
+        assert {"gpt", "embedding"} <= set(available_agents())
+        with pytest.raises(ValueError):
+            create_agent("not-an-agent")
+
+    @pytest.mark.asyncio
+    async def test_clue_links_team_words_and_avoids_board_words(self, vectors):
+        agent = EmbeddingAgent(vectors)
+        user = User(None, False)  # type: ignore[arg-type]
+        user.team = "red"
+        tiles = [Tile("whale", "red"), Tile("wave", "red"), Tile("star", "blue"), Tile("moon", "blue"), Tile("bomb", "assassin")]
+        clue, number = await agent.provide_clue(user, tiles)
+        assert clue in {"SEA", "OCEAN", "BEACH"}
+        assert number == 2
+
+    def test_missing_vector_files_fall_back(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(embedding_agent, "load_word_vectors", lambda: WordVectors(tmp_path / "missing", 100))
+        assert isinstance(create_agent("embedding", fallback="heuristic"), HeuristicAgent)
+        with pytest.raises(FileNotFoundError):
+            create_agent("embedding", fallback=None)
+
+    def test_no_clue_when_every_candidate_is_on_the_board(self, vectors):
+        agent = EmbeddingAgent(vectors)
+        assert agent.choose_clue(["sea", "whale", "wave", "beach", "ocean"], ["star", "moon", "planet", "galaxy"], ["bomb"]) == ("", 0)
+
+    @pytest.mark.asyncio
+    async def test_guesses_ranked_by_similarity(self, vectors):
+        agent = EmbeddingAgent(vectors)
+        tiles = [Tile("whale", "red"), Tile("planet", "blue"), Tile("moon", "blue", True), Tile("star", "blue")]
+        assert await agent.make_guesses("galaxy", 2, tiles) == ["star", "planet"]
+        assert await agent.make_guesses("unknownword", 2, tiles) == []
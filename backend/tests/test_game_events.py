@@ -0,0 +1,86 @@
+"""
+Game event log tests: every accepted move is recorded, written out in batches and replays to the same game
+"""
+import asyncio
+
+import pytest
+
+from codenames.game.events import ClueGiven, GameEventWriter, TileGuessed, TurnPassed, read_event_log, replay
+from codenames.game.factory import GameFactory
+from codenames.model import DetachedConnection, Role, User
+
+
+def _humans():
+    users = []
+    for role in Role.all_roles():
+        user = User(DetachedConnection(role.name), True)
+        user.team, user.is_spy_master = role.value
+        user.name = role.name.lower()
+        users.append(user)
+    return users
+
+
+def _red_word(game, taken=()):
+    return next(tile.word for tile in game.tiles if tile.team == "red" and not tile.revealed and tile.word not in taken)
+
+
+class TestGameEvents:
+    """Moves are logged once they are accepted"""
+
+    @pytest.mark.asyncio
+    async def test_only_accepted_moves_are_logged(self):
+        game = GameFactory.create_game(_humans(), {role.index: role.name for role in Role.all_roles()})
+        red_spymaster, blue_spymaster, red_guesser, blue_guesser = (game.get_user_for_role(role) for role in Role.all_roles())
+        assert game.seed is not None, "Every game is dealt from a seed"
+
+        await game.provide_clue(blue_spymaster, "early", 1)
+        await game.provide_clue(red_spymaster, "fruit", 2)
+        await game.guess_tile(red_guesser, game.get_tile(_red_word(game)))
+        await game.pass_turn(blue_guesser)
+        await game.pass_turn(red_guesser)
+
+        events = game.events.events
+        assert [type(event) for event in events] == [ClueGiven, TileGuessed, TurnPassed]
+        assert [event.seq for event in events] == [0, 1, 2]
+        assert events[0][2:] == (Role.RED_SPYMASTER.index, "fruit", 2)
+        assert events[2].role == Role.RED_OPERATIVE.index
+        assert game.to_record()["eventSeq"] == 3
+
+
+class TestReplay:
+    """A written log rebuilds the game it came from"""
+
+    @pytest.mark.asyncio
+    async def test_written_log_replays_to_the_same_state(self, tmp_path):
+        writer = GameEventWriter(str(tmp_path), flush_interval=0.01)
+        game = GameFactory.create_game(_humans(), {role.index: role.name for role in Role.all_roles()})
+        writer.track("recorded", game)
+        red_spymaster, red_guesser = game.get_user_for_role(Role.RED_SPYMASTER), game.get_user_for_role(Role.RED_OPERATIVE)
+
+        await game.provide_clue(red_spymaster, "fruit", 2)
+        first = _red_word(game)
+        await game.guess_tile(red_guesser, game.get_tile(first))
+        await asyncio.sleep(0.05)
+        await game.guess_tile(red_guesser, game.get_tile(_red_word(game, [first])))
+        game.close()
+        await writer.close()
+
+        header, events = read_event_log(writer.path_for("recorded"))
+        assert header["seed"] == game.seed and header["players"][Role.RED_OPERATIVE.index]["name"] == "red_operative"
+        assert events == game.events.events
+        replayed = await replay(header, events)
+        assert replayed.to_record()["tiles"] == game.to_record()["tiles"]
+        assert (replayed.current_turn, replayed.clue, replayed.remaining) == (game.current_turn, game.clue, game.remaining)
+        assert "recorded" not in writer._games, "Closed games are forgotten once written"
+
+    @pytest.mark.asyncio
+    async def test_log_from_another_board_is_rejected(self):
+        game = GameFactory.create_game(_humans(), {role.index: role.name for role in Role.all_roles()}, seed=1)
+        red_spymaster, red_guesser = game.get_user_for_role(Role.RED_SPYMASTER), game.get_user_for_role(Role.RED_OPERATIVE)
+        await game.provide_clue(red_spymaster, "fruit", 3)
+        for _ in range(3):
+            await game.guess_tile(red_guesser, game.get_tile(_red_word(game)))
+
+        header = {"seed": 2, "wordPack": "default", "players": [None] * 4}
+        with pytest.raises(ValueError):
+            await replay(header, game.events.events)
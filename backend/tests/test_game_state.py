@@ -0,0 +1,117 @@
+"""
+Game state tracking tests
+"""
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from codenames.game.game import CodenamesGame
+from codenames.metrics import games_active
+from codenames.model import CodenamesConnection, User
+from codenames.wire_format import JSON
+
+
+def create_users():
+    users = []
+    for team, is_spy_master in [("red", True), ("red", False), ("blue", True), ("blue", False), ("blue", False)]:
+        connection = MagicMock(spec=CodenamesConnection)
+        connection.uuid = f"{team}-{is_spy_master}"
+        connection.send_encoded = AsyncMock()
+        connection.wire_format = JSON
+        user = User(connection, True)
+        user.team, user.is_spy_master = team, is_spy_master
+        users.append(user)
+    return users
+
+
+class TestGameState:
+    """The board index and win tracking stay in sync with the tiles"""
+
+    def test_tile_lookup_ignores_case_and_spaces(self):
+        game = CodenamesGame([], seed=7)
+        tile = game.tiles[3]
+        assert game.get_tile(f" {tile.word.upper()} ") is tile
+        with pytest.raises(ValueError):
+            game.get_tile("definitely not on the board")
+
+    def test_remaining_counts_update_on_reveal(self):
+        game = CodenamesGame([], seed=7)
+        assert game.remaining == {"red": 9, "blue": 8, "neutral": 7, "assassin": 1}
+        red_tiles = [tile for tile in game.tiles if tile.team == "red"]
+        game.reveal_tile(red_tiles[0])
+        game.reveal_tile(red_tiles[0])
+        assert game.remaining["red"] == 8
+        assert game.check_win() is None
+        for tile in red_tiles:
+            game.reveal_tile(tile)
+        assert game.check_win() == "red"
+
+    def test_assassin_ends_game(self):
+        game = CodenamesGame([], seed=7)
+        game.reveal_tile(next(tile for tile in game.tiles if tile.team == "assassin"))
+        assert game.assassin_revealed
+        assert game.check_win() == game.current_turn.team
+
+    @pytest.mark.asyncio
+    async def test_broadcast_serialises_each_view_once(self):
+        game = CodenamesGame(create_users(), seed=7)
+        await game.broadcast_state_update(False)
+        payloads = [user.connection.send_encoded.call_args.args[0] for user in game.users]
+        assert payloads[0] is payloads[2]
+        assert payloads[1] is payloads[3] is payloads[4]
+        assert "unknown" not in json.loads(payloads[0])["tiles"][0]["team"]
+
+    @pytest.mark.asyncio
+    async def test_mutation_invalidates_cached_views(self):
+        users = create_users()
+        game = CodenamesGame(users, seed=7)
+        before = game.encode_state_update(False, False)
+        await game.provide_clue(users[0], "clue", 2)
+        after = game.encode_state_update(False, False)
+        assert before != after
+        assert json.loads(after)["clue"] == {"word": "CLUE", "number": 2}
+
+    def test_player_changes_invalidate_cached_views(self):
+        users = create_users()
+        game = CodenamesGame(users, seed=7)
+        version = game.state_version
+        assert json.loads(game.encode_state_update(False, False))["players"][1]["ready"] is False
+        users[1].is_ready = True
+        game.players_changed()
+        assert json.loads(game.encode_state_update(False, False))["players"][1]["ready"] is True
+        assert game.state_version == version
+
+    @pytest.mark.asyncio
+    async def test_won_game_stops_counting_as_active(self):
+        users = create_users()
+        game = CodenamesGame(users, seed=7)
+        active = games_active.value()
+        game.count_as_active()
+        assert games_active.value() == active + 1
+        await game.provide_clue(users[0], "oops", 1)
+        await game.guess_tile(users[1], next(tile for tile in game.tiles if tile.team == "assassin"))
+        assert game.check_win() and games_active.value() == active
+        game.close()
+        assert games_active.value() == active
+
+    @pytest.mark.asyncio
+    async def test_delta_subscribers_get_small_versioned_patches(self):
+        users = create_users()
+        delta_user, legacy_user = users[1], users[3]
+        delta_user.accepts_deltas = True
+        game = CodenamesGame(users, seed=7)
+        await game.provide_clue(users[0], "clue", 2)
+        red_tile = next(tile for tile in game.tiles if tile.team == "red")
+        await game.guess_tile(delta_user, red_tile)
+
+        first, second = [json.loads(call.args[0]) for call in delta_user.connection.send_encoded.call_args_list]
+        assert first["serverMessageType"] == "stateDelta"
+        assert second["baseVersion"] == first["version"]
+        assert second["version"] == second["baseVersion"] + 1
+        assert second["changes"][0] == {"type": "tileRevealed", "index": game.tiles.index(red_tile), "team": "red"}
+        assert {"type": "turnChanged", "onTurnRole": game.current_turn.index, "guessesRemaining": 1} in second["changes"]
+
+        snapshot = legacy_user.connection.send_encoded.call_args.args[0]
+        delta = delta_user.connection.send_encoded.call_args.args[0]
+        assert json.loads(snapshot)["serverMessageType"] == "stateUpdate"
+        assert len(delta) * 8 < len(snapshot)
@@ -0,0 +1,61 @@
+"""
+Load test tooling: the fake OpenAI endpoint and the simulated player swarm
+"""
+import contextlib
+from typing import AsyncIterator, Tuple
+
+import openai
+import pytest
+import websockets
+
+from codenames.gpt.chat_gpt import ChatGPT
+from codenames.websocket_server import create_server
+from loadtest.fake_openai import FakeOpenAI
+from loadtest.swarm import run_swarm
+
+BOARD = ["apple", "bear", "cloud", "drum", "eagle"]
+
+
+@contextlib.asynccontextmanager
+async def fake_llm() -> AsyncIterator[Tuple[FakeOpenAI, openai.AsyncOpenAI]]:
+    fake = FakeOpenAI(latency_median=0.001, chunk_delay=0, seed=1)
+    client = openai.AsyncOpenAI(api_key="test", base_url=await fake.start(), max_retries=0)
+    try:
+        yield fake, client
+    finally:
+        await client.close()
+        await fake.stop()
+
+
+class TestLoadTest:
+    """The fake endpoint speaks the OpenAI protocol and the swarm plays whole games"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("stream", [False, True])
+    async def test_fake_endpoint_answers_prompts(self, stream):
+        async with fake_llm() as (fake, client):
+            chat_gpt = ChatGPT(client=client, stream=stream)
+            clue, number = await chat_gpt.get_clue(BOARD[:3], BOARD[3:])
+            assert clue.startswith("LOADTEST") and 1 <= number <= 3
+            guesses = await chat_gpt.guess(("fruit", 2), BOARD)
+            assert len(guesses) == 2 and set(guesses) <= set(BOARD)
+            assert fake.stats() == {"requests": 2, "errors": 0}
+
+    @pytest.mark.asyncio
+    async def test_fake_endpoint_injects_errors(self):
+        async with fake_llm() as (fake, client):
+            fake.error_rate = 1.0
+            with pytest.raises((openai.InternalServerError, openai.RateLimitError)):
+                await client.chat.completions.create(model="fake", messages=[{"role": "user", "content": "hi"}])
+            assert fake.errors == 1
+
+    @pytest.mark.asyncio
+    async def test_swarm_plays_full_games(self):
+        server = await create_server()
+        async with websockets.serve(server.handle_connection, "127.0.0.1", 0) as websocket_server:
+            port = websocket_server.sockets[0].getsockname()[1]
+            metrics = await run_swarm(f"ws://127.0.0.1:{port}", lobbies=2, players=4, seed=3, timeout=10)
+        stats = metrics.stats()
+        assert stats["gamesCompleted"] == 2 and stats["gamesFailed"] == 0
+        assert {"idRequest", "createLobby", "joinLobby", "preferencesRequest", "provideClue", "guessTile"} <= set(stats["messageLatency"])
+        assert stats["fanOut"]["count"] >= stats["messageLatency"]["guessTile"]["count"]
@@ -0,0 +1,119 @@
+"""
+Joinable lobby index tests: paging, name prefixes and batched lobbiesUpdate diffs for subscribers
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from codenames.model import CodenamesConnection, User
+from codenames.services.lobby_index import LobbyIndex
+from codenames.services.lobby_service import InMemoryLobbyRepository, LobbyService
+from codenames.wire_format import MSGPACK, Payload, WireFormat
+
+
+class _Connection(CodenamesConnection):
+    def __init__(self, wire_format: Optional[WireFormat] = None):
+        super().__init__()
+        if wire_format is not None:
+            self.wire_format = wire_format
+        self.payloads: List[Payload] = []
+        self.received: List[Dict[str, Any]] = []
+
+    async def send(self, message: dict):
+        self.received.append(message)
+
+    async def send_encoded(self, payload: Payload, message_type: str = ""):
+        self.payloads.append(payload)
+        self.received.append(self.wire_format.decode(payload))
+
+
+def _summary(lobby_id: str, name: str, players: int = 1, game: bool = False) -> Dict[str, Any]:
+    return {"id": lobby_id, "name": name, "players": players, "game": game, "wordPack": "default"}
+
+
+class TestLobbyIndex:
+    """Only joinable lobbies are indexed, sorted by name"""
+
+    def test_pages_and_prefixes(self):
+        index = LobbyIndex()
+        for i in range(25):
+            index.update(_summary(f"id-{i:02}", f"Lobby {i:02}"))
+        index.update(_summary("other", "other game"))
+        index.update(_summary("full", "Lobby full", players=4))
+
+        first, cursor = index.query("lobby", limit=10)
+        assert [summary["id"] for summary in first] == [f"id-{i:02}" for i in range(10)]
+        second, cursor = index.query("lobby", cursor, limit=10)
+        third, cursor = index.query("lobby", cursor, limit=10)
+        assert [summary["id"] for summary in second + third] == [f"id-{i:02}" for i in range(10, 25)]
+        assert cursor is None
+        assert [summary["id"] for summary in index.query("OTHER")[0]] == ["other"]
+
+        index.update(_summary("id-03", "Lobby 03", game=True))
+        index.remove("id-04")
+        assert len(index) == 24
+        assert [summary["id"] for summary in index.query("lobby 0")[0]] == ["id-00", "id-01", "id-02", "id-05", "id-06", "id-07", "id-08", "id-09"]
+
+    def test_sync_drops_lobbies_missing_from_the_listing(self):
+        index = LobbyIndex()
+        index.update(_summary("a", "A"))
+        index.update(_summary("b", "B"))
+        index.sync([_summary("b", "B", players=2), _summary("c", "C")])
+        assert index.query()[0] == [_summary("b", "B", players=2), _summary("c", "C")]
+
+    @pytest.mark.asyncio
+    async def test_subscribers_get_one_batched_diff(self):
+        index = LobbyIndex(interval=0.02)
+        everyone, prefixed = _Connection(), _Connection()
+        index.update(_summary("a", "alpha"))
+        index.subscribe("1", everyone)
+        index.subscribe("2", prefixed, "B")
+        index.update(_summary("b", "beta"))
+        index.update(_summary("b", "beta", players=2))
+        index.update(_summary("a", "alpha", game=True))
+        index.update(_summary("c", "carrot"))
+        assert everyone.received == []
+
+        await asyncio.sleep(0.05)
+        [update] = everyone.received
+        assert update["serverMessageType"] == "lobbiesUpdate" and update["diff"]
+        assert update["lobbies"] == [_summary("b", "beta", players=2), _summary("c", "carrot")]
+        assert update["removed"] == ["a"]
+        assert prefixed.received == [{**update, "lobbies": [_summary("b", "beta", players=2)], "removed": []}]
+
+        index.unsubscribe("1")
+        index.remove("b")
+        await asyncio.sleep(0.05)
+        assert len(everyone.received) == 1 and prefixed.received[-1]["removed"] == ["b"]
+        index.close()
+
+    @pytest.mark.asyncio
+    async def test_diff_sent_in_each_subscriber_wire_format(self):
+        if MSGPACK is None:
+            pytest.skip("msgpack is not installed")
+        index = LobbyIndex(interval=0.01)
+        packed, as_json, also_json = _Connection(MSGPACK), _Connection(), _Connection()
+        for connection_id, connection in enumerate([packed, as_json, also_json]):
+            index.subscribe(str(connection_id), connection)
+        index.update(_summary("a", "alpha"))
+        await asyncio.sleep(0.03)
+        assert isinstance(packed.payloads[0], bytes) and isinstance(as_json.payloads[0], str)
+        assert packed.received == as_json.received and as_json.received[0]["lobbies"] == [_summary("a", "alpha")]
+        assert as_json.payloads[0] is also_json.payloads[0]
+        index.close()
+
+    @pytest.mark.asyncio
+    async def test_service_keeps_the_index_current(self):
+        service = LobbyService(InMemoryLobbyRepository(), index=LobbyIndex(interval=0.01))
+        browser = _Connection()
+        await service.subscribe_lobbies("browser", browser)
+        owner = User(_Connection(), True)
+        lobby = await service.create_lobby(owner, "fresh")
+        assert (await service.get_available_lobby_summaries())[0] == [lobby.to_json()]
+
+        await service.leave_lobby(owner, str(lobby.id))
+        assert (await service.get_available_lobby_summaries())[0] == []
+        await asyncio.sleep(0.03)
+        assert [update["removed"] for update in browser.received] == [[str(lobby.id)]]
+        service.close()
@@ -0,0 +1,108 @@
+"""
+Durable lobby repository tests: batched writes and recovering games after a restart
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from codenames.model import CodenamesConnection, DetachedConnection, Role, User
+from codenames.services.lobby_service import LobbyService
+from codenames.services.sqlite_lobby_repository import SqliteLobbyRepository
+
+
+class _Connection(CodenamesConnection):
+    async def send(self, message: dict):
+        return
+
+    async def send_encoded(self, payload: str, message_type: str = ""):
+        return
+
+
+async def _start_game(service: LobbyService):
+    """A lobby with a human in every role, so no AI player starts work of its own"""
+    users = []
+    for role in Role.all_roles():
+        user = User(_Connection(), True)
+        user.name, user.team, user.is_spy_master, user.is_ready = role.name, role.team, role.is_spymaster, True
+        users.append(user)
+    lobby = await service.create_lobby(users[0], "durable")
+    for user in users[1:]:
+        await service.join_lobby(user, str(lobby.id))
+    lobby.seed = 5
+    await lobby.start_game()
+    await service.save_lobby(lobby)
+    return lobby, users
+
+
+class TestSqliteLobbyRepository:
+    """Lobbies are written behind in batches and come back after a restart"""
+
+    @pytest.mark.asyncio
+    async def test_changes_are_coalesced_into_one_write(self, tmp_path):
+        repository = SqliteLobbyRepository(str(tmp_path / "lobbies.sqlite"), flush_interval=0.05)
+        writes = []
+        write = repository._write
+        repository._write = lambda rows, deleted: (writes.append(len(rows)), write(rows, deleted))  # type: ignore[method-assign]
+        service = LobbyService(repository)
+        lobby, users = await _start_game(service)
+        game = lobby.game
+        await game.provide_clue(users[0], "fruit", 2)
+        await game.guess_tile(users[2], next(tile for tile in game.tiles if tile.team == "red"))
+        assert writes == []
+
+        await asyncio.sleep(0.1)
+        assert writes == [1]
+        await repository.close()
+        record = sqlite3.connect(tmp_path / "lobbies.sqlite").execute("SELECT record FROM lobbies").fetchone()[0]
+        assert '"clue":["fruit",2]' in record
+
+    @pytest.mark.asyncio
+    async def test_recovered_game_resumes_where_it_stopped(self, tmp_path):
+        path = str(tmp_path / "lobbies.sqlite")
+        repository = SqliteLobbyRepository(path, flush_interval=0.01)
+        lobby, users = await _start_game(LobbyService(repository))
+        game = lobby.game
+        await game.provide_clue(users[0], "fruit", 2)
+        await game.guess_tile(users[2], next(tile for tile in game.tiles if tile.team == "red"))
+        await repository.close()
+
+        restarted = SqliteLobbyRepository(path)
+        service = LobbyService(restarted)
+        [recovered] = await service.recover_lobbies(resume_seconds=60)
+        [drop] = service._unclaimed_drops
+        assert recovered.id == lobby.id and recovered.game is not None
+        assert [tile.to_json(True) for tile in recovered.game.tiles] == [tile.to_json(True) for tile in game.tiles]
+        assert (recovered.game.current_turn, recovered.game.guesses_remaining, recovered.game.clue) == (game.current_turn, 1, ("fruit", 2))
+        assert recovered.game.remaining == game.remaining
+        assert all(isinstance(user.connection, DetachedConnection) for user in recovered.users)
+        # Restored and live players' ids are the same type, so they compare equal without str()
+        assert [user.connection.uuid for user in recovered.users] == [user.connection.uuid for user in lobby.users]
+
+        guesser_id = str(users[2].connection.uuid)
+        reconnected = User(_Connection(), True)
+        seat = await service.rejoin_lobby(reconnected, str(lobby.id), guesser_id)
+        assert seat is recovered.game.get_on_turn_user()
+        assert seat.connection is reconnected.connection and str(seat.connection.uuid) == guesser_id
+        assert await service.rejoin_lobby(User(_Connection(), True), str(lobby.id), guesser_id) is None
+        service.close()
+        await asyncio.sleep(0)
+        assert drop.cancelled()
+        await restarted.close()
+
+    @pytest.mark.asyncio
+    async def test_finished_and_deleted_lobbies_are_not_recovered(self, tmp_path):
+        path = str(tmp_path / "lobbies.sqlite")
+        repository = SqliteLobbyRepository(path, flush_interval=0.01)
+        service = LobbyService(repository)
+        finished, users = await _start_game(service)
+        await finished.game.provide_clue(users[0], "oops", 1)
+        await finished.game.guess_tile(users[2], next(tile for tile in finished.game.tiles if tile.team == "assassin"))
+        abandoned = await service.create_lobby(User(_Connection(), True), "abandoned")
+        await service.leave_lobby(abandoned.users[0], str(abandoned.id))
+        await repository.close()
+
+        restarted = SqliteLobbyRepository(path)
+        assert await restarted.recover() == []
+        await restarted.close()
+        assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM lobbies").fetchone()[0] == 0
@@ -0,0 +1,73 @@
+"""
+Metrics registry and /metrics endpoint tests
+"""
+import asyncio
+
+import pytest
+import websockets
+
+from codenames.game.factory import GameFactory
+from codenames.message_router.message_router import MessageRouter, UserContext
+from codenames.metrics import MetricsRegistry, broadcast_seconds, connections_active, handler_seconds
+from codenames.model import User
+from codenames.services.lobby_service import InMemoryLobbyRepository, LobbyService
+from codenames.websocket_server import create_server
+
+
+class TestMetrics:
+    """Counters, gauges and histograms render in the Prometheus text format and are served over HTTP"""
+
+    def test_prometheus_text_format(self):
+        metrics = MetricsRegistry()
+        requests = metrics.counter("requests", "Requests")
+        open_connections = metrics.gauge("open", "Open")
+        latency = metrics.histogram("latency_seconds", "Latency", (0.1, 1.0))
+        requests.inc(kind='a"b')
+        requests.inc(2, kind='a"b')
+        open_connections.inc()
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+        metrics.register_stats("scheduler", lambda: {"inFlight": 3, "state": "open", "byPriority": {"interactive": 1}, "name": None})
+        text = metrics.render()
+        assert "# TYPE codenames_requests_total counter" in text
+        assert 'codenames_requests_total{kind="a\\"b"} 3' in text
+        assert "codenames_open 1" in text
+        assert 'codenames_latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'codenames_latency_seconds_bucket{le="1"} 2' in text
+        assert 'codenames_latency_seconds_bucket{le="+Inf"} 3' in text
+        assert "codenames_latency_seconds_count 3" in text
+        assert "codenames_scheduler_in_flight 3" in text
+        assert 'codenames_scheduler_state{state="open"} 1' in text
+        assert 'codenames_scheduler_by_priority{by_priority="interactive"} 1' in text
+        assert "codenames_scheduler_name" not in text
+
+    @pytest.mark.asyncio
+    async def test_handlers_and_broadcasts_are_timed(self):
+        router = MessageRouter(LobbyService(InMemoryLobbyRepository()))
+        before = handler_seconds.count(message_type="idRequest")
+        await router.route_message(UserContext(User(None, True), "test"), "idRequest", {})  # type: ignore[arg-type]
+        assert handler_seconds.count(message_type="idRequest") == before + 1
+
+        game = GameFactory.create_game([], {})
+        before = broadcast_seconds.count()
+        await game.broadcast_state_update(False)
+        assert broadcast_seconds.count() == before + 1
+
+    @pytest.mark.asyncio
+    async def test_metrics_served_on_websocket_port(self):
+        server = await create_server()
+        async with websockets.serve(server.handle_connection, "127.0.0.1", 0, process_request=server.process_request) as websocket_server:
+            port = websocket_server.sockets[0].getsockname()[1]
+            before = connections_active.value()
+            async with websockets.connect(f"ws://127.0.0.1:{port}"):
+                await asyncio.sleep(0.05)
+                assert connections_active.value() == before + 1
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                response = await reader.read()
+                writer.close()
+        assert response.startswith(b"HTTP/1.1 200")
+        assert b"# TYPE codenames_connections_active gauge" in response
+        assert b"codenames_llm_scheduler_queue_depth" in response
+        assert await server.process_request("/", {}) is None
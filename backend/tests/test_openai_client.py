@@ -0,0 +1,38 @@
+"""
+Shared OpenAI client tests
+"""
+import pytest
+
+from codenames.game.factory import GameFactory
+from codenames.gpt import client
+from codenames.gpt.agent import GPTAgent
+from codenames.gpt.circuit_breaker import BreakerAgent
+from codenames.gpt.client import close_openai_client, get_openai_client
+
+
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+    monkeypatch.setattr(client, "OPEN_AI_KEY", "test-key")
+
+
+class TestSharedOpenAIClient:
+    """Every game's agent reuses one client and connection pool"""
+
+    @pytest.mark.asyncio
+    async def test_games_share_one_pool(self):
+        games = [GameFactory.create_game([], {}) for _ in range(5)]
+        breaker_agents = [game.clue_service.agent for game in games]
+        assert all(isinstance(agent, BreakerAgent) for agent in breaker_agents)
+        agents = [agent.primary for agent in breaker_agents]  # type: ignore[attr-defined]
+        assert all(isinstance(agent, GPTAgent) for agent in agents)
+        clients = {id(agent.chat_gpt.client) for agent in agents}  # type: ignore[attr-defined]
+        pools = {id(agent.chat_gpt.client._client) for agent in agents}  # type: ignore[attr-defined]
+        assert clients == {id(get_openai_client())}
+        assert len(pools) == 1
+
+    @pytest.mark.asyncio
+    async def test_close_releases_client(self):
+        client = get_openai_client()
+        await close_openai_client()
+        assert client.is_closed()
+        assert get_openai_client() is not client
@@ -0,0 +1,93 @@
+"""
+LLM call deadline, retry and hedging tests
+"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from codenames.gpt import chat_gpt, resilience
+from codenames.gpt.chat_gpt import ChatGPT
+from codenames.gpt.resilience import LatencyTracker, resilience_metrics, resilient_call, turn_budget
+from codenames.gpt.scheduler import LLMScheduler
+
+
+class TestResilientCall:
+    """Slow or failing upstream calls are bounded in time"""
+
+    @pytest.mark.asyncio
+    async def test_slow_attempt_times_out_and_is_retried(self):
+        calls = []
+
+        async def call():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                await asyncio.sleep(10)
+            return "answer"
+
+        assert await resilient_call(call, timeout=0.05, max_retries=2, hedge=False) == "answer"
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_turn_budget_bounds_total_time(self):
+        async def call():
+            await asyncio.sleep(10)
+
+        start = asyncio.get_running_loop().time()
+        with turn_budget(0.3), pytest.raises(asyncio.TimeoutError):
+            await resilient_call(call, timeout=0.05, max_retries=100, hedge=False)
+            # A second call in the same turn gets what is left of the budget, not a fresh one
+            await resilient_call(call, timeout=0.05, max_retries=100, hedge=False)
+        assert asyncio.get_running_loop().time() - start < 1
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_error_raised_immediately(self):
+        calls = []
+
+        async def call():
+            calls.append(1)
+            raise KeyError("bad request")
+
+        with pytest.raises(KeyError):
+            await resilient_call(call, timeout=1, max_retries=3, hedge=False)
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_hedged_request_wins_over_slow_first_attempt(self):
+        latency = LatencyTracker()
+        for _ in range(50):
+            latency.record(0.01)
+        calls = []
+
+        async def call():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(10)
+            return len(calls)
+
+        hedges_won = resilience_metrics.hedges_won
+        assert await resilient_call(call, timeout=1, max_retries=0, hedge=True, latency=latency) == 2
+        assert resilience_metrics.hedges_won == hedges_won + 1
+
+    @pytest.mark.asyncio
+    async def test_every_attempt_takes_its_own_scheduler_slot(self, monkeypatch):
+        scheduler = LLMScheduler(max_in_flight=1, requests_per_minute=60)
+        monkeypatch.setattr(chat_gpt, "llm_scheduler", scheduler)
+        monkeypatch.setattr(resilience, "BACKOFF_BASE", 0.01)
+        attempts = []
+
+        async def create(**kwargs):
+            attempts.append(scheduler.in_flight)
+            if len(attempts) == 1:
+                raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com"))
+            message = SimpleNamespace(content="OCEAN,2")
+            return SimpleNamespace(choices=[SimpleNamespace(finish_reason="stop", message=message)], usage=None)
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        gpt = ChatGPT(client=client, stream=False)  # type: ignore[arg-type]
+        assert await gpt.get_clue(["whale", "wave"], ["star"]) == ("OCEAN", 2)
+        # The retry queued for a slot and was charged a request of its own
+        assert attempts == [1, 1] and scheduler.completed == 2
+        assert scheduler.request_bucket.tokens < 59
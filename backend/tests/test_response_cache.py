@@ -0,0 +1,64 @@
+"""
+LLM response cache tests
+"""
+import sqlite3
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from codenames.gpt.chat_gpt import ChatGPT
+from codenames.gpt import client, response_cache
+from codenames.gpt.response_cache import ResponseCache
+
+
+class TestResponseCache:
+    """Identical AI requests are answered from the cache"""
+
+    def test_key_ignores_word_order_and_case(self):
+        first = ResponseCache.make_key("gpt-4o", "clue", ["Apple", "bear"], ["Car"])
+        second = ResponseCache.make_key("gpt-4o", "clue", ["bear", "apple"], ["car"])
+        assert first == second
+        assert first != ResponseCache.make_key("gpt-4o", "guess", ["bear", "apple"], ["car"])
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_and_ttl(self):
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        await cache.put("a", 1)
+        await cache.put("b", 2)
+        assert await cache.get("a") == 1
+        await cache.put("c", 3)
+        assert await cache.get("b") is None
+        assert await cache.get("a") == 1
+        with patch("codenames.gpt.response_cache.time.time", return_value=10**12):
+            assert await cache.get("a") is None
+        assert cache.stats()["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_sqlite_store_survives_restart(self, tmp_path):
+        path = str(tmp_path / "responses.sqlite")
+        cache = ResponseCache(path=path)
+        await cache.put("clue", ["SEA", 2])
+        cache.close()
+        assert await ResponseCache(path=path).get("clue") == ["SEA", 2]
+
+    @pytest.mark.asyncio
+    async def test_sqlite_store_capped_at_max_rows(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(response_cache, "PRUNE_EVERY", 2)
+        path = str(tmp_path / "responses.sqlite")
+        cache = ResponseCache(max_entries=1, path=path, max_rows=3)
+        for i in range(6):
+            with patch("codenames.gpt.response_cache.time.time", return_value=1000.0 + i):
+                await cache.put(f"answer{i}", i)
+        cache.close()
+        rows = sqlite3.connect(path).execute("SELECT key FROM responses ORDER BY created").fetchall()
+        assert rows == [("answer3",), ("answer4",), ("answer5",)]
+
+    @pytest.mark.asyncio
+    async def test_chat_gpt_uses_cache(self, monkeypatch):
+        monkeypatch.setattr(client, "OPEN_AI_KEY", "test-key")
+        chat_gpt = ChatGPT(ResponseCache())
+        with patch.object(chat_gpt, "_request_clue", AsyncMock(return_value=("SEA", 2))) as request_clue:
+            assert await chat_gpt.get_clue(["wave", "fish"], ["car"]) == ("SEA", 2)
+            assert await chat_gpt.get_clue(["fish", "wave"], ["car"]) == ("SEA", 2)
+        request_clue.assert_awaited_once()
+        assert chat_gpt.cache is not None and chat_gpt.cache.hits == 1
@@ -0,0 +1,89 @@
+"""
+LLM request scheduler tests
+"""
+import asyncio
+import pytest
+
+from codenames.gpt.scheduler import LLMScheduler, Priority, SchedulingContext, scheduling, use_scheduling
+
+
+async def request(scheduler: LLMScheduler, order: list, name: str, priority: Priority, key: str, hold: float = 0.0):
+    with scheduling(priority, key):
+        async with scheduler.slot():
+            order.append(name)
+            await asyncio.sleep(hold)
+
+
+class TestLLMScheduler:
+    """Requests are limited, prioritised and shared fairly between lobbies"""
+
+    @pytest.mark.asyncio
+    async def test_interactive_requests_jump_the_queue(self):
+        scheduler = LLMScheduler(max_in_flight=1)
+        order: list = []
+        first = asyncio.create_task(request(scheduler, order, "first", Priority.INTERACTIVE, "a", hold=0.01))
+        await asyncio.sleep(0)
+        background = asyncio.create_task(request(scheduler, order, "background", Priority.BACKGROUND, "b"))
+        interactive = asyncio.create_task(request(scheduler, order, "interactive", Priority.INTERACTIVE, "c"))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queueDepth"] == 2
+        await asyncio.gather(first, background, interactive)
+        assert order == ["first", "interactive", "background"]
+        assert scheduler.stats()["completed"] == 3
+
+    @pytest.mark.asyncio
+    async def test_lobbies_take_turns(self):
+        scheduler = LLMScheduler(max_in_flight=1)
+        order: list = []
+        blocker = asyncio.create_task(request(scheduler, order, "blocker", Priority.INTERACTIVE, "x", hold=0.01))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(request(scheduler, order, f"a{i}", Priority.INTERACTIVE, "a")) for i in range(3)]
+        tasks.append(asyncio.create_task(request(scheduler, order, "b0", Priority.INTERACTIVE, "b")))
+        await asyncio.gather(blocker, *tasks)
+        assert order == ["blocker", "a0", "b0", "a1", "a2"]
+
+    @pytest.mark.asyncio
+    async def test_request_rate_limit_delays_requests(self):
+        scheduler = LLMScheduler(max_in_flight=10, requests_per_minute=600)
+        scheduler.request_bucket.tokens = 0
+        order: list = []
+        start = asyncio.get_running_loop().time()
+        await request(scheduler, order, "limited", Priority.INTERACTIVE, "a")
+        assert asyncio.get_running_loop().time() - start >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = LLMScheduler(max_in_flight=1)
+        order: list = []
+        blocker = asyncio.create_task(request(scheduler, order, "blocker", Priority.INTERACTIVE, "a", hold=0.01))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(request(scheduler, order, "cancelled", Priority.INTERACTIVE, "b"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await blocker
+        assert scheduler.queue_depth == 0
+        assert scheduler.in_flight == 0
+        assert order == ["blocker"]
+
+    @pytest.mark.asyncio
+    async def test_raised_priority_moves_queued_and_later_requests(self):
+        scheduler = LLMScheduler(max_in_flight=1)
+        order: list = []
+        speculation = SchedulingContext(Priority.BACKGROUND, "a")
+
+        async def speculate(name: str):
+            with use_scheduling(speculation):
+                async with scheduler.slot():
+                    order.append(name)
+
+        blocker = asyncio.create_task(request(scheduler, order, "blocker", Priority.INTERACTIVE, "x", hold=0.01))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(speculate("speculation"))
+        await asyncio.sleep(0)
+        scheduler.raise_priority(speculation, Priority.INTERACTIVE)
+        retry = asyncio.create_task(speculate("retry"))
+        human = asyncio.create_task(request(scheduler, order, "human", Priority.INTERACTIVE, "b"))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queueDepthByPriority"] == {"interactive": 3, "background": 0}
+        await asyncio.gather(blocker, queued, retry, human)
+        assert order == ["blocker", "speculation", "human", "retry"]
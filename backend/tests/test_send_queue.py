@@ -0,0 +1,128 @@
+"""
+Outbound send queue tests: superseded state updates, slow consumers and broadcasts that never wait on a client
+"""
+import asyncio
+import json
+from typing import List
+
+import pytest
+
+from codenames.services.connection_service import OutboundQueue
+from codenames.websocket_server import WebSocketConnection, create_server
+
+
+class _Socket:
+    """A websocket whose writes complete only when the test lets them"""
+
+    def __init__(self):
+        self.sent: List[str] = []
+        self.gate = asyncio.Event()
+        self.closed = False
+
+    async def send(self, payload: str) -> None:
+        await self.gate.wait()
+        self.sent.append(payload)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class _ClientSocket(_Socket):
+    """Sends the server `messages` and then disconnects"""
+
+    def __init__(self, messages: List[str]):
+        super().__init__()
+        self.gate.set()
+        self.messages = messages
+
+    async def __aiter__(self):
+        for message in self.messages:
+            yield message
+            await asyncio.sleep(0)
+
+
+class TestOutboundQueue:
+    """Each connection drains its own queue, senders only append to it"""
+
+    @pytest.mark.asyncio
+    async def test_state_update_replaces_queued_updates_and_deltas(self):
+        socket = _Socket()
+        queue = OutboundQueue(socket.send, lambda: None)
+        queue.put("state 1", "stateUpdate")
+        queue.put("chat", "chat")
+        queue.put("delta 2", "stateDelta")
+        queue.put("state 2", "stateUpdate")
+        queue.put("error", "error")
+        queue.put("state 3", "stateUpdate")
+        queue.put("delta 4", "stateDelta")
+        socket.gate.set()
+        await asyncio.sleep(0.01)
+        assert socket.sent == ["chat", "error", "state 3", "delta 4"]
+
+    @pytest.mark.asyncio
+    async def test_consumer_over_high_water_is_reported_after_timeout(self):
+        overflows = []
+        queue = OutboundQueue(_Socket().send, lambda: overflows.append(True), max_size=100, high_water=2, high_water_seconds=0.05)
+        for i in range(4):
+            queue.put(f"message {i}")
+        assert overflows == []
+        await asyncio.sleep(0.06)
+        queue.put("late")
+        assert overflows == [True] and queue.closed and len(queue) == 0
+        queue.put("after close")
+        assert overflows == [True] and len(queue) == 0
+
+    @pytest.mark.asyncio
+    async def test_full_queue_is_reported_straight_away(self):
+        overflows = []
+        queue = OutboundQueue(_Socket().send, lambda: overflows.append(True), max_size=3, high_water=2, high_water_seconds=60)
+        for i in range(3):
+            queue.put(f"message {i}")
+        assert overflows == [True]
+
+    @pytest.mark.asyncio
+    async def test_failed_write_stops_the_queue(self):
+        async def fail(payload: str) -> None:
+            raise ConnectionError("gone")
+
+        queue = OutboundQueue(fail, lambda: None)
+        queue.put("message")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert queue.closed
+
+
+class TestWebSocketConnectionSending:
+    """A stalled client holds up nobody but itself"""
+
+    @pytest.mark.asyncio
+    async def test_broadcast_does_not_wait_on_a_stalled_client(self):
+        stalled, healthy = _Socket(), _Socket()
+        healthy.gate.set()
+        connections = [WebSocketConnection(stalled), WebSocketConnection(healthy)]
+        message = {"serverMessageType": "stateUpdate", "tiles": []}
+        await asyncio.wait_for(asyncio.gather(*(connection.send_message(message) for connection in connections)), 0.1)
+        await asyncio.sleep(0.01)
+        assert [json.loads(payload) for payload in healthy.sent] == [message]
+        assert stalled.sent == []
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_is_disconnected(self):
+        socket = _Socket()
+        connection = WebSocketConnection(socket)
+        connection.outbound.max_size = 5
+        for i in range(5):
+            await connection.send_raw(json.dumps({"serverMessageType": "chat", "n": i}), "chat")
+        # The close waits for the writer to stop first
+        await asyncio.sleep(0.01)
+        assert socket.closed and connection.outbound.closed
+
+    @pytest.mark.asyncio
+    async def test_disconnect_stops_the_writer(self):
+        server = await create_server()
+        for _ in range(5):
+            socket = _ClientSocket([json.dumps({"clientMessageType": "idRequest"})])
+            await server.handle_connection(socket, "/")  # type: ignore[arg-type]
+            assert [json.loads(payload)["serverMessageType"] for payload in socket.sent] == ["idAssign"]
+        writers = [task for task in asyncio.all_tasks() if task.get_coro().__qualname__ == "OutboundQueue._write_queued"]
+        assert writers == []
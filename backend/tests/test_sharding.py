@@ -0,0 +1,116 @@
+"""
+Multi-worker tests: lobby ownership, the shared lobby directory and proxying to the owning worker
+"""
+import asyncio
+import contextlib
+import json
+import random
+import socket
+from typing import Any, AsyncIterator, Dict
+
+import pytest
+import websockets
+
+from codenames.model import User
+from codenames.services.lobby_directory import InMemoryLobbyDirectory, SqliteLobbyDirectory
+from codenames.services.lobby_index import LobbyIndex
+from codenames.services.lobby_service import InMemoryLobbyRepository, LobbyService
+from codenames.sharding import Shard, owner_of
+from codenames.websocket_server import create_server
+from tests.test_core_functionality_and_buffering_fixes import create_mock_connection
+
+
+def _free_port_pair() -> int:
+    """A port whose successor is free too, for two workers' internal listeners"""
+    for _ in range(50):
+        base = random.randint(20000, 60000)
+        with contextlib.ExitStack() as stack:
+            try:
+                for port in (base, base + 1):
+                    sock = stack.enter_context(socket.socket())
+                    sock.bind(("127.0.0.1", port))
+            except OSError:
+                continue
+            return base
+    raise RuntimeError("No free ports")
+
+
+async def _receive(websocket, message_type: str) -> Dict[str, Any]:
+    while True:
+        message = json.loads(await websocket.recv())
+        if message["serverMessageType"] == message_type:
+            return message
+
+
+@contextlib.asynccontextmanager
+async def _worker(shard: Shard, directory) -> AsyncIterator[str]:
+    server = await create_server(shard, directory)
+    async with websockets.serve(server.handle_connection, "127.0.0.1", 0) as public, \
+            websockets.serve(server.handle_proxied_connection, shard.internal_host, shard.internal_port):
+        yield f"ws://127.0.0.1:{public.sockets[0].getsockname()[1]}"
+
+
+class TestSharding:
+    """Each lobby lives on one worker, and every worker can list and join all of them"""
+
+    def test_owner_is_stable_and_spread(self):
+        lobby_ids = [f"lobby-{i}" for i in range(400)]
+        owners = [owner_of(lobby_id, 4) for lobby_id in lobby_ids]
+        assert owners == [owner_of(lobby_id, 4) for lobby_id in lobby_ids]
+        assert all(owners.count(worker) > 50 for worker in range(4))
+
+    @pytest.mark.asyncio
+    async def test_lobbies_created_on_their_owner_and_listed_everywhere(self):
+        directory = InMemoryLobbyDirectory()
+        workers = [LobbyService(InMemoryLobbyRepository(), directory, Shard(index, 3, 0), LobbyIndex(0.01)) for index in range(3)]
+        lobbies = [await service.create_lobby(User(create_mock_connection(), True), f"lobby {i}") for i, service in enumerate(workers)]
+        for index, lobby in enumerate(lobbies):
+            assert owner_of(str(lobby.id), 3) == index
+        listed, _ = await workers[0].get_available_lobby_summaries()
+        assert {summary["id"] for summary in listed} == {str(lobby.id) for lobby in lobbies}
+
+        lobbies[1].game = object()  # type: ignore[assignment]
+        await workers[1].save_lobby(lobbies[1])
+        await workers[2].leave_lobby(lobbies[2].users[0], str(lobbies[2].id))
+        # Other workers' changes reach the index on its next sync with the directory
+        await asyncio.sleep(0.05)
+        listed, _ = await workers[0].get_available_lobby_summaries()
+        assert [summary["id"] for summary in listed] == [str(lobbies[0].id)]
+        for service in workers:
+            service.close()
+
+    @pytest.mark.asyncio
+    async def test_sqlite_directory_shared_between_processes(self, tmp_path):
+        path = str(tmp_path / "lobbies.sqlite")
+        first, second = SqliteLobbyDirectory(path), SqliteLobbyDirectory(path)
+        try:
+            await first.publish(0, {"id": "a", "name": "A", "players": 1, "game": False, "wordPack": "default"})
+            await second.publish(1, {"id": "b", "name": "B", "players": 2, "game": False, "wordPack": "default"})
+            assert {summary["id"] for summary in await first.list_lobbies()} == {"a", "b"}
+            await first.clear_worker(1)
+            assert [summary["id"] for summary in await second.list_lobbies()] == ["a"]
+        finally:
+            first.close()
+            second.close()
+
+    @pytest.mark.asyncio
+    async def test_join_is_proxied_to_the_owning_worker(self):
+        directory = InMemoryLobbyDirectory()
+        port_base = _free_port_pair()
+        async with _worker(Shard(0, 2, port_base), directory) as url_0, _worker(Shard(1, 2, port_base), directory) as url_1:
+            async with websockets.connect(url_1) as owner:
+                await owner.send(json.dumps({"clientMessageType": "createLobby", "name": "sharded"}))
+                lobby_id = (await _receive(owner, "lobbyJoined"))["lobbyId"]
+                assert owner_of(lobby_id, 2) == 1
+
+                async with websockets.connect(url_0) as guest:
+                    await guest.send(json.dumps({"clientMessageType": "idRequest"}))
+                    guest_id = (await _receive(guest, "idAssign"))["uuid"]
+                    await guest.send(json.dumps({"clientMessageType": "lobbiesRequest"}))
+                    assert [lobby["id"] for lobby in (await _receive(guest, "lobbiesUpdate"))["lobbies"]] == [lobby_id]
+
+                    await guest.send(json.dumps({"clientMessageType": "joinLobby", "lobbyId": lobby_id}))
+                    assert (await _receive(guest, "lobbyJoined"))["lobbyId"] == lobby_id
+                    await guest.send(json.dumps({"clientMessageType": "preferencesRequest", "player": {"name": "guest"}}))
+                    players = (await _receive(guest, "playerUpdate"))["players"]
+                    assert {"name": "guest", "uuid": guest_id} in [{"name": p["name"], "uuid": p["uuid"]} for p in players]
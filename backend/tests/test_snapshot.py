@@ -0,0 +1,74 @@
+"""
+Binary game snapshot tests
+"""
+import pytest
+
+from codenames.game.snapshot import SNAPSHOT_VERSION, decode_game, decode_roster, encode_game, encode_roster
+from codenames.game.word_packs import word_pack_store
+from codenames.model import CodenamesConnection, DetachedConnection
+from tests.test_clue_service import FakeAgent, create_game
+
+
+class TestSnapshot:
+    """Games and rosters survive a round trip through a few dozen bytes"""
+
+    @pytest.mark.asyncio
+    async def test_game_round_trip_mid_turn(self):
+        game = create_game(FakeAgent())
+        await game.provide_clue(game.users[0], "orchard", 3)
+        await game.guess_tile(game.users[1], next(tile for tile in game.tiles if tile.team == "red"))
+        snapshot = encode_game(game)
+        assert len(snapshot) < 100
+
+        restored = decode_game(snapshot, game.users)
+        assert [tile.to_json(True) for tile in restored.tiles] == [tile.to_json(True) for tile in game.tiles]
+        assert (restored.current_turn, restored.guesses_remaining, restored.clue) == (game.current_turn, 2, ("orchard", 3))
+        assert restored.remaining == game.remaining and restored.word_pack is game.word_pack
+        assert restored.get_state_update(game.users[1], False)["tiles"] == game.get_state_update(game.users[1], False)["tiles"]
+
+    @pytest.mark.asyncio
+    async def test_finished_game_keeps_its_winner(self):
+        game = create_game(FakeAgent())
+        await game.provide_clue(game.users[0], "oops", 1)
+        await game.guess_tile(game.users[1], next(tile for tile in game.tiles if tile.team == "assassin"))
+        restored = decode_game(encode_game(game), game.users)
+        assert restored.clue is None and game.check_win() is not None
+        assert restored.check_win() == game.check_win()
+
+    @pytest.mark.asyncio
+    async def test_zero_clue_then_correct_guess_round_trip(self):
+        game = create_game(FakeAgent())
+        await game.provide_clue(game.users[0], "nothing", 0)
+        await game.guess_tile(game.users[1], next(tile for tile in game.tiles if tile.team == "red"))
+        assert game.guesses_remaining < 0
+        restored = decode_game(encode_game(game), game.users)
+        assert (restored.current_turn, restored.guesses_remaining, restored.clue) == (game.current_turn, 0, None)
+        assert restored.remaining == game.remaining
+        game.close()
+
+    def test_custom_pack_round_trip(self):
+        pack = word_pack_store.register_custom([f"word{i}" for i in range(30)])
+        game = create_game(FakeAgent())
+        game.word_pack = pack
+        for tile, word in zip(game.tiles, pack.words):
+            tile.word = word
+        assert [tile.word for tile in decode_game(encode_game(game), game.users).tiles] == list(pack.words[:25])
+
+    def test_roster_round_trip(self):
+        game = create_game(FakeAgent())
+        game.users[0].connection.uuid = "3f1c1b5e-5a4e-4c8e-9a55-0d1a3c7e2b10"
+        for user in game.users:
+            user.name, user.is_ready, user.in_game = f"player {user.team}", True, True
+        restored = decode_roster(encode_roster(game.users))
+        assert [user.to_json() for user in restored] == [user.to_json() for user in game.users]
+        assert [user.is_human for user in restored] == [True, True, False, True]
+        assert isinstance(restored[0].connection, DetachedConnection)
+        assert not isinstance(restored[2].connection, DetachedConnection) and isinstance(restored[2].connection, CodenamesConnection)
+
+    def test_rejects_other_versions_and_changed_packs(self):
+        snapshot = bytearray(encode_game(create_game(FakeAgent())))
+        with pytest.raises(ValueError):
+            decode_game(bytes([SNAPSHOT_VERSION + 1]) + snapshot[1:], [])
+        snapshot[1 + 1 + len("default")] += 1
+        with pytest.raises(ValueError):
+            decode_game(bytes(snapshot), [])
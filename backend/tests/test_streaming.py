@@ -0,0 +1,58 @@
+"""
+Streaming LLM response tests
+"""
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from codenames.gpt.chat_gpt import ChatGPT
+
+
+class FakeStream:
+    """Stands in for openai's AsyncStream, yielding text chunks with a delay between them"""
+    def __init__(self, chunks, delay: float = 0.01):
+        self.chunks = chunks
+        self.delay = delay
+        self.closed = False
+        self.sent = 0
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            self.sent += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+
+    async def close(self):
+        self.closed = True
+
+
+def fake_client(stream: FakeStream):
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return stream
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+class TestStreaming:
+    """Streamed answers are acted on before the completion finishes"""
+
+    @pytest.mark.asyncio
+    async def test_guesses_yielded_at_each_separator(self):
+        stream = FakeStream(["Wha", "le, Nonsense, WA", "VE", ", star, extra"])
+        chat_gpt = ChatGPT(client=fake_client(stream), stream=True)  # type: ignore[arg-type]
+        received = []
+        async for guess in chat_gpt.stream_guesses(("sea", 3), ["whale", "wave", "star", "moon"]):
+            received.append((guess, stream.sent))
+        assert received == [("Whale", 2), ("WAVE", 4), ("star", 4)]
+        assert stream.closed
+
+    @pytest.mark.asyncio
+    async def test_clue_returned_once_number_complete(self):
+        stream = FakeStream(["OCE", "AN,", "2", "\n", "Because whales and waves both live in the ocean"])
+        chat_gpt = ChatGPT(client=fake_client(stream), stream=True)  # type: ignore[arg-type]
+        assert await chat_gpt.get_clue(["whale", "wave"], ["star"]) == ("OCEAN", 2)
+        assert stream.sent == 4
+        assert stream.closed
@@ -0,0 +1,81 @@
+"""
+Message tracing tests
+"""
+import asyncio
+import json
+import logging
+
+import pytest
+
+from codenames.message_router.message_handler import UserContext
+from codenames.model import User
+from codenames.tracing import NOOP_SPAN, Tracer, tracer
+from codenames.websocket_server import WebSocketConnection, create_server
+from tests.test_clue_service import FakeAgent, create_game
+
+
+class _NullWebSocket:
+    async def send(self, payload: str) -> None:
+        return
+
+
+@pytest.fixture
+def sampled():
+    """Trace every message through the shared tracer for the duration of a test"""
+    tracer.sample_rate = 1.0
+    tracer._recent.clear()
+    yield tracer
+    tracer.sample_rate = 0.0
+
+
+class TestTracing:
+    """Sampled messages are followed from receipt through handlers, the game and the AI tasks they start"""
+
+    @pytest.mark.asyncio
+    async def test_message_spans_share_a_trace(self, sampled):
+        server = await create_server()
+        connection_id = server.connection_manager.add_connection(WebSocketConnection(_NullWebSocket()))  # type: ignore[arg-type]
+        user_context = UserContext(User(None, True), connection_id)  # type: ignore[arg-type]
+        await server._handle_message(user_context, json.dumps({"clientMessageType": "idRequest"}))
+        spans = {span["name"]: span for span in sampled.recent()}
+        assert set(spans) == {"message", "decode", "handler", "reply"}
+        root = spans["message"]
+        assert root["parentId"] is None and root["attributes"]["messageType"] == "idRequest"
+        assert user_context.trace_id == root["traceId"]
+        for name in ("decode", "handler", "reply"):
+            assert spans[name]["traceId"] == root["traceId"]
+            assert spans[name]["parentId"] == root["spanId"]
+
+    @pytest.mark.asyncio
+    async def test_ai_tasks_continue_the_trace(self, sampled):
+        game = create_game(FakeAgent())
+        with sampled.start_trace("message") as trace:
+            await game.provide_clue(game.users[0], "first", 2)
+            await game.pass_turn(game.users[1])
+        await asyncio.sleep(0.05)
+        names = {span["name"] for span in sampled.recent() if span["traceId"] == trace.trace_id}
+        assert {"game.provide_clue", "game.pass_turn", "game.broadcast", "ai.create_clue"} <= names
+
+    def test_unsampled_work_records_nothing(self):
+        quiet = Tracer(0.0)
+        with quiet.start_trace("message") as trace:
+            with quiet.span("handler") as span:
+                span.set(ignored=True)
+        assert trace is NOOP_SPAN and span is NOOP_SPAN
+        assert quiet.recent() == []
+
+    def test_spans_written_to_rotating_jsonl(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        file_tracer = Tracer(1.0, buffer_size=5, path=str(path), max_bytes=2000, backups=1)
+        try:
+            for i in range(20):
+                with file_tracer.start_trace("message", index=i):
+                    pass
+        finally:
+            for handler in logging.getLogger("codenames.tracing.export").handlers:
+                handler.close()
+            logging.getLogger("codenames.tracing.export").handlers.clear()
+        assert len(file_tracer.recent()) == 5
+        assert (tmp_path / "traces.jsonl.1").exists()
+        last = json.loads(path.read_text().splitlines()[-1])
+        assert last["name"] == "message" and last["attributes"] == {"index": 19}
@@ -0,0 +1,128 @@
+"""
+Wire format tests: negotiating MessagePack or JSON per connection and validating messages against their schema
+"""
+import asyncio
+import json
+from typing import List
+
+import pytest
+import websockets
+
+from codenames.game.game import CodenamesGame
+from codenames.lobby import Lobby
+from codenames.message_router.message_handler import UserContext
+from codenames.message_router.message_router import MessageRouter
+from codenames.model import CodenamesConnection, User
+from codenames.services.lobby_service import InMemoryLobbyRepository, LobbyService
+from codenames.websocket_server import create_server
+from codenames.wire_format import JSON, MSGPACK, STDLIB_JSON, SUBPROTOCOLS, Payload, WireFormat, wire_format_for
+
+msgpack = pytest.importorskip("msgpack")
+
+
+class _Connection(CodenamesConnection):
+    def __init__(self, wire_format: WireFormat):
+        super().__init__()
+        self.wire_format = wire_format
+        self.payloads: List[Payload] = []
+
+    async def send(self, message: dict):
+        return
+
+    async def send_encoded(self, payload: Payload, message_type: str = ""):
+        self.payloads.append(payload)
+
+
+class TestWireFormat:
+    """Clients choose an encoding with the subprotocol they ask for"""
+
+    def test_negotiation_falls_back_to_json(self):
+        assert SUBPROTOCOLS[0] == "codenames.msgpack"
+        assert wire_format_for("codenames.msgpack") is MSGPACK
+        assert wire_format_for(None) is JSON and wire_format_for("codenames.json") is JSON
+        message = {"serverMessageType": "lobbiesUpdate", "lobbies": [{"name": "é", "players": 2}], "next": None}
+        assert json.loads(JSON.encode(message)) == json.loads(STDLIB_JSON.encode(message)) == message
+        with pytest.raises(ValueError):
+            MSGPACK.decode(b"\xc1")
+        with pytest.raises(ValueError):
+            MSGPACK.decode("text frame")
+
+    @pytest.mark.asyncio
+    async def test_broadcast_encodes_each_view_once_per_format(self):
+        users = []
+        for (team, is_spy_master), wire_format in zip([("red", True), ("red", False), ("blue", True), ("blue", False)], [MSGPACK, MSGPACK, JSON, JSON]):
+            user = User(_Connection(wire_format), True)
+            user.team, user.is_spy_master = team, is_spy_master
+            users.append(user)
+        game = CodenamesGame(users, seed=1)
+        await game.broadcast_state_update(False)
+        packed, as_json = users[1].connection.payloads[0], users[3].connection.payloads[0]
+        assert isinstance(packed, bytes) and isinstance(as_json, str)
+        assert msgpack.unpackb(packed) == json.loads(as_json)
+        assert len(packed) < len(as_json.encode())
+        assert game.encode_state_update(False, False, MSGPACK) is packed
+
+    @pytest.mark.asyncio
+    async def test_lobby_messages_encoded_once_per_format(self):
+        users = [User(_Connection(wire_format), True) for wire_format in (MSGPACK, JSON, JSON)]
+        lobby = Lobby(users[0], "formats")
+        for user in users[1:]:
+            lobby.add_user(user)
+        await lobby.send_player_update()
+        packed, first, second = [user.connection.payloads[0] for user in users]
+        assert first is second and msgpack.unpackb(packed) == json.loads(first)
+        assert json.loads(first)["serverMessageType"] == "playerUpdate"
+
+
+class TestMessageSchemas:
+    """Malformed messages are rejected before their handler runs"""
+
+    @pytest.mark.asyncio
+    async def test_missing_and_mistyped_fields(self):
+        router = MessageRouter(LobbyService(InMemoryLobbyRepository()))
+        context = UserContext(User(_Connection(JSON), True), "schema")
+        assert await router.route_message(context, "joinLobby", {}) == {"serverMessageType": "error", "message": "Invalid joinLobby: Missing lobbyId"}
+        reply = await router.route_message(context, "provideClue", {"word": "tree", "number": "two"})
+        assert reply == {"serverMessageType": "error", "message": "Invalid provideClue: number must be int"}
+        reply = await router.route_message(context, "createLobby", {"seed": True})
+        assert reply == {"serverMessageType": "error", "message": "Invalid createLobby: seed must be int"}
+        reply = await router.route_message(context, "lobbiesRequest", {"clientMessageType": "lobbiesRequest", "prefix": None})
+        assert reply is not None and reply["serverMessageType"] == "lobbiesUpdate"
+
+
+class TestNegotiatedConnections:
+    """A server speaks each client's chosen format on the same port"""
+
+    @pytest.mark.asyncio
+    async def test_msgpack_and_json_clients(self):
+        server = await create_server()
+        async with websockets.serve(server.handle_connection, "127.0.0.1", 0, subprotocols=SUBPROTOCOLS) as listener:  # type: ignore[arg-type]
+            url = f"ws://127.0.0.1:{listener.sockets[0].getsockname()[1]}"
+            async with websockets.connect(url, subprotocols=["codenames.msgpack"]) as packed:  # type: ignore[list-item]
+                assert packed.subprotocol == "codenames.msgpack"
+                await packed.send(msgpack.packb({"clientMessageType": "idRequest"}))
+                reply = await packed.recv()
+                assert isinstance(reply, bytes) and msgpack.unpackb(reply)["serverMessageType"] == "idAssign"
+                await packed.send(json.dumps({"clientMessageType": "idRequest"}))
+                assert msgpack.unpackb(await packed.recv()) == {"serverMessageType": "error", "message": "Invalid MSGPACK format"}
+
+            async with websockets.connect(url) as plain:
+                assert plain.subprotocol is None
+                await plain.send(json.dumps({"clientMessageType": "idRequest"}))
+                assert json.loads(await plain.recv())["serverMessageType"] == "idAssign"
+
+    @pytest.mark.asyncio
+    async def test_lobby_browser_updates_use_the_negotiated_format(self):
+        server = await create_server()
+        async with websockets.serve(server.handle_connection, "127.0.0.1", 0, subprotocols=SUBPROTOCOLS) as listener:  # type: ignore[arg-type]
+            url = f"ws://127.0.0.1:{listener.sockets[0].getsockname()[1]}"
+            async with websockets.connect(url, subprotocols=["codenames.msgpack"]) as packed, websockets.connect(url) as plain:  # type: ignore[list-item]
+                await packed.send(msgpack.packb({"clientMessageType": "lobbiesRequest", "subscribe": True}))
+                listing = msgpack.unpackb(await packed.recv())
+                assert listing["serverMessageType"] == "lobbiesUpdate" and not listing.get("diff")
+                await plain.send(json.dumps({"clientMessageType": "createLobby", "name": "binary"}))
+                assert json.loads(await plain.recv())["serverMessageType"] == "lobbyJoined"
+                diff = await asyncio.wait_for(packed.recv(), 5)
+                assert isinstance(diff, bytes)
+                assert [lobby["name"] for lobby in msgpack.unpackb(diff)["lobbies"]] == ["binary"]
+        server.lobby_service.close()
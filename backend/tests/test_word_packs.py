@@ -0,0 +1,55 @@
+"""
+Word pack store and board dealing tests
+"""
+import gc
+
+import pytest
+
+from codenames.game.game import CodenamesGame, generate_tiles
+from codenames.game.word_packs import DEFAULT_PACK, WordPackStore, word_pack_store
+
+
+class TestWordPacks:
+    """Word packs are loaded once and boards are dealt from them without I/O"""
+
+    def test_default_pack_loaded_once_and_shared(self):
+        first = word_pack_store.get(DEFAULT_PACK)
+        second = word_pack_store.get(DEFAULT_PACK)
+        assert first is second
+        assert len(first) == 400
+
+    def test_board_layout(self):
+        tiles = generate_tiles()
+        teams = [tile.team for tile in tiles]
+        assert len(tiles) == 25
+        assert len({tile.word for tile in tiles}) == 25
+        assert teams.count("red") == 9
+        assert teams.count("blue") == 8
+        assert teams.count("assassin") == 1
+        assert teams.count("neutral") == 7
+
+    def test_seed_gives_reproducible_board(self):
+        first = CodenamesGame([], seed=1234)
+        second = CodenamesGame([], seed=1234)
+        assert [(t.word, t.team) for t in first.tiles] == [(t.word, t.team) for t in second.tiles]
+
+    def test_custom_words_validated_and_stored_once(self):
+        store = WordPackStore()
+        words = [f"word{i}" for i in range(30)]
+        first = store.register_custom(words + [" word1 ", ""])
+        second = store.register_custom(words)
+        assert first is second
+        assert len(first) == 30
+
+    def test_custom_pack_dropped_once_unused(self):
+        store = WordPackStore()
+        pack = store.register_custom([f"word{i}" for i in range(30)])
+        name = pack.name
+        assert store.get(name) is pack and name not in store.names()
+        del pack
+        gc.collect()
+        assert name not in store
+
+    def test_custom_words_too_few(self):
+        with pytest.raises(ValueError):
+            WordPackStore().register_custom(["only", "a", "few"])